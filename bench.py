@@ -0,0 +1,916 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import hashlib
+import tempfile
+import json
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from decimal import Decimal
+
+# Benchmarks run against a throwaway database and never talk to Telegram, Discord or a real chain.
+BENCH_DIR = tempfile.mkdtemp(prefix="airdrop_bench_")
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+os.environ.setdefault("SEND_DELAY", "0")
+os.environ.setdefault("ADMIN_ID", "1")
+sys.path.insert(0, REPO_DIR)
+
+def load_bot():
+    os.chdir(BENCH_DIR)
+    import bot
+    bot.startup()
+    return bot
+
+def percentile(samples: list, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def sql_statement_count(bot) -> int:
+    return sum(series[2] for series in bot.SQL_LATENCY.values.values())
+
+# Fake platform and chain clients
+class FakeTelegramBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, reply_markup=None, parse_mode=None):
+        self.sent.append((chat_id, text))
+
+    async def send_document(self, chat_id, document):
+        self.sent.append((chat_id, document))
+
+class FakeDiscordChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.sent = []
+
+    async def send(self, text=None, file=None):
+        self.sent.append(text or file)
+
+class FakeDiscordBot:
+    def __init__(self):
+        self.channels = {}
+
+    def get_channel(self, channel_id: int):
+        return self.channels.setdefault(channel_id, FakeDiscordChannel(channel_id))
+
+    async def fetch_user(self, user_id: int):
+        return self.get_channel(user_id)
+
+# Local chain stand-in
+# One in-process JSON-RPC server answers the EVM, XRPL and Solana methods the
+# distribution path uses, with configurable latency and failure rate on submits.
+SUBMIT_METHODS = ("eth_sendRawTransaction", "submit", "sendTransaction")
+
+class FakeChainNode:
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 1, max_rps: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_rps = max_rps
+        self.balance_wei = 10**24
+        self.windows = {}
+        self.throttled = 0
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.nonces = {}
+        self.tickets = {}
+        self.held = {}
+        self.block = 1000
+        self.calls = {}
+        self.submitted = {}
+        self.server = None
+        self.servers = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def start(self):
+        self.server = self.listen(self.latency)
+        return self
+
+    def listen(self, latency: float):
+        # Extra listeners share the node's state, standing in for several endpoints of one chain
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if node.over_limit(payload):
+                    self.send_response(429)
+                    self.send_header("Retry-After", "1")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if latency:
+                    time.sleep(latency)
+                if isinstance(payload, list):
+                    body = [node.handle(item) for item in payload]
+                else:
+                    body = node.handle(payload)
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return server
+
+    def listener_url(self, server) -> str:
+        return f"http://127.0.0.1:{server.server_address[1]}/"
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+
+    def over_limit(self, payload) -> bool:
+        # Sliding one-second window per method, like a provider's per-method request quota
+        if not self.max_rps:
+            return False
+        method = (payload[0] if isinstance(payload, list) and payload else payload).get("method", "")
+        now = time.monotonic()
+        with self.lock:
+            window = [stamp for stamp in self.windows.get(method, []) if now - stamp < 1.0]
+            if len(window) >= self.max_rps:
+                self.windows[method] = window
+                self.throttled += 1
+                return True
+            window.append(now)
+            self.windows[method] = window
+        return False
+
+    def handle(self, request: dict) -> dict:
+        method = request.get("method", "")
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            fail = method in SUBMIT_METHODS and self.rng.random() < self.error_rate
+        if "jsonrpc" not in request:
+            params = (request.get("params") or [{}])[0]
+            if fail:
+                return {"result": {"status": "error", "error": "tooBusy", "error_message": "simulated failure"}}
+            return {"result": dict(self.xrp(method, params), status="success")}
+        if fail:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32000, "message": "simulated failure"}}
+        handler = self.evm if method.startswith(("eth_", "net_", "web3_")) else self.sol
+        try:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "result": handler(method, request.get("params") or [])}
+        except KeyError:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32601, "message": f"{method} not supported"}}
+
+    def _record_submit(self, tx_id: str):
+        with self.lock:
+            self.submitted[tx_id] = self.block
+
+    def evm(self, method: str, params: list):
+        from eth_account import Account
+        from eth_utils import keccak
+        from hexbytes import HexBytes
+        if method == "eth_chainId":
+            return "0x1"
+        if method == "net_version":
+            return "1"
+        if method == "eth_blockNumber":
+            return hex(self.block)
+        if method == "eth_gasPrice":
+            return hex(10**9)
+        if method == "eth_maxPriorityFeePerGas":
+            return hex(10**9)
+        if method == "eth_estimateGas":
+            return hex(52000)
+        if method == "eth_getBalance":
+            return hex(self.balance_wei)
+        if method == "eth_call":
+            return "0x" + hex(10**30)[2:].rjust(64, "0")
+        if method == "eth_getTransactionCount":
+            with self.lock:
+                return hex(self.nonces.get(params[0].lower(), 0))
+        if method == "eth_sendRawTransaction":
+            raw = HexBytes(params[0])
+            tx_hash = "0x" + keccak(raw).hex()
+            try:
+                sender = Account.recover_transaction(raw).lower()
+                with self.lock:
+                    self.nonces[sender] = self.nonces.get(sender, 0) + 1
+            except Exception:
+                pass
+            self._record_submit(tx_hash)
+            return tx_hash
+        if method == "eth_getTransactionReceipt":
+            with self.lock:
+                block = self.submitted.get(params[0])
+            if block is None:
+                return None
+            return {"transactionHash": params[0], "status": "0x1", "blockNumber": hex(block), "gasUsed": hex(52000)}
+        if method in ("eth_getBlockByNumber", "eth_getBlockByHash"):
+            return {"number": hex(self.block), "baseFeePerGas": hex(10**9), "timestamp": hex(int(time.time())), "gasLimit": hex(30000000)}
+        if method == "eth_feeHistory":
+            blocks = int(params[0], 16) if isinstance(params[0], str) else int(params[0])
+            percentiles = params[2] if len(params) > 2 else []
+            return {"oldestBlock": hex(self.block - blocks), "baseFeePerGas": [hex(10**9)] * (blocks + 1),
+                    "gasUsedRatio": [0.5] * blocks, "reward": [[hex(10**9)] * len(percentiles)] * blocks}
+        raise KeyError(method)
+
+    def xrp(self, method: str, params: dict) -> dict:
+        if method == "submit":
+            from xrpl.core.binarycodec import decode
+            tx_hash = hashlib.sha512(bytes.fromhex("54584E00" + params.get("tx_blob", ""))).hexdigest()[:64].upper()
+            tx = decode(params.get("tx_blob", ""))
+            with self.lock:
+                # Applies Sequence/Ticket bookkeeping so the sender's local tracking is exercised
+                tickets = self.tickets.setdefault(tx["Account"], set())
+                if tx.get("TicketSequence"):
+                    if tx["TicketSequence"] not in tickets:
+                        return {"engine_result": "tefNO_TICKET", "engine_result_message": "Ticket is not in ledger.", "accepted": False}
+                    tickets.discard(tx["TicketSequence"])
+                else:
+                    sequence = self.nonces.setdefault(tx["Account"], 1)
+                    if tx["Sequence"] < sequence:
+                        return {"engine_result": "tefPAST_SEQ", "engine_result_message": "This sequence number has already passed.", "accepted": False}
+                    held = self.held.setdefault(tx["Account"], {})
+                    held[tx["Sequence"]] = (tx_hash, tx)
+                    if tx["Sequence"] > sequence:
+                        # Like rippled, a transaction ahead of the account sequence waits for the gap to fill
+                        return {"engine_result": "terPRE_SEQ", "engine_result_message": "Missing/inapplicable prior transaction.", "accepted": True}
+                    while self.nonces[tx["Account"]] in held:
+                        applied_hash, applied = held.pop(self.nonces[tx["Account"]])
+                        self.nonces[tx["Account"]] = applied["Sequence"] + 1
+                        if applied.get("TransactionType") == "TicketCreate":
+                            tickets.update(range(applied["Sequence"] + 1, applied["Sequence"] + 1 + applied["TicketCount"]))
+                            self.nonces[tx["Account"]] += applied["TicketCount"]
+                        self.submitted[applied_hash] = self.block
+                    return {"engine_result": "tesSUCCESS", "accepted": True, "tx_json": {"hash": tx_hash}}
+            self._record_submit(tx_hash)
+            return {"engine_result": "tesSUCCESS", "accepted": True, "tx_json": {"hash": tx_hash}}
+        if method == "account_objects":
+            with self.lock:
+                tickets = sorted(self.tickets.get(params.get("account"), ()))
+            return {"account": params.get("account"), "account_objects": [{"LedgerEntryType": "Ticket", "TicketSequence": t} for t in tickets]}
+        if method == "account_info":
+            with self.lock:
+                sequence = self.nonces.setdefault(params.get("account", ""), 1)
+            return {"account_data": {"Account": params.get("account"), "Balance": str(10**15), "Sequence": sequence},
+                    "ledger_current_index": self.block, "validated": False}
+        if method == "fee":
+            return {"current_ledger_size": "10", "current_queue_size": "0", "expected_ledger_size": "100",
+                    "ledger_current_index": self.block, "max_queue_size": "2000",
+                    "drops": {"base_fee": "10", "median_fee": "5000", "minimum_fee": "10", "open_ledger_fee": "10"},
+                    "levels": {"median_level": "128000", "minimum_level": "256", "open_ledger_level": "256", "reference_level": "256"}}
+        if method == "ledger_current":
+            return {"ledger_current_index": self.block}
+        if method == "ledger":
+            return {"ledger_index": self.block, "ledger": {"ledger_index": str(self.block)}, "validated": True}
+        if method == "server_info":
+            return {"info": {"validated_ledger": {"seq": self.block, "base_fee_xrp": 0.00001, "reserve_base_xrp": 10, "reserve_inc_xrp": 2}}}
+        if method == "account_tx":
+            with self.lock:
+                entries = [{"tx": {"hash": tx_hash, "ledger_index": block}, "meta": {"TransactionResult": "tesSUCCESS"}, "validated": True}
+                           for tx_hash, block in self.submitted.items() if not tx_hash.startswith("0x") and tx_hash.isupper()]
+            offset = int(params.get("marker") or 0)
+            limit = int(params.get("limit", 200))
+            page = {"account": params.get("account"), "ledger_index_max": self.block, "ledger_index_min": 1,
+                    "transactions": entries[offset:offset + limit]}
+            if offset + limit < len(entries):
+                page["marker"] = offset + limit
+            return page
+        if method == "tx":
+            with self.lock:
+                known = params.get("transaction") in self.submitted
+            return {"validated": known, "meta": {"TransactionResult": "tesSUCCESS"}, "ledger_index": self.block} if known else {"error": "txnNotFound"}
+        return {}
+
+    def sol(self, method: str, params: list):
+        if method == "sendTransaction":
+            import base64
+            from solders.transaction import Transaction
+            signature = str(Transaction.from_bytes(base64.b64decode(params[0])).signatures[0])
+            self._record_submit(signature)
+            return signature
+        if method == "getLatestBlockhash":
+            return {"context": {"slot": self.block}, "value": {"blockhash": "11111111111111111111111111111111", "lastValidBlockHeight": self.block + 150}}
+        if method == "getBlockHeight":
+            return self.block
+        if method == "isBlockhashValid":
+            return {"context": {"slot": self.block}, "value": True}
+        if method == "getBalance":
+            return {"context": {"slot": self.block}, "value": 10**15}
+        if method == "getSignatureStatuses":
+            with self.lock:
+                statuses = [{"slot": self.submitted[sig], "confirmations": None, "err": None, "confirmationStatus": "finalized"}
+                            if sig in self.submitted else None for sig in params[0]]
+            return {"context": {"slot": self.block}, "value": statuses}
+        raise KeyError(method)
+
+def configure_bench_accounts(node_url: str, senders: int = 1):
+    from eth_account import Account
+    from solders.keypair import Keypair
+    from xrpl.wallet import Wallet
+    eth_accounts = [Account.create() for _ in range(senders)]
+    sol_keys = [str(Keypair()) for _ in range(senders)]
+    xrp_wallets = [Wallet.create() for _ in range(senders)]
+    os.environ.update({
+        "ETH_RPC_URL": node_url, "BSC_RPC_URL": node_url, "SOL_RPC_URL": node_url, "XRP_RPC_URL": node_url,
+        "ETH_SENDER_ADDRESS": eth_accounts[0].address, "ETH_PRIVATE_KEY": eth_accounts[0].key.hex(),
+        "SOL_SENDER_PRIVATE_KEY": sol_keys[0],
+        "XRP_SENDER_ADDRESS": xrp_wallets[0].classic_address, "XRP_SENDER_SEED": xrp_wallets[0].seed,
+        "ETH_SENDER_KEYS": ",".join(account.key.hex() for account in eth_accounts),
+        "SOL_SENDER_KEYS": ",".join(sol_keys),
+        "XRP_SENDER_SEEDS": ",".join(wallet.seed for wallet in xrp_wallets),
+        "TOKEN_CONTRACT_ADDRESS": Account.create().address,
+    })
+
+# Simulated users
+class SimulatedUser:
+    def __init__(self, bot, index: int, platform: str, telegram_bot: FakeTelegramBot, discord_bot: FakeDiscordBot):
+        self.bot = bot
+        self.user_id = 100000 + index
+        self.name = f"user{index}"
+        self.platform = platform
+        self.wallet = "0x" + hashlib.sha1(str(index).encode()).hexdigest()
+        self.client = telegram_bot if platform == "telegram" else discord_bot
+        self.user_data = {}
+
+    def context(self):
+        # A fresh context per update, as the entry points build, over one user_data dict that carries the
+        # conversation state (awaiting_wallet, awaiting_captcha) from step to step like a chat session does
+        context = self.bot.BotContext(self.platform)
+        context.bot = self.client
+        context.user_data = self.user_data
+        return context
+
+    def _author(self):
+        return SimpleNamespace(id=self.user_id, name=self.name, first_name=self.name)
+
+    async def command(self, text: str):
+        if self.platform == "telegram":
+            update = SimpleNamespace(message=SimpleNamespace(from_user=self._author(), chat_id=self.user_id, text=text))
+        else:
+            update = SimpleNamespace(author=self._author(), channel=SimpleNamespace(id=self.user_id), content=f"!Birdz {text}".strip())
+        await self.bot.bot.start(update, self.context())
+
+    async def button(self, data: str):
+        if self.platform == "telegram":
+            async def answer():
+                return None
+            query = SimpleNamespace(from_user=self._author(), message=SimpleNamespace(chat_id=self.user_id), data=data, answer=answer)
+            update = SimpleNamespace(callback_query=query)
+        else:
+            update = SimpleNamespace(author=self._author(), channel=SimpleNamespace(id=self.user_id), content=f"!Birdz {data}")
+            update.callback_query = SimpleNamespace(data=data, from_user=update.author, message=update)
+        await self.bot.bot.button_handler(update, self.context())
+
+    async def message(self, text: str):
+        if self.platform == "telegram":
+            update = SimpleNamespace(message=SimpleNamespace(from_user=self._author(), chat_id=self.user_id, text=text))
+        else:
+            update = SimpleNamespace(author=self._author(), channel=SimpleNamespace(id=self.user_id), content=text)
+        await self.bot.bot.handle_message(update, self.context())
+
+async def run_phase(bot, name: str, users: list, step, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(user):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await step(user)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    queries_before = sql_statement_count(bot)
+    started = time.perf_counter()
+    await asyncio.gather(*(one(user) for user in users))
+    elapsed = time.perf_counter() - started
+    queries = sql_statement_count(bot) - queries_before
+    return {
+        "flow": name,
+        "users": len(users),
+        "errors": errors,
+        "seconds": elapsed,
+        "throughput": len(users) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "queries_per_flow": queries / len(users) if users else 0.0,
+    }
+
+async def load_test(args) -> list:
+    node = FakeChainNode(args.rpc_latency / 1000).start()
+    node.balance_wei = int(args.balance * 10**18)
+    configure_bench_accounts(node.url)
+    bot = load_bot()
+    telegram_bot = FakeTelegramBot()
+    discord_bot = FakeDiscordBot()
+    rng = random.Random(args.seed)
+    users = [SimulatedUser(bot, i, "discord" if rng.random() < args.discord_share else "telegram", telegram_bot, discord_bot)
+             for i in range(args.users)]
+    # Rows left by an earlier run would send every wallet step down the already-submitted branch
+    user_ids = [(str(user.user_id),) for user in users]
+    for table in LOAD_WRITE_TABLES:
+        bot.cursor.executemany(f"DELETE FROM {table} WHERE user_id = ?", user_ids)
+    bot.conn.commit()
+
+    async def start_flow(user):
+        await user.command("/start")
+        await user.button("confirm_groups")
+
+    async def wallet_flow(user):
+        await user.button("submit_wallet")
+        await user.button("wallet_eth")
+        await user.message(user.wallet)
+
+    async def captcha_flow(user):
+        await user.message(str(user.captcha + 5))
+
+    async def daily_tasks_flow(user):
+        await user.button("daily_tasks")
+        await user.message(f"1 @{user.name}")
+
+    async def leaderboard_flow(user):
+        await user.button("leaderboard")
+
+    results = [
+        await run_phase(bot, "start", users, start_flow, args.concurrency),
+        await run_phase(bot, "wallet", users, wallet_flow, args.concurrency),
+    ]
+    captchas = dict(bot.conn.execute("SELECT user_id, captcha FROM captchas").fetchall())
+    for user in users:
+        user.captcha = captchas.get(str(user.user_id), 0)
+    results.append(await run_phase(bot, "captcha", users, captcha_flow, args.concurrency))
+    results.append(await run_phase(bot, "daily_tasks", users, daily_tasks_flow, args.concurrency))
+    results.append(await run_phase(bot, "leaderboard", users, leaderboard_flow, args.concurrency))
+    node.stop()
+    return results, load_writes(bot, users)
+
+# Tables each simulated user must have a row in once the flows ran; timings from flows that
+# never reached their branch would only measure a no-op message
+LOAD_WRITE_TABLES = ("captchas", "submissions", "eligible", "task_completions")
+
+def load_writes(bot, users: list) -> dict:
+    user_ids = [str(user.user_id) for user in users]
+    placeholders = ",".join("?" * len(user_ids))
+    return {table: bot.conn.execute(f"SELECT COUNT(DISTINCT user_id) FROM {table} WHERE user_id IN ({placeholders})", user_ids).fetchone()[0]
+            for table in LOAD_WRITE_TABLES}
+
+def bench_recipient(chain: str, index: int) -> str:
+    if chain in ("ETH", "BSC"):
+        from web3 import Web3
+        return Web3.to_checksum_address("0x" + hashlib.sha1(f"recipient{index}".encode()).hexdigest())
+    if chain == "SOL":
+        from solders.pubkey import Pubkey
+        return str(Pubkey(hashlib.sha256(f"recipient{index}".encode()).digest()))
+    from xrpl.core import addresscodec
+    return addresscodec.encode_classic_address(hashlib.sha1(f"recipient{index}".encode()).digest()[:20])
+
+def seed_distributions(bot, rows: int, chains: list):
+    contract = os.environ["TOKEN_CONTRACT_ADDRESS"]
+    bot.cursor.execute("DELETE FROM distributions")
+    bot.cursor.execute("DELETE FROM eligible")
+    bot.cursor.execute("UPDATE token_distributions SET contract_address = ? WHERE token_id = 1", (contract,))
+    distributions, eligible = [], []
+    for i in range(rows):
+        chain = chains[i % len(chains)]
+        wallet = bench_recipient(chain, i)
+        user_id = str(500000 + i)
+        distributions.append((user_id, wallet, chain, 10.0 + i % 7, "pending"))
+        eligible.append((user_id, wallet, chain, 1 + i % 3, 1, 250.0, 1))
+    bot.cursor.executemany("INSERT INTO distributions (user_id, wallet, chain, amount, status) VALUES (?, ?, ?, ?, ?)", distributions)
+    bot.cursor.executemany("INSERT INTO eligible (user_id, wallet, chain, tier, verified, token_balance, social_tasks_completed) VALUES (?, ?, ?, ?, ?, ?, ?)", eligible)
+    bot.conn.commit()
+
+def distribution_status_counts(bot) -> dict:
+    return dict(bot.conn.execute("SELECT status, COUNT(*) FROM distributions GROUP BY status").fetchall())
+
+async def distribution_benchmark(args) -> dict:
+    node = FakeChainNode(args.node_latency / 1000, args.error_rate, args.seed, args.node_rps).start()
+    node_url = node.url
+    if args.slow_endpoint:
+        # Listed first, so the pool has to learn to route around it
+        node_url = f"{node.listener_url(node.listen(args.slow_endpoint / 1000))},{node.url}"
+    configure_bench_accounts(node_url, args.senders)
+    if args.signing_workers is not None:
+        os.environ["SIGNING_WORKERS"] = str(args.signing_workers)
+    bot = load_bot()
+    chains = [chain.strip().upper() for chain in args.chains.split(",") if chain.strip()]
+    seed_distributions(bot, args.rows, chains)
+    context = bot.BotContext("telegram")
+    context.bot = FakeTelegramBot()
+
+    rounds = []
+    started = time.perf_counter()
+    for attempt in range(args.retry_rounds + 1):
+        if attempt:
+            await bot.retry_failed_distributions()
+        round_started = time.perf_counter()
+        await bot.bot.distribute_tokens("1", context, 1, "en")
+        counts = distribution_status_counts(bot)
+        rounds.append({"round": attempt, "seconds": time.perf_counter() - round_started, "statuses": counts})
+        if not counts.get("failed"):
+            break
+    drain_seconds = time.perf_counter() - started
+
+    confirmation = None
+    if args.confirm:
+        calls_before = dict(node.calls)
+        confirm_started = time.perf_counter()
+        counts = await bot.ConfirmationTracker(bot.bot).poll_once()
+        confirmation = {
+            "seconds": time.perf_counter() - confirm_started,
+            "counts": counts,
+            "rpc_calls": {method: count - calls_before.get(method, 0) for method, count in node.calls.items() if count != calls_before.get(method, 0)},
+        }
+    node.stop()
+
+    counts = distribution_status_counts(bot)
+    sent = counts.get("broadcast", 0) + counts.get("confirmed", 0)
+    return {
+        "rows": args.rows,
+        "chains": chains,
+        "senders": args.senders,
+        "sender_rows": dict(bot.conn.execute("SELECT chain || ' ' || sender, COUNT(*) FROM distributions GROUP BY chain, sender").fetchall()),
+        "node_latency_ms": args.node_latency,
+        "error_rate": args.error_rate,
+        "drain_seconds": drain_seconds,
+        "tx_per_second": sent / drain_seconds if drain_seconds else 0.0,
+        "final_statuses": counts,
+        "rounds": rounds,
+        "rpc_calls": node.calls,
+        "throttled": node.throttled,
+        "confirmation": confirmation,
+    }
+
+# Referral graph: a random forest of referrals, most of them approved
+def seed_referrals(bot, edges: int, seed: int):
+    rng = random.Random(seed)
+    bot.cursor.execute("DELETE FROM referrals")
+    rows = []
+    for referee in range(1, edges + 1):
+        # Preferential towards early users so some referrers have deep, wide downlines
+        referrer = int(referee * rng.random() ** 2)
+        rows.append((str(referrer), str(referee), "2024-01-01T00:00:00", "approved" if rng.random() < 0.8 else "pending"))
+    bot.cursor.executemany("INSERT INTO referrals (referrer_id, referee_id, timestamp, status) VALUES (?, ?, ?, ?)", rows)
+    bot.conn.commit()
+
+def referral_benchmark(args) -> dict:
+    bot = load_bot()
+    started = time.perf_counter()
+    seed_referrals(bot, args.edges, args.seed)
+    seeded = time.perf_counter()
+    graph = bot.referral_graph
+    graph.stats("0")
+    loaded = time.perf_counter()
+    rng = random.Random(args.seed)
+    lookups = []
+    for _ in range(args.lookups):
+        user_id = str(rng.randrange(args.edges))
+        lookup_started = time.perf_counter()
+        graph.stats(user_id)
+        graph.recent(user_id)
+        graph.downline(user_id)
+        lookups.append(time.perf_counter() - lookup_started)
+    leaderboard_started = time.perf_counter()
+    top = bot.top_referrers()
+    leaderboard = time.perf_counter() - leaderboard_started
+    attribution_started = time.perf_counter()
+    scores = graph.attribution()
+    attribution = time.perf_counter() - attribution_started
+    approved = bot.conn.execute("SELECT SUM(approved) FROM referral_counts").fetchone()[0]
+    return {
+        "edges": args.edges,
+        "insert_seconds": seeded - started,
+        "graph_load_seconds": loaded - seeded,
+        "my_referrals_p50_ms": percentile(lookups, 50) * 1000,
+        "my_referrals_p99_ms": percentile(lookups, 99) * 1000,
+        "leaderboard_ms": leaderboard * 1000,
+        "attribution_seconds": attribution,
+        "attributed_users": len(scores),
+        "counters_match": approved == sum(counts[1] for counts in graph.counts.values()) and top[0][2] == max(counts[1] for counts in graph.counts.values()),
+    }
+
+# Sybil sweep: honest users with their own wallets and handles, a few promoters with fans
+# of referees, and farms whose accounts reuse wallets/handles or chain referrals
+def seed_sybil_population(bot, users: int, farms: int, farm_size: int, seed: int) -> set:
+    rng = random.Random(seed)
+    for table in ("users", "submissions", "referrals", "eligible", "blacklist"):
+        bot.cursor.execute(f"DELETE FROM {table}")
+    wallet = lambda tag: "0x" + hashlib.sha1(tag.encode()).hexdigest()
+    user_rows, submission_rows, referral_rows, eligible_rows = [], [], [], []
+    for i in range(users):
+        user_id = str(i)
+        user_rows.append((user_id, f"user{i}", wallet(f"kyc{i}"), f"https://x.com/h{i}", f"https://t.me/tg{i:05d}"))
+        submission_rows.append((user_id, wallet(f"kyc{i}"), "ETH", f"2024-01-01T00:00:{i:09d}"))
+        if i >= 100 and rng.random() < 0.3:
+            referral_rows.append((str(rng.randrange(100)), user_id, "approved"))
+    farm_members = set()
+    next_id = users
+    for farm in range(farms):
+        members = [str(next_id + k) for k in range(farm_size)]
+        next_id += farm_size
+        style = farm % 3
+        for k, user_id in enumerate(members):
+            shared_wallet = wallet(f"farm{farm}") if style == 0 or k % 2 else wallet(f"farm{farm}-{k}")
+            x_handle = f"https://x.com/farm{farm}" if style == 1 else f"https://x.com/f{farm}x{k}"
+            user_rows.append((user_id, f"farm{farm}-{k}", shared_wallet, x_handle, f"https://t.me/farm{farm}x{k:03d}"))
+            submission_rows.append((user_id, shared_wallet, "ETH", f"2024-02-01T00:00:{int(user_id):09d}"))
+            if style == 2 and k:
+                referral_rows.append((members[k - 1], user_id, "approved"))
+        farm_members.update(members[1:])
+    eligible_rows = [(row[0], row[1], "ETH", 1, 1, 250.0, 1) for row in submission_rows]
+    bot.cursor.executemany("INSERT INTO users (user_id, username, kyc_wallet, kyc_x_link, kyc_telegram_link) VALUES (?, ?, ?, ?, ?)", user_rows)
+    bot.cursor.executemany("INSERT INTO submissions (user_id, wallet, chain, timestamp) VALUES (?, ?, ?, ?)", submission_rows)
+    bot.cursor.executemany("INSERT INTO referrals (referrer_id, referee_id, timestamp, status) VALUES (?, ?, '2024-01-01', ?)", referral_rows)
+    bot.cursor.executemany("INSERT INTO eligible (user_id, wallet, chain, tier, verified, token_balance, social_tasks_completed) VALUES (?, ?, ?, ?, ?, ?, ?)", eligible_rows)
+    bot.conn.commit()
+    return farm_members
+
+async def sybil_benchmark(args) -> dict:
+    bot = load_bot()
+    farm_members = seed_sybil_population(bot, args.users, args.farms, args.farm_size, args.seed)
+    report = await bot.sybil_sweep()
+    dropped = {row[0] for row in bot.conn.execute("SELECT user_id FROM eligible WHERE verified = 0")}
+    caught = len(dropped & farm_members)
+    return {
+        "users": report["users"],
+        "sweep_seconds": report["seconds"],
+        "report": report,
+        "precision": caught / len(dropped) if dropped else 1.0,
+        "recall": caught / len(farm_members) if farm_members else 1.0,
+    }
+
+# Balance snapshot: every submitted wallet read at one pinned height per chain
+async def snapshot_benchmark(args) -> dict:
+    node = FakeChainNode(args.node_latency / 1000, 0.0, args.seed, args.node_rps).start()
+    configure_bench_accounts(node.url)
+    bot = load_bot()
+    chains = [chain.strip().upper() for chain in args.chains.split(",") if chain.strip()]
+    bot.cursor.execute("DELETE FROM submissions")
+    bot.cursor.executemany("INSERT INTO submissions (user_id, wallet, chain, timestamp) VALUES (?, ?, ?, '2024-01-01')",
+                           [(str(i), bench_recipient(chains[i % len(chains)], i), chains[i % len(chains)]) for i in range(args.wallets)])
+    bot.conn.commit()
+    report = await bot.take_balance_snapshot(1, "manual")
+    node.stop()
+    report["wallets_per_second"] = report["wallets"] / report["seconds"] if report["seconds"] else 0.0
+    report["rpc_calls"] = node.calls
+    return report
+
+# Allocation engine: a synthetic eligible set planned under every policy; each plan must
+# sum to the budget exactly in base units
+def allocation_benchmark(args) -> dict:
+    bot = load_bot()
+    rng = random.Random(args.seed)
+    chains = [chain.strip().upper() for chain in args.chains.split(",") if chain.strip()]
+    holders = [(str(i), bench_recipient(chains[i % len(chains)], i), chains[i % len(chains)], rng.randint(1, 3), rng.paretovariate(1.2) * 50)
+               for i in range(args.users)]
+    decimals = {chain: bot.chain_decimals(chain, 18) for chain in chains}
+    tiers = bot.np.array([holder[3] for holder in holders], dtype=bot.np.int64)
+    balances = bot.np.array([holder[4] for holder in holders], dtype=bot.np.float64)
+    results = {"users": args.users, "total_tokens": args.total, "policies": {}}
+    for policy in bot.ALLOCATION_POLICIES:
+        # Weights and largest-remainder rounding alone, then the full plan with its row columns
+        started = time.perf_counter()
+        bot.allocate(bot.ALLOCATION_POLICIES[policy](tiers, balances), 10**12)
+        engine_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        plan = bot.build_allocation(holders, args.total, policy, {}, 18)
+        seconds = time.perf_counter() - started
+        tokens = [Decimal(base).scaleb(-decimals[chain]) for chain, base in zip(plan[2], plan[4])]
+        total = sum(tokens)
+        results["policies"][policy] = {
+            "engine_seconds": engine_seconds,
+            "seconds": seconds,
+            "allocations": len(tokens),
+            "exact": total == Decimal(str(args.total)),
+            "largest_share": float(max(tokens) / Decimal(str(args.total))),
+        }
+    return results
+
+# Merkle claims: one tree over seeded ETH allocations, its root published through the
+# stand-in node, then sampled proofs read back from SQLite and checked against the root
+async def merkle_benchmark(args) -> dict:
+    node = FakeChainNode(0.0, 0.0, args.seed).start()
+    configure_bench_accounts(node.url)
+    os.environ["ETH_MERKLE_DISTRIBUTOR"] = bench_recipient("ETH", -1)
+    bot = load_bot()
+    bot.MERKLE_DISTRIBUTORS["ETH"] = os.environ["ETH_MERKLE_DISTRIBUTOR"]
+    for table in ("merkle_roots", "merkle_claims", "merkle_nodes"):
+        bot.cursor.execute(f"DELETE FROM {table}")
+    seed_distributions(bot, args.leaves, ["ETH"])
+    tree = await bot.build_claim_tree("ETH", 1)
+    calls_before = sum(node.calls.values())
+    published = await bot.bot.publish_merkle_root(tree["root_id"])
+    publish_calls = sum(node.calls.values()) - calls_before
+    root = bytes.fromhex(tree["root"][2:])
+    rng = random.Random(args.seed)
+    lookups, verified = [], 0
+    for user_id in rng.sample(range(500000, 500000 + args.leaves), min(args.lookups, args.leaves)):
+        started = time.perf_counter()
+        claim = bot.merkle_claim(str(user_id))
+        lookups.append(time.perf_counter() - started)
+        leaf = bot.merkle_leaf(claim["index"], claim["account"], int(claim["amount_base"]))
+        verified += bot.verify_merkle_proof(leaf, [bytes.fromhex(node_hash[2:]) for node_hash in claim["proof"]], root)
+    node.stop()
+    return {
+        "tree": tree,
+        "publish": published,
+        "publish_rpc_calls": publish_calls,
+        "proof_p50_ms": percentile(lookups, 50) * 1000,
+        "proof_p99_ms": percentile(lookups, 99) * 1000,
+        "proofs_verified": f"{verified}/{len(lookups)}",
+        "statuses": distribution_status_counts(bot),
+    }
+
+# Cold start: every run is a fresh interpreter, so module caches and the page cache for
+# site-packages are the only things shared between runs.
+HEAVY_MODULES = ("web3", "solders", "xrpl", "openpyxl", "discord", "requests", "rlp", "numpy")
+
+async def startup_probe() -> dict:
+    started = time.perf_counter()
+    os.chdir(BENCH_DIR)
+    import bot
+    imported = time.perf_counter()
+    bot.startup()
+    booted = time.perf_counter()
+    telegram_bot = FakeTelegramBot()
+    user = SimulatedUser(bot, 0, "telegram", telegram_bot, FakeDiscordBot())
+    await user.command("/start")
+    handled = time.perf_counter()
+    return {
+        "import": imported - started,
+        "startup": booted - imported,
+        "first_update": handled - started,
+        "replied": bool(telegram_bot.sent),
+        "loaded": sorted(name for name in HEAVY_MODULES if name in sys.modules),
+    }
+
+def startup_benchmark(args) -> dict:
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "startup", "--probe"],
+                                check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    summary = {"runs": args.runs, "loaded": runs[-1]["loaded"], "replied": all(run["replied"] for run in runs)}
+    for phase in ("import", "startup", "first_update"):
+        samples = [run[phase] for run in runs]
+        summary[phase] = {"p50_ms": percentile(samples, 50) * 1000, "p90_ms": percentile(samples, 90) * 1000}
+    return summary
+
+def print_startup(result: dict):
+    print(f"{'phase':<14} {'p50_ms':>9} {'p90_ms':>9}   ({result['runs']} fresh processes)")
+    for phase in ("import", "startup", "first_update"):
+        print(f"{phase:<14} {result[phase]['p50_ms']:>9.1f} {result[phase]['p90_ms']:>9.1f}")
+    print(f"heavy modules loaded by the first update: {', '.join(result['loaded']) or 'none'}")
+    if not result["replied"]:
+        print("WARNING: /start produced no reply in at least one run")
+
+def compare_baseline(result: dict, path: str, tolerance: float) -> bool:
+    if not os.path.exists(path):
+        print(f"No baseline at {path}; run with --save-baseline to record one.")
+        return True
+    with open(path) as f:
+        baseline = json.load(f)
+    expected = baseline["tx_per_second"]
+    floor = expected * (1 - tolerance)
+    ok = result["tx_per_second"] >= floor
+    print(f"Baseline {expected:.1f} tx/s, current {result['tx_per_second']:.1f} tx/s, "
+          f"floor {floor:.1f} tx/s: {'OK' if ok else 'REGRESSION'}")
+    return ok
+
+def print_distribution(result: dict):
+    print(f"rows={result['rows']} chains={','.join(result['chains'])} senders={result['senders']} latency={result['node_latency_ms']}ms error_rate={result['error_rate']}")
+    for row in result["rounds"]:
+        print(f"  round {row['round']}: {row['seconds']:.2f}s statuses={row['statuses']}")
+    print(f"drained in {result['drain_seconds']:.2f}s, {result['tx_per_second']:.1f} tx/s, final={result['final_statuses']}")
+    print(f"rpc calls: {result['rpc_calls']}")
+    if result["throttled"]:
+        print(f"throttled (429) responses: {result['throttled']}")
+    if result["confirmation"]:
+        confirmation = result["confirmation"]
+        print(f"confirmation pass: {confirmation['seconds']:.2f}s {confirmation['counts']} rpc calls: {confirmation['rpc_calls']}")
+
+def print_results(results: list):
+    print(f"{'flow':<14} {'users':>7} {'errors':>7} {'flows/s':>10} {'p50_ms':>9} {'p99_ms':>9} {'queries':>9}")
+    for row in results:
+        print(f"{row['flow']:<14} {row['users']:>7} {row['errors']:>7} {row['throughput']:>10.1f} "
+              f"{row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['queries_per_flow']:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline AirdropBot benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    load = subparsers.add_parser("load", help="Simulate concurrent users through the interactive flows")
+    load.add_argument("--users", type=int, default=200)
+    load.add_argument("--concurrency", type=int, default=50)
+    load.add_argument("--discord-share", type=float, default=0.2)
+    load.add_argument("--balance", type=int, default=250, help="Stub wallet balance in whole coins")
+    load.add_argument("--rpc-latency", type=float, default=0.0, help="Stub RPC latency in ms")
+    load.add_argument("--seed", type=int, default=1)
+    load.add_argument("--json", action="store_true", help="Print results as JSON")
+    distribution = subparsers.add_parser("distribution", help="Drain a seeded distributions table against a local chain stand-in")
+    distribution.add_argument("--rows", type=int, default=10000)
+    distribution.add_argument("--chains", default="ETH", help="Comma-separated chains assigned round-robin to rows")
+    distribution.add_argument("--node-latency", type=float, default=0.0, help="Stand-in node latency per request in ms")
+    distribution.add_argument("--slow-endpoint", type=float, default=0.0, help="Add a second, slower endpoint (latency in ms) ahead of the normal one")
+    distribution.add_argument("--node-rps", type=float, default=0.0, help="Per-method requests/s before the stand-in node answers 429")
+    distribution.add_argument("--error-rate", type=float, default=0.0, help="Share of submits the stand-in rejects")
+    distribution.add_argument("--retry-rounds", type=int, default=2, help="Re-queue failed rows this many times")
+    distribution.add_argument("--baseline", default=os.path.join(REPO_DIR, "bench_baseline.json"))
+    distribution.add_argument("--save-baseline", action="store_true")
+    distribution.add_argument("--tolerance", type=float, default=0.2, help="Allowed tx/s drop before failing")
+    distribution.add_argument("--confirm", action="store_true", help="Run one confirmation-tracker pass after draining")
+    distribution.add_argument("--senders", type=int, default=1, help="Hot wallets per chain")
+    distribution.add_argument("--signing-workers", type=int, default=None, help="EVM signing processes (0 signs on a thread)")
+    distribution.add_argument("--seed", type=int, default=1)
+    distribution.add_argument("--json", action="store_true", help="Print results as JSON")
+    referrals = subparsers.add_parser("referrals", help="Seed a referral graph and time my-referrals, leaderboard and attribution")
+    referrals.add_argument("--edges", type=int, default=1000000)
+    referrals.add_argument("--lookups", type=int, default=1000)
+    referrals.add_argument("--seed", type=int, default=1)
+    sybil = subparsers.add_parser("sybil", help="Seed honest users and sybil farms and time a full sweep")
+    sybil.add_argument("--users", type=int, default=200000)
+    sybil.add_argument("--farms", type=int, default=2000)
+    sybil.add_argument("--farm-size", type=int, default=5)
+    sybil.add_argument("--seed", type=int, default=1)
+    snapshot = subparsers.add_parser("snapshot", help="Take a balance snapshot of seeded wallets against a local chain stand-in")
+    snapshot.add_argument("--wallets", type=int, default=20000)
+    snapshot.add_argument("--chains", default="ETH,SOL,XRP")
+    snapshot.add_argument("--node-latency", type=float, default=5.0, help="Stand-in node latency per request in ms")
+    snapshot.add_argument("--node-rps", type=float, default=0.0)
+    snapshot.add_argument("--seed", type=int, default=1)
+    allocation = subparsers.add_parser("allocation", help="Plan a synthetic eligible set under every allocation policy")
+    allocation.add_argument("--users", type=int, default=1000000)
+    allocation.add_argument("--total", type=float, default=1000000.0, help="Campaign total_tokens")
+    allocation.add_argument("--chains", default="ETH,SOL,XRP")
+    allocation.add_argument("--seed", type=int, default=1)
+    merkle = subparsers.add_parser("merkle", help="Build a claim tree over seeded allocations, publish its root and verify proofs")
+    merkle.add_argument("--leaves", type=int, default=100000)
+    merkle.add_argument("--lookups", type=int, default=1000)
+    merkle.add_argument("--seed", type=int, default=1)
+    startup = subparsers.add_parser("startup", help="Time fresh processes from interpreter start to the first handled /start")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--budget", type=float, default=0.0, help="Fail when p50 time to first update exceeds this many ms")
+    startup.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    startup.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    if args.command == "startup" and args.probe:
+        print(json.dumps(asyncio.run(startup_probe())))
+    elif args.command == "startup":
+        result = startup_benchmark(args)
+        if args.json:
+            print(json.dumps(result, indent=2))
+        else:
+            print_startup(result)
+        if args.budget and result["first_update"]["p50_ms"] > args.budget:
+            print(f"First update p50 {result['first_update']['p50_ms']:.1f}ms exceeds budget {args.budget:.1f}ms")
+            sys.exit(1)
+    elif args.command == "referrals":
+        print(json.dumps(referral_benchmark(args), indent=2))
+    elif args.command == "sybil":
+        print(json.dumps(asyncio.run(sybil_benchmark(args)), indent=2))
+    elif args.command == "allocation":
+        print(json.dumps(allocation_benchmark(args), indent=2))
+    elif args.command == "merkle":
+        print(json.dumps(asyncio.run(merkle_benchmark(args)), indent=2))
+    elif args.command == "snapshot":
+        print(json.dumps(asyncio.run(snapshot_benchmark(args)), indent=2))
+    elif args.command == "load":
+        results, writes = asyncio.run(load_test(args))
+        if args.json:
+            print(json.dumps({"flows": results, "writes": writes}, indent=2))
+        else:
+            print_results(results)
+            print("rows written: " + ", ".join(f"{table}={count}" for table, count in writes.items()))
+        missing = [table for table, count in writes.items() if count < args.users]
+        if missing:
+            print(f"Flows did not write their rows for every user ({', '.join(missing)}); the timings above are not valid")
+            sys.exit(1)
+    elif args.command == "distribution":
+        result = asyncio.run(distribution_benchmark(args))
+        if args.json:
+            print(json.dumps(result, indent=2))
+        else:
+            print_distribution(result)
+        if args.save_baseline:
+            with open(args.baseline, "w") as f:
+                json.dump(result, f, indent=2)
+            print(f"Baseline saved to {args.baseline}")
+        elif not compare_baseline(result, args.baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
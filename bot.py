@@ -1,41 +1,100 @@
+from __future__ import annotations
 import os
 import random
 import asyncio
 import sqlite3
 import logging
+import multiprocessing
+import concurrent.futures
 import re
-from datetime import datetime, timedelta
+import time
+import bisect
+import math
+import functools
+import itertools
+import importlib
+import io
+import threading
+import socket
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, ROUND_DOWN
 from typing import Optional, Union
-import discord
-from discord.ext import commands as discord_commands
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from web3 import Web3, Account
-import requests
-from solders.keypair import Keypair
-from solders.pubkey import Pubkey
-from solders.transaction import Transaction
-from solders.system_program import TransferParams, transfer
-from solders.message import Message
-from openpyxl import Workbook
+from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup
 from dotenv import load_dotenv
-from ratelimit import limits, sleep_and_retry
 import json
+import csv
+import base64
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
 import hashlib
 import pytz
-from xrpl.clients import JsonRpcClient
-from xrpl.wallet import Wallet
-from xrpl.models.transactions import Payment
-from xrpl.utils import xrp_to_drops
+
+PROCESS_STARTED = time.perf_counter()
+
+# Lazy Imports
+# Chain SDKs, openpyxl, requests and discord.py account for most of the import time, yet
+# the first /start needs none of them. Each name resolves its module on first use.
+class LazyImport:
+    def __init__(self, module: str, attr: str = None):
+        self._module = module
+        self._attr = attr
+        self._target = None
+
+    def _resolve(self):
+        if self._target is None:
+            target = importlib.import_module(self._module)
+            self._target = getattr(target, self._attr) if self._attr else target
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+def preload_lazy_imports():
+    # Called off the event loop once polling has started, so the first wallet or payout doesn't pay the import
+    for name, value in list(globals().items()):
+        if isinstance(value, LazyImport) and name != "discord":
+            value._resolve()
+
+discord = LazyImport("discord")
+requests = LazyImport("requests")
+rlp = LazyImport("rlp")
+Web3 = LazyImport("web3", "Web3")
+Account = LazyImport("web3", "Account")
+Keypair = LazyImport("solders.keypair", "Keypair")
+Pubkey = LazyImport("solders.pubkey", "Pubkey")
+Transaction = LazyImport("solders.transaction", "Transaction")
+TransferParams = LazyImport("solders.system_program", "TransferParams")
+transfer = LazyImport("solders.system_program", "transfer")
+Message = LazyImport("solders.message", "Message")
+Hash = LazyImport("solders.hash", "Hash")
+Workbook = LazyImport("openpyxl", "Workbook")
+load_workbook = LazyImport("openpyxl", "load_workbook")
+Wallet = LazyImport("xrpl.wallet", "Wallet")
+Payment = LazyImport("xrpl.models.transactions", "Payment")
+TicketCreate = LazyImport("xrpl.models.transactions", "TicketCreate")
+xrpl_sign = LazyImport("xrpl.transaction", "sign")
+xrpl_encode = LazyImport("xrpl.core.binarycodec", "encode")
+xrpl_decode = LazyImport("xrpl.core.binarycodec", "decode")
+addresscodec = LazyImport("xrpl.core.addresscodec")
 
 # Load environment variables
 load_dotenv()
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
-ETH_RPC_URL = os.getenv('ETH_RPC_URL', 'https://mainnet.infura.io/v3/your-infura-key')
-BSC_RPC_URL = os.getenv('BSC_RPC_URL', 'https://bsc-dataseed.binance.org/')
-SOL_RPC_URL = os.getenv('SOL_RPC_URL', 'https://api.devnet.solana.com')
-XRP_RPC_URL = os.getenv('XRP_RPC_URL', 'https://s1.ripple.com:51234/')
+# Each *_RPC_URL may list several comma-separated endpoints
+RPC_ENDPOINTS = {
+    "ETH": [url.strip() for url in os.getenv('ETH_RPC_URL', 'https://mainnet.infura.io/v3/your-infura-key').split(',') if url.strip()],
+    "BSC": [url.strip() for url in os.getenv('BSC_RPC_URL', 'https://bsc-dataseed.binance.org/').split(',') if url.strip()],
+    "SOL": [url.strip() for url in os.getenv('SOL_RPC_URL', 'https://api.devnet.solana.com').split(',') if url.strip()],
+    "XRP": [url.strip() for url in os.getenv('XRP_RPC_URL', 'https://s1.ripple.com:51234/').split(',') if url.strip()],
+}
+ETH_RPC_URL, BSC_RPC_URL, SOL_RPC_URL, XRP_RPC_URL = (RPC_ENDPOINTS[chain][0] for chain in ("ETH", "BSC", "SOL", "XRP"))
 ADMIN_ID = os.getenv('ADMIN_ID')
 ETH_SENDER_ADDRESS = os.getenv('ETH_SENDER_ADDRESS')
 ETH_PRIVATE_KEY = os.getenv('ETH_PRIVATE_KEY')
@@ -44,123 +103,477 @@ XRP_SENDER_ADDRESS = os.getenv('XRP_SENDER_ADDRESS')
 XRP_SENDER_SEED = os.getenv('XRP_SENDER_SEED')
 TOKEN_CONTRACT_ADDRESS = os.getenv('TOKEN_CONTRACT_ADDRESS')
 BOT_USERNAME = os.getenv('BOT_USERNAME', 'tigerr_airdrop_bot')
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS', '0'))
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+SEND_DELAY = float(os.getenv('SEND_DELAY', '0.5'))
+CONFIRM_INTERVAL = int(os.getenv('CONFIRM_INTERVAL', '60'))
+CONFIRM_EVM_BATCH = int(os.getenv('CONFIRM_EVM_BATCH', '100'))
+CONFIRM_DROP_DEPTH = int(os.getenv('CONFIRM_DROP_DEPTH', '12'))
+FEE_PERCENTILE = float(os.getenv('FEE_PERCENTILE', '50'))
+FEE_BUMP_AFTER = int(os.getenv('FEE_BUMP_AFTER', '180'))
+FEE_BUMP_PERCENT = float(os.getenv('FEE_BUMP_PERCENT', '15'))
+ETH_MAX_FEE_GWEI = float(os.getenv('ETH_MAX_FEE_GWEI', '300'))
+BSC_MAX_FEE_GWEI = float(os.getenv('BSC_MAX_FEE_GWEI', '20'))
 
 # Blockchain Setup
-web3_eth = Web3(Web3.HTTPProvider(ETH_RPC_URL))
-web3_bsc = Web3(Web3.HTTPProvider(BSC_RPC_URL))
-solana_client = requests.Session()
-solana_client.headers.update({"Content-Type": "application/json"})
-xrp_client = JsonRpcClient(XRP_RPC_URL)
-
-# ERC-20 Token ABI
-TOKEN_ABI = [
-    {"constant": False, "inputs": [{"name": "_to", "type": "address"}, {"name": "_value", "type": "uint256"}],
-     "name": "transfer", "outputs": [{"name": "", "type": "bool"}], "type": "function"},
-    {"constant": True, "inputs": [{"name": "_owner", "type": "address"}], "name": "balanceOf",
-     "outputs": [{"name": "balance", "type": "uint256"}], "type": "function"}
-]
+# Clients are built on first use so a cold start only pays for Telegram and SQLite
+evm_clients = {}
+rpc_sessions = []
+
+def rpc_session():
+    if not rpc_sessions:
+        rpc_sessions.append(requests.Session())
+    return rpc_sessions[0]
 
 # Logging Setup
 logging.basicConfig(filename='airdrop_bot.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Metrics
+# In-process counters/histograms rendered in Prometheus text format. Recording is a
+# dict lookup plus a bisect, so instrumentation stays on in production.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+        METRICS.append(self)
+
+    def inc(self, labels: tuple = (), value: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self):
+        for labels, value in list(self.values.items()):
+            yield f"{self.name}{_format_labels(labels)} {value}"
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, labels: tuple = ()):
+        self.values[labels] = value
+
+    def dec(self, labels: tuple = (), value: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - value
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.values = {}
+        METRICS.append(self)
+
+    def observe(self, value: float, labels: tuple = ()):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        for labels, (counts, total, count) in list(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_format_labels(labels, (('le', bound),))} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {count}"
+            yield f"{self.name}_sum{_format_labels(labels)} {total}"
+            yield f"{self.name}_count{_format_labels(labels)} {count}"
+
+METRICS = []
+HANDLER_LATENCY = Histogram("airdrop_handler_seconds", "Handler latency by handler and action")
+HANDLER_ERRORS = Counter("airdrop_handler_errors_total", "Unhandled handler exceptions by handler and action")
+RPC_LATENCY = Histogram("airdrop_rpc_seconds", "Blockchain RPC latency by chain and method")
+RPC_ERRORS = Counter("airdrop_rpc_errors_total", "Blockchain RPC errors by chain and method")
+SQL_LATENCY = Histogram("airdrop_sql_seconds", "SQLite statement latency by statement type")
+OUTBOUND_INFLIGHT = Gauge("airdrop_outbound_messages_inflight", "Outbound messages waiting to be delivered")
+OUTBOUND_SENT = Counter("airdrop_outbound_messages_total", "Outbound messages by platform and result")
+DISTRIBUTION_TRANSFERS = Counter("airdrop_distribution_transfers_total", "Distribution transfers by chain and result")
+DISTRIBUTION_TOKENS = Counter("airdrop_distribution_tokens_total", "Tokens handed to the chain by chain")
+RPC_THROTTLED = Counter("airdrop_rpc_throttled_total", "RPC requests rejected with 429/503 by chain and method")
+RPC_ENDPOINT_LATENCY = Gauge("airdrop_rpc_endpoint_latency_seconds", "Smoothed latency per RPC endpoint")
+RPC_ENDPOINT_HEALTHY = Gauge("airdrop_rpc_endpoint_healthy", "1 while an RPC endpoint is in rotation")
+RPC_HEDGED = Counter("airdrop_rpc_hedged_total", "Read requests that started a hedge on a second endpoint")
+STARTUP_SECONDS = Gauge("airdrop_startup_seconds", "Seconds from process start to the end of each startup phase")
+
+def render_metrics() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+@contextmanager
+def observe_rpc(chain: str, method: str):
+    labels = (("chain", chain), ("method", method))
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        RPC_ERRORS.inc(labels)
+        raise
+    finally:
+        RPC_LATENCY.observe(time.perf_counter() - started, labels)
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port: int):
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Metrics endpoint listening on :{port}/metrics")
+    return server
+
+def _statement_type(sql: str) -> str:
+    return sql.lstrip()[:8].split(None, 1)[0].upper()
+
+# SQL Profiler
+# Opt-in (SQL_PROFILE=1 or /sqltop on): aggregates count/total/max per normalized
+# statement and logs statements slower than SQL_SLOW_MS with their query plan.
+SQL_PROFILE = os.getenv('SQL_PROFILE', '0') == '1'
+SQL_SLOW_MS = float(os.getenv('SQL_SLOW_MS', '50'))
+
+class SqlProfiler:
+    def __init__(self, enabled: bool, slow_ms: float):
+        self.enabled = enabled
+        self.slow_seconds = slow_ms / 1000
+        self.stats = {}
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def normalize(sql: str) -> str:
+        # Bounded, since statements with inlined values would otherwise each stay cached forever
+        normalized = re.sub(r"'(?:[^']|'')*'", "?", sql)
+        normalized = re.sub(r"\b\d+(?:\.\d+)?\b", "?", normalized)
+        normalized = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?+)", normalized)
+        return " ".join(normalized.split())
+
+    def record(self, db_cursor: sqlite3.Cursor, sql: str, parameters, elapsed: float):
+        normalized = self.normalize(sql)
+        entry = self.stats.get(normalized)
+        if entry is None:
+            entry = self.stats[normalized] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += elapsed
+        if elapsed > entry[2]:
+            entry[2] = elapsed
+        if elapsed >= self.slow_seconds:
+            logger.warning(f"Slow query ({elapsed * 1000:.1f} ms): {normalized}\n{self.explain(db_cursor, sql, parameters)}")
+
+    def explain(self, db_cursor: sqlite3.Cursor, sql: str, parameters) -> str:
+        if _statement_type(sql) not in ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH"):
+            return "(no plan)"
+        try:
+            plan = db_cursor.connection.cursor(sqlite3.Cursor).execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+            return "\n".join(f"  {row[-1]}" for row in plan)
+        except sqlite3.Error as e:
+            return f"(plan unavailable: {str(e)})"
+
+    def top(self, limit: int = 10) -> list:
+        ranked = sorted(self.stats.items(), key=lambda item: item[1][1], reverse=True)
+        return [(sql, count, total, worst) for sql, (count, total, worst) in ranked[:limit]]
+
+    def report(self, limit: int = 10) -> str:
+        rows = self.top(limit)
+        if not rows:
+            return "No statements profiled yet." if self.enabled else "SQL profiler is off."
+        lines = [f"{'total_ms':>10} {'count':>8} {'avg_ms':>8} {'max_ms':>8}  statement"]
+        for sql, count, total, worst in rows:
+            lines.append(f"{total * 1000:10.1f} {count:8d} {total * 1000 / count:8.2f} {worst * 1000:8.2f}  {sql}")
+        return "\n".join(lines)
+
+sql_profiler = SqlProfiler(SQL_PROFILE, SQL_SLOW_MS)
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            SQL_LATENCY.observe(elapsed, (("statement", _statement_type(sql)),))
+            if sql_profiler.enabled:
+                sql_profiler.record(self, sql, parameters, elapsed)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            SQL_LATENCY.observe(elapsed, (("statement", _statement_type(sql)),))
+            if sql_profiler.enabled:
+                sql_profiler.record(self, sql, (), elapsed)
+
+class InstrumentedConnection(sqlite3.Connection):
+    # conn.execute() runs on an internal cursor in C, so it is routed through InstrumentedCursor here
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
 # SQLite Setup
-conn = sqlite3.connect('airdrop.db', check_same_thread=False)
+conn = sqlite3.connect('airdrop.db', check_same_thread=False, timeout=30, factory=InstrumentedConnection)
+conn.execute("PRAGMA journal_mode=WAL")
 cursor = conn.cursor()
 
-cursor.executescript('''
-    CREATE TABLE IF NOT EXISTS users (
-        user_id TEXT PRIMARY KEY, username TEXT, language TEXT, referral_code TEXT, referred_by TEXT,
-        kyc_status TEXT DEFAULT 'pending', agreed_terms INTEGER, Birdz_balance REAL DEFAULT 0,
-        kyc_telegram_link TEXT, kyc_x_link TEXT, kyc_wallet TEXT, kyc_chain TEXT, kyc_submission_time TEXT,
-        has_seen_menu INTEGER DEFAULT 0, joined_groups INTEGER DEFAULT 0
-    );
-    CREATE TABLE IF NOT EXISTS captchas (user_id TEXT PRIMARY KEY, captcha INTEGER, timestamp TEXT);
-    CREATE TABLE IF NOT EXISTS submissions (user_id TEXT PRIMARY KEY, wallet TEXT, chain TEXT, timestamp TEXT);
-    CREATE TABLE IF NOT EXISTS eligible (user_id TEXT PRIMARY KEY, wallet TEXT, chain TEXT, tier INTEGER, verified INTEGER, token_balance REAL, social_tasks_completed INTEGER);
-    CREATE TABLE IF NOT EXISTS distributions (user_id TEXT PRIMARY KEY, wallet TEXT, chain TEXT, amount REAL, status TEXT, tx_hash TEXT);
-    CREATE TABLE IF NOT EXISTS referrals (referrer_id TEXT, referee_id TEXT PRIMARY KEY, timestamp TEXT, status TEXT DEFAULT 'pending');
-    CREATE TABLE IF NOT EXISTS blacklist (wallet TEXT PRIMARY KEY);
-    CREATE TABLE IF NOT EXISTS whitelist (wallet TEXT PRIMARY KEY);
-    CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT);
-    CREATE TABLE IF NOT EXISTS campaigns (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, start_date TEXT, end_date TEXT, total_tokens REAL, active INTEGER DEFAULT 1);
-    CREATE TABLE IF NOT EXISTS daily_tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, description TEXT, reward REAL DEFAULT 10, active INTEGER DEFAULT 1, mandatory INTEGER DEFAULT 0, task_link TEXT);
-    CREATE TABLE IF NOT EXISTS task_completions (user_id TEXT, task_id INTEGER, completion_date TEXT, username TEXT, status TEXT DEFAULT 'pending', PRIMARY KEY (user_id, task_id, completion_date));
-    CREATE TABLE IF NOT EXISTS admin_states (
-        user_id TEXT PRIMARY KEY,
-        state TEXT,
-        task_id TEXT,
-        timestamp TEXT
-    );
-    CREATE TABLE IF NOT EXISTS tokens (
-        token_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        contract_address TEXT,
-        chain TEXT,
-        decimals INTEGER DEFAULT 18
-    );
-    CREATE TABLE IF NOT EXISTS admins (
-        user_id TEXT PRIMARY KEY,
-        username TEXT,
-        role TEXT DEFAULT 'admin',
-        added_by TEXT,
-        added_at TEXT,
-        permissions TEXT DEFAULT 'all'
-    );
-    CREATE TABLE IF NOT EXISTS token_distributions (
-        token_id INTEGER,
-        tier INTEGER,
-        amount REAL,
-        contract_address TEXT,  -- Added contract_address for tier-specific tokens
-        PRIMARY KEY (token_id, tier)
-    );
-''')
-conn.commit()
-
-# Config Initialization
-cursor.execute("INSERT OR IGNORE INTO config (key, value) VALUES (?, ?)", ("total_supply", "1000000"))
-cursor.execute("INSERT OR IGNORE INTO config (key, value) VALUES (?, ?)", ("tier_1_amount", "1000"))
-cursor.execute("INSERT OR IGNORE INTO config (key, value) VALUES (?, ?)", ("tier_2_amount", "2000"))
-cursor.execute("INSERT OR IGNORE INTO config (key, value) VALUES (?, ?)", ("tier_3_amount", "5000"))
-cursor.execute("INSERT OR IGNORE INTO config (key, value) VALUES (?, ?)", ("referral_bonus", "15"))
-cursor.execute("INSERT OR IGNORE INTO config (key, value) VALUES (?, ?)", ("min_token_balance", "100"))
-
-# Add default admin
-cursor.execute("INSERT OR IGNORE INTO admins (user_id, username, role, added_by, added_at) VALUES (?, ?, ?, ?, ?)",
-               (ADMIN_ID, "Super Admin", "super_admin", "system", datetime.utcnow().isoformat()))
-conn.commit()
-
-# Sample Tokens with Tier-Specific Contract Addresses
-cursor.execute("INSERT OR IGNORE INTO tokens (name, contract_address, chain) VALUES (?, ?, ?)",
-               ("BirdzCoin", TOKEN_CONTRACT_ADDRESS, "ETH"))
-cursor.execute("INSERT OR IGNORE INTO tokens (name, contract_address, chain) VALUES (?, ?, ?)",
-               ("SampleToken", "0xAnotherTokenAddress", "BSC"))
-conn.commit()
-
-# Token distribution defaults with tier-specific contract addresses
-cursor.execute("INSERT OR IGNORE INTO token_distributions (token_id, tier, amount, contract_address) VALUES (?, ?, ?, ?)",
-               (1, 1, 1000, "0xTier1ETHContractAddress"))  # ETH Tier 1
-cursor.execute("INSERT OR IGNORE INTO token_distributions (token_id, tier, amount, contract_address) VALUES (?, ?, ?, ?)",
-               (1, 2, 2000, "0xTier2ETHContractAddress"))  # ETH Tier 2
-cursor.execute("INSERT OR IGNORE INTO token_distributions (token_id, tier, amount, contract_address) VALUES (?, ?, ?, ?)",
-               (1, 3, 5000, "0xTier3ETHContractAddress"))  # ETH Tier 3
-cursor.execute("INSERT OR IGNORE INTO token_distributions (token_id, tier, amount, contract_address) VALUES (?, ?, ?, ?)",
-               (2, 1, 1000, "0xTier1BSCContractAddress"))  # BSC Tier 1 (example)
-conn.commit()
-
-# Sample Campaign and Tasks
-cursor.execute("INSERT OR IGNORE INTO campaigns (name, start_date, end_date, total_tokens, active) VALUES (?, ?, ?, ?, ?)",
-               ("Launch Airdrop", datetime.utcnow().isoformat(), (datetime.utcnow() + timedelta(days=7)).isoformat(), 1000000, 1))
-cursor.executescript("DELETE FROM daily_tasks")
-daily_tasks = [
-    ("Watch YouTube Video", 10, 0, "https://youtube.com/example"),
-    ("Join Telegram", 10, 1, "https://t.me/examplegroup"),
-    ("Follow Twitter", 10, 0, "https://twitter.com/example")
-]
-for description, reward, mandatory, task_link in daily_tasks:
-    cursor.execute("INSERT OR IGNORE INTO daily_tasks (description, reward, mandatory, task_link, active) VALUES (?, ?, ?, ?, 1)",
-                   (description, reward, mandatory, task_link))
-conn.commit()
+def ensure_columns(table: str, columns: list):
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+    for name, definition in columns:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+def init_referral_counts():
+    # Triggers are recreated on every start so their bodies follow the code
+    cursor.executescript('''
+        BEGIN;
+        CREATE TABLE IF NOT EXISTS referral_counts (user_id TEXT PRIMARY KEY, pending INTEGER DEFAULT 0, approved INTEGER DEFAULT 0);
+        CREATE INDEX IF NOT EXISTS idx_referral_counts_approved ON referral_counts(approved);
+        CREATE INDEX IF NOT EXISTS idx_referrals_referrer ON referrals(referrer_id);
+        DROP TRIGGER IF EXISTS referrals_counts_insert;
+        DROP TRIGGER IF EXISTS referrals_counts_update;
+        DROP TRIGGER IF EXISTS referrals_counts_delete;
+        CREATE TRIGGER referrals_counts_insert AFTER INSERT ON referrals BEGIN
+            INSERT INTO referral_counts (user_id, pending, approved) VALUES (NEW.referrer_id, NEW.status = 'pending', NEW.status = 'approved')
+            ON CONFLICT(user_id) DO UPDATE SET pending = pending + excluded.pending, approved = approved + excluded.approved;
+            INSERT INTO data_versions (name, version) VALUES ('referrals', 1) ON CONFLICT(name) DO UPDATE SET version = version + 1;
+        END;
+        CREATE TRIGGER referrals_counts_update AFTER UPDATE OF status, referrer_id ON referrals BEGIN
+            UPDATE referral_counts SET pending = pending - (OLD.status = 'pending'), approved = approved - (OLD.status = 'approved')
+            WHERE user_id = OLD.referrer_id;
+            INSERT INTO referral_counts (user_id, pending, approved) VALUES (NEW.referrer_id, NEW.status = 'pending', NEW.status = 'approved')
+            ON CONFLICT(user_id) DO UPDATE SET pending = pending + excluded.pending, approved = approved + excluded.approved;
+            INSERT INTO data_versions (name, version) VALUES ('referrals', 1) ON CONFLICT(name) DO UPDATE SET version = version + 1;
+        END;
+        CREATE TRIGGER referrals_counts_delete AFTER DELETE ON referrals BEGIN
+            UPDATE referral_counts SET pending = pending - (OLD.status = 'pending'), approved = approved - (OLD.status = 'approved')
+            WHERE user_id = OLD.referrer_id;
+            INSERT INTO data_versions (name, version) VALUES ('referrals', 1) ON CONFLICT(name) DO UPDATE SET version = version + 1;
+        END;
+        COMMIT;
+    ''')
+    # Counters start from a full scan once; the triggers keep them current from then on
+    if not cursor.execute("SELECT 1 FROM referral_counts LIMIT 1").fetchone():
+        cursor.execute("""INSERT INTO referral_counts (user_id, pending, approved)
+                          SELECT referrer_id, SUM(status = 'pending'), SUM(status = 'approved') FROM referrals GROUP BY referrer_id""")
+
+def init_db():
+    cursor.executescript('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY, username TEXT, language TEXT, referral_code TEXT, referred_by TEXT,
+            kyc_status TEXT DEFAULT 'pending', agreed_terms INTEGER, Birdz_balance REAL DEFAULT 0,
+            kyc_telegram_link TEXT, kyc_x_link TEXT, kyc_wallet TEXT, kyc_chain TEXT, kyc_submission_time TEXT,
+            has_seen_menu INTEGER DEFAULT 0, joined_groups INTEGER DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS captchas (user_id TEXT PRIMARY KEY, captcha INTEGER, timestamp TEXT);
+        CREATE TABLE IF NOT EXISTS submissions (user_id TEXT PRIMARY KEY, wallet TEXT, chain TEXT, timestamp TEXT);
+        CREATE TABLE IF NOT EXISTS eligible (user_id TEXT PRIMARY KEY, wallet TEXT, chain TEXT, tier INTEGER, verified INTEGER, token_balance REAL, social_tasks_completed INTEGER);
+        CREATE TABLE IF NOT EXISTS distributions (user_id TEXT PRIMARY KEY, wallet TEXT, chain TEXT, amount REAL, status TEXT, tx_hash TEXT);
+        CREATE TABLE IF NOT EXISTS referrals (referrer_id TEXT, referee_id TEXT PRIMARY KEY, timestamp TEXT, status TEXT DEFAULT 'pending');
+        CREATE TABLE IF NOT EXISTS blacklist (wallet TEXT PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS whitelist (wallet TEXT PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS data_versions (name TEXT PRIMARY KEY, version INTEGER);
+        CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS campaigns (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, start_date TEXT, end_date TEXT, total_tokens REAL, active INTEGER DEFAULT 1);
+        CREATE TABLE IF NOT EXISTS daily_tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, description TEXT, reward REAL DEFAULT 10, active INTEGER DEFAULT 1, mandatory INTEGER DEFAULT 0, task_link TEXT);
+        CREATE TABLE IF NOT EXISTS task_completions (user_id TEXT, task_id INTEGER, completion_date TEXT, username TEXT, status TEXT DEFAULT 'pending', PRIMARY KEY (user_id, task_id, completion_date));
+        CREATE TABLE IF NOT EXISTS admin_states (
+            user_id TEXT PRIMARY KEY,
+            state TEXT,
+            task_id TEXT,
+            timestamp TEXT
+        );
+        CREATE TABLE IF NOT EXISTS tokens (
+            token_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            contract_address TEXT,
+            chain TEXT,
+            decimals INTEGER DEFAULT 18
+        );
+        CREATE TABLE IF NOT EXISTS admins (
+            user_id TEXT PRIMARY KEY,
+            username TEXT,
+            role TEXT DEFAULT 'admin',
+            added_by TEXT,
+            added_at TEXT,
+            permissions TEXT DEFAULT 'all'
+        );
+        CREATE TABLE IF NOT EXISTS token_distributions (
+            token_id INTEGER,
+            tier INTEGER,
+            amount REAL,
+            contract_address TEXT,  -- Added contract_address for tier-specific tokens
+            PRIMARY KEY (token_id, tier)
+        );
+        CREATE TABLE IF NOT EXISTS distribution_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            token_id TEXT,
+            chat_id TEXT,
+            lang TEXT,
+            status TEXT,
+            started_at TEXT,
+            updated_at TEXT
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_distribution_runs_active ON distribution_runs(status) WHERE status IN ('running', 'paused');
+    ''')
+    # Versions used to live in wallet_list_versions, with a normalized flag per wallet list
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'wallet_list_versions'").fetchone():
+        legacy = [row[1] for row in cursor.execute("PRAGMA table_info(wallet_list_versions)").fetchall()]
+        cursor.execute("INSERT OR IGNORE INTO data_versions (name, version) SELECT name, version FROM wallet_list_versions")
+        if "normalized" in legacy:
+            cursor.execute("""INSERT OR IGNORE INTO data_versions (name, version)
+                              SELECT name || '_format', 1 FROM wallet_list_versions WHERE normalized = 1""")
+        cursor.execute("DROP TABLE wallet_list_versions")
+        conn.commit()
+    ensure_columns("distribution_runs", [
+        ("lease_owner", "TEXT"),
+        ("lease_until", "TEXT"),
+    ])
+    ensure_columns("campaigns", [
+        ("snapshot_chain", "TEXT"),
+        ("snapshot_block", "INTEGER"),
+    ])
+    ensure_columns("distributions", [
+        ("signed_tx", "TEXT"),
+        ("nonce", "INTEGER"),
+        ("attempts", "INTEGER DEFAULT 0"),
+        ("last_error", "TEXT"),
+        ("updated_at", "TEXT"),
+        ("prior_hashes", "TEXT"),
+        ("amount_base", "TEXT"),
+        ("sender", "TEXT"),
+    ])
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_distributions_status ON distributions(status)")
+    ensure_columns("eligible", [
+        ("sybil_hold", "INTEGER DEFAULT 0"),
+    ])
+    init_referral_counts()
+    cursor.executescript('''
+        CREATE TABLE IF NOT EXISTS sybil_clusters (id INTEGER PRIMARY KEY, size INTEGER, score REAL, links TEXT, flagged INTEGER);
+        CREATE TABLE IF NOT EXISTS sybil_members (user_id TEXT PRIMARY KEY, cluster_id INTEGER, dropped INTEGER DEFAULT 0);
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, params TEXT, status TEXT, done INTEGER DEFAULT 0, total INTEGER DEFAULT 0,
+            message TEXT, chat_id TEXT, lang TEXT, created_by TEXT, created_at TEXT, started_at TEXT, finished_at TEXT, updated_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+        CREATE TABLE IF NOT EXISTS merkle_roots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, chain TEXT, token_id TEXT, distributor TEXT, root TEXT, leaves INTEGER, total_base TEXT,
+            status TEXT, tx_hash TEXT, signed_tx TEXT, nonce INTEGER, created_at TEXT, updated_at TEXT
+        );
+        CREATE TABLE IF NOT EXISTS merkle_claims (
+            root_id INTEGER, idx INTEGER, user_id TEXT, account TEXT, amount_base TEXT, PRIMARY KEY (root_id, idx)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_merkle_claims_user ON merkle_claims(user_id);
+        CREATE TABLE IF NOT EXISTS merkle_nodes (
+            root_id INTEGER, level INTEGER, position INTEGER, hash BLOB, PRIMARY KEY (root_id, level, position)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS balance_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, campaign_id INTEGER, version INTEGER, status TEXT, trigger TEXT, pins TEXT,
+            wallets INTEGER DEFAULT 0, errors INTEGER DEFAULT 0, started_at TEXT, finished_at TEXT, UNIQUE (campaign_id, version)
+        );
+        CREATE TABLE IF NOT EXISTS snapshot_balances (
+            snapshot_id INTEGER, user_id TEXT, wallet TEXT, chain TEXT, balance REAL, tier INTEGER, error TEXT, PRIMARY KEY (snapshot_id, user_id)
+        );
+    ''')
+    ensure_columns("merkle_roots", [
+        ("base_root_id", "INTEGER"),
+    ])
+    ensure_columns("jobs", [
+        ("owner", "TEXT"),
+        ("lease_until", "TEXT"),
+    ])
+    conn.commit()
+
+    # Config Initialization
+    cursor.executemany("INSERT OR IGNORE INTO config (key, value) VALUES (?, ?)",
+                       [(key, str(default)) for key, (_, default, _) in CONFIG_SCHEMA.items()])
+
+    # Add default admin
+    cursor.execute("INSERT OR IGNORE INTO admins (user_id, username, role, added_by, added_at) VALUES (?, ?, ?, ?, ?)",
+                   (ADMIN_ID, "Super Admin", "super_admin", "system", datetime.utcnow().isoformat()))
+    conn.commit()
+
+    # Sample Tokens with Tier-Specific Contract Addresses
+    cursor.execute("INSERT OR IGNORE INTO tokens (name, contract_address, chain) VALUES (?, ?, ?)",
+                   ("BirdzCoin", TOKEN_CONTRACT_ADDRESS, "ETH"))
+    cursor.execute("INSERT OR IGNORE INTO tokens (name, contract_address, chain) VALUES (?, ?, ?)",
+                   ("SampleToken", "0xAnotherTokenAddress", "BSC"))
+    conn.commit()
+
+    # Token distribution defaults with tier-specific contract addresses
+    cursor.execute("INSERT OR IGNORE INTO token_distributions (token_id, tier, amount, contract_address) VALUES (?, ?, ?, ?)",
+                   (1, 1, 1000, "0xTier1ETHContractAddress"))  # ETH Tier 1
+    cursor.execute("INSERT OR IGNORE INTO token_distributions (token_id, tier, amount, contract_address) VALUES (?, ?, ?, ?)",
+                   (1, 2, 2000, "0xTier2ETHContractAddress"))  # ETH Tier 2
+    cursor.execute("INSERT OR IGNORE INTO token_distributions (token_id, tier, amount, contract_address) VALUES (?, ?, ?, ?)",
+                   (1, 3, 5000, "0xTier3ETHContractAddress"))  # ETH Tier 3
+    cursor.execute("INSERT OR IGNORE INTO token_distributions (token_id, tier, amount, contract_address) VALUES (?, ?, ?, ?)",
+                   (2, 1, 1000, "0xTier1BSCContractAddress"))  # BSC Tier 1 (example)
+    conn.commit()
+
+    # Sample Campaign and Tasks
+    cursor.execute("INSERT OR IGNORE INTO campaigns (name, start_date, end_date, total_tokens, active) VALUES (?, ?, ?, ?, ?)",
+                   ("Launch Airdrop", datetime.utcnow().isoformat(), (datetime.utcnow() + timedelta(days=7)).isoformat(), 1000000, 1))
+    cursor.executescript("DELETE FROM daily_tasks")
+    daily_tasks = [
+        ("Watch YouTube Video", 10, 0, "https://youtube.com/example"),
+        ("Join Telegram", 10, 1, "https://t.me/examplegroup"),
+        ("Follow Twitter", 10, 0, "https://twitter.com/example")
+    ]
+    for description, reward, mandatory, task_link in daily_tasks:
+        cursor.execute("INSERT OR IGNORE INTO daily_tasks (description, reward, mandatory, task_link, active) VALUES (?, ?, ?, ?, 1)",
+                       (description, reward, mandatory, task_link))
+    conn.commit()
+
+# Startup
+# Importing the module has no side effects beyond opening the connection; bootstrap work
+# runs here so entry points (main, shard workers, benchmarks) decide when to pay for it.
+startup_done = []
+
+def startup(bootstrap: bool = True):
+    if startup_done:
+        return
+    STARTUP_SECONDS.set(time.perf_counter() - PROCESS_STARTED, (("phase", "import"),))
+    # Worker processes (sharded mode) share the database created by the front process
+    if bootstrap:
+        init_db()
+    runtime_config.load()
+    startup_done.append(True)
+    STARTUP_SECONDS.set(time.perf_counter() - PROCESS_STARTED, (("phase", "bootstrap"),))
+    logger.info(f"Startup finished in {time.perf_counter() - PROCESS_STARTED:.3f}s")
 
 # Language Support (unchanged, included for completeness)
 LANGUAGES = {
@@ -173,6 +586,7 @@ LANGUAGES = {
         "usage": "Select chain (ETH, BSC, SOL, XRP) and enter wallet:",
         "captcha": "Solve: {captcha} + 5 = ?",
         "verified": "Wallet verified! Tier {tier}.",
+        "wallet_registered": "Wallet registered! Your tier is set from the balance snapshot taken when the campaign ends.",
         "blacklisted": "This wallet is blacklisted.",
         "invalid_address": "Invalid {chain} address (e.g., ETH: 0x..., SOL: SoL..., XRP: r...).",
         "no_assets": "No qualifying assets found.",
@@ -204,14 +618,234 @@ LANGUAGES = {
     }
 }
 
-# Rate Limiting (unchanged)
-CALLS_PER_MINUTE = 10
-PERIOD = 60
+# Rate Limiting
+# One token bucket per (endpoint, method). A 429/503 halves that bucket's rate and honours
+# Retry-After; successes creep back towards the configured rate. Waiters queue on the
+# bucket's lock, which asyncio hands over in FIFO order, so waits are served fairly and
+# only coroutines calling a throttled endpoint are slowed.
+RPC_RATE = float(os.getenv('RPC_RATE', '50'))
+RPC_BURST = int(os.getenv('RPC_BURST', '50'))
+RPC_MAX_RETRIES = int(os.getenv('RPC_MAX_RETRIES', '5'))
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                self._refill()
+                wait = self.blocked_until - time.monotonic()
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep(max(wait, (1 - self.tokens) / self.rate))
+
+    def throttled(self, retry_after: Optional[float]):
+        self.rate = max(self.max_rate / 64, self.rate / 2)
+        self.tokens = 0.0
+        self.blocked_until = time.monotonic() + (retry_after if retry_after is not None else 1 / self.rate)
 
-@sleep_and_retry
-@limits(calls=CALLS_PER_MINUTE, period=PERIOD)
-def rate_limited_request(url, payload):
-    return requests.post(url, json=payload).json()
+    def succeeded(self):
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+rate_buckets = {}
+
+def rate_bucket(url: str, method: str) -> TokenBucket:
+    key = (url, method)
+    if key not in rate_buckets:
+        rate_buckets[key] = TokenBucket(RPC_RATE, RPC_BURST)
+    return rate_buckets[key]
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+async def rate_limited_request(chain: str, url: str, payload, method: str):
+    bucket = rate_bucket(url, method)
+    for _ in range(RPC_MAX_RETRIES):
+        await bucket.acquire()
+        with observe_rpc(chain, method):
+            response = await asyncio.to_thread(rpc_session().post, url, json=payload, timeout=30)
+        if response.status_code in (429, 503):
+            RPC_THROTTLED.inc((("chain", chain), ("method", method)))
+            bucket.throttled(parse_retry_after(response.headers.get("Retry-After")))
+            continue
+        bucket.succeeded()
+        response.raise_for_status()
+        return response.json()
+    raise Exception(f"{chain} {method} still rate limited after {RPC_MAX_RETRIES} attempts")
+
+# RPC Endpoint Pool
+# Tracks smoothed latency and consecutive errors per endpoint and routes each request
+# to the fastest healthy one, failing over down the list. Endpoints that keep failing
+# leave rotation for RPC_EJECT_SECONDS. Reads may hedge: if the first endpoint has not
+# answered within RPC_HEDGE_MS a second one is asked and the first answer wins. Health
+# checks also read each endpoint's head, and one more than RPC_MAX_LAG blocks behind the
+# pool's highest head stays out of rotation until it catches up. Reads whose "not found"
+# would re-send a transfer never hedge; they ask every endpoint and act only on agreement.
+RPC_EJECT_AFTER = int(os.getenv('RPC_EJECT_AFTER', '3'))
+RPC_EJECT_SECONDS = int(os.getenv('RPC_EJECT_SECONDS', '30'))
+RPC_HEDGE_MS = int(os.getenv('RPC_HEDGE_MS', '500'))
+RPC_HEALTH_INTERVAL = int(os.getenv('RPC_HEALTH_INTERVAL', '15'))
+RPC_HEALTH_METHODS = {"ETH": ("eth_blockNumber", []), "BSC": ("eth_blockNumber", []), "SOL": ("getBlockHeight", []), "XRP": ("server_info", [{}])}
+RPC_MAX_LAG = {chain: int(os.getenv(f'{chain}_RPC_MAX_LAG', default)) for chain, default in (("ETH", "3"), ("BSC", "5"), ("SOL", "50"), ("XRP", "3"))}
+
+class Endpoint:
+    def __init__(self, chain: str, url: str):
+        self.chain = chain
+        self.url = url
+        self.latency = None
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.height = None
+        self.lagging = False
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.ejected_until and not self.lagging
+
+    def record(self, seconds: Optional[float]):
+        labels = (("chain", self.chain), ("endpoint", urlparse(self.url).netloc))
+        if seconds is None:
+            self.failures += 1
+            if self.failures >= RPC_EJECT_AFTER:
+                self.ejected_until = time.monotonic() + RPC_EJECT_SECONDS
+                RPC_ENDPOINT_HEALTHY.set(0, labels)
+                logger.warning(f"Taking {self.chain} endpoint {self.url} out of rotation after {self.failures} errors")
+            return
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+        RPC_ENDPOINT_LATENCY.set(self.latency, labels)
+        RPC_ENDPOINT_HEALTHY.set(0 if self.lagging else 1, labels)
+
+class EndpointPool:
+    def __init__(self, chain: str, urls: list):
+        self.chain = chain
+        self.endpoints = [Endpoint(chain, url) for url in urls]
+
+    def ranked(self) -> list:
+        # Unmeasured endpoints sort first so each gets probed; ejected ones are only a last resort
+        healthy = sorted((e for e in self.endpoints if e.healthy), key=lambda e: e.latency or 0.0)
+        ejected = sorted((e for e in self.endpoints if not e.healthy), key=lambda e: e.ejected_until)
+        return healthy + ejected
+
+    def best(self) -> str:
+        return self.ranked()[0].url
+
+    async def call(self, endpoint: Endpoint, payload, method: str):
+        started = time.perf_counter()
+        try:
+            response = await rate_limited_request(self.chain, endpoint.url, payload, method)
+        except Exception:
+            endpoint.record(None)
+            raise
+        endpoint.record(time.perf_counter() - started)
+        return response
+
+    async def request(self, payload, method: str, hedge: bool = False, endpoint: Optional[Endpoint] = None):
+        # A pinned endpoint serves reads that must all see the same node's view of the chain
+        if endpoint is not None:
+            return await self.call(endpoint, payload, method)
+        candidates = self.ranked()
+        # Hedges only go to endpoints in rotation, never to a lagging or ejected one
+        in_rotation = [e for e in candidates if e.healthy]
+        if hedge and len(in_rotation) > 1:
+            return await self.hedged(in_rotation, payload, method)
+        error = None
+        for endpoint in candidates:
+            try:
+                return await self.call(endpoint, payload, method)
+            except Exception as e:
+                error = e
+                logger.warning(f"{self.chain} {method} failed on {endpoint.url}: {str(e)}")
+        raise error
+
+    async def hedged(self, candidates: list, payload, method: str):
+        tasks = [asyncio.create_task(self.call(candidates[0], payload, method))]
+        remaining = candidates[1:]
+        error = None
+        try:
+            while tasks:
+                timeout = RPC_HEDGE_MS / 1000 if remaining and len(tasks) == 1 else None
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    RPC_HEDGED.inc((("chain", self.chain), ("method", method)))
+                    tasks.append(asyncio.create_task(self.call(remaining.pop(0), payload, method)))
+                    continue
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not tasks and remaining:
+                    tasks.append(asyncio.create_task(self.call(remaining.pop(0), payload, method)))
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def request_all(self, payload, method: str) -> list:
+        # One response per endpoint in rotation (all endpoints if none is); endpoints that error are left out
+        endpoints = [e for e in self.endpoints if e.healthy] or self.endpoints
+        responses = await asyncio.gather(*(self.call(endpoint, payload, method) for endpoint in endpoints), return_exceptions=True)
+        return [response for response in responses if not isinstance(response, Exception)]
+
+    def head_height(self, response) -> Optional[int]:
+        if self.chain == "XRP":
+            return int(response["result"]["info"]["validated_ledger"]["seq"])
+        result = response["result"]
+        return int(result, 16) if isinstance(result, str) else int(result)
+
+    async def check_health(self):
+        method, params = RPC_HEALTH_METHODS[self.chain]
+        payload = {"method": method, "params": params} if self.chain == "XRP" else {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+        for endpoint in self.endpoints:
+            try:
+                endpoint.height = self.head_height(await self.call(endpoint, payload, method))
+            except Exception as e:
+                endpoint.height = None
+                logger.info(f"Health check of {self.chain} endpoint {endpoint.url} failed: {str(e)}")
+        heights = [e.height for e in self.endpoints if e.height is not None]
+        if not heights:
+            return
+        head = max(heights)
+        for endpoint in self.endpoints:
+            lagging = endpoint.height is not None and head - endpoint.height > RPC_MAX_LAG[self.chain]
+            if lagging != endpoint.lagging:
+                logger.warning(f"{self.chain} endpoint {endpoint.url} is {head - endpoint.height} blocks behind the pool head"
+                               if lagging else f"{self.chain} endpoint {endpoint.url} caught up with the pool head")
+                RPC_ENDPOINT_HEALTHY.set(0 if lagging else 1, (("chain", self.chain), ("endpoint", urlparse(endpoint.url).netloc)))
+            endpoint.lagging = lagging
+
+rpc_pools = {chain: EndpointPool(chain, urls) for chain, urls in RPC_ENDPOINTS.items()}
+
+async def run_endpoint_health_checks(interval: int):
+    while True:
+        await asyncio.sleep(interval)
+        for pool in rpc_pools.values():
+            if len(pool.endpoints) > 1:
+                await pool.check_health()
 
 # Unified Context Class (unchanged)
 class BotContext:
@@ -221,6 +855,7 @@ class BotContext:
         self.bot = None
 
     async def send_message(self, chat_id: str, text: str, reply_markup=None):
+        OUTBOUND_INFLIGHT.inc()
         try:
             if self.platform == "telegram":
                 format_args = self.user_data.get("format_args", {})
@@ -229,7 +864,7 @@ class BotContext:
                 else:
                     formatted_text = text
                 escaped_text = re.sub(r'([_*[\]()~`>#+\-=|{}.!])', r'\\\1', formatted_text)
-                await asyncio.sleep(0.5)
+                await asyncio.sleep(SEND_DELAY)
                 await self.bot.send_message(chat_id=chat_id, text=escaped_text, reply_markup=reply_markup, parse_mode='MarkdownV2')
             elif self.platform == "discord":
                 channel = self.bot.get_channel(int(chat_id)) if chat_id.isdigit() else await self.bot.fetch_user(int(chat_id))
@@ -237,12 +872,16 @@ class BotContext:
                     raise Exception(f"Invalid chat_id: {chat_id}")
                 if reply_markup:
                     text += "\n\nOptions:\n" + "\n".join([f"- {btn[0].text} (!Birdz {btn[0].callback_data})" for btn in reply_markup.inline_keyboard])
-                await asyncio.sleep(0.5)
+                await asyncio.sleep(SEND_DELAY)
                 await channel.send(text)
+            OUTBOUND_SENT.inc((("platform", self.platform), ("result", "ok")))
             logger.info(f"Message sent to {chat_id} on {self.platform}: {text[:50]}...")
         except Exception as e:
+            OUTBOUND_SENT.inc((("platform", self.platform), ("result", "error")))
             logger.error(f"Error in send_message: {str(e)}")
             raise
+        finally:
+            OUTBOUND_INFLIGHT.dec()
 
     async def send_document(self, chat_id: str, document):
         if self.platform == "telegram":
@@ -298,22 +937,610 @@ def is_valid_telegram_link(link: str) -> bool:
 def is_valid_x_link(link: str) -> bool:
     return bool(re.match(r"^(@[a-zA-Z0-9_]{1,15}|https://x\.com/[a-zA-Z0-9_]{1,15})$", link))
 
+# Address Validation
+# normalize_address returns the canonical form of a wallet (EIP-55 checksum for EVM
+# chains) or None when it is invalid; results are memoized since the same wallets are
+# checked on submission, import, audit and planning.
+ADDRESS_CACHE_SIZE = int(os.getenv('ADDRESS_CACHE_SIZE', '100000'))
+EVM_ADDRESS_RE = re.compile(r"0x[0-9a-fA-F]{40}")
+
+@functools.lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def normalize_address(wallet: str, chain: str) -> Optional[str]:
+    wallet = wallet.strip()
+    if chain in ("ETH", "BSC"):
+        if not EVM_ADDRESS_RE.fullmatch(wallet):
+            return None
+        body = wallet[2:]
+        # Mixed case carries an EIP-55 checksum that has to match
+        if body != body.lower() and body != body.upper() and not Web3.is_checksum_address(wallet):
+            return None
+        return Web3.to_checksum_address(wallet)
+    if chain == "SOL":
+        if not 32 <= len(wallet) <= 44:
+            return None
+        try:
+            return str(Pubkey.from_string(wallet))
+        except ValueError:
+            return None
+    if chain == "XRP":
+        if 25 <= len(wallet) <= 35 and wallet.startswith("r") and addresscodec.is_valid_classic_address(wallet):
+            return wallet
+        return None
+    return None
+
 def is_valid_address(wallet: str, chain: str) -> bool:
-    if chain in ["ETH", "BSC"] and wallet.startswith("0x") and len(wallet) == 42:
-        return web3_eth.is_address(wallet)
-    if chain == "SOL" and 43 <= len(wallet) <= 44:
+    return normalize_address(wallet, chain) is not None
+
+def validate_addresses(pairs) -> dict:
+    # pairs: iterable of (chain, address). "normalized" maps inputs whose canonical form differs.
+    valid, invalid, normalized = set(), set(), {}
+    for chain, address in pairs:
+        chain = (chain or "").strip().upper()
+        canonical = normalize_address(address or "", chain)
+        if canonical is None:
+            invalid.add((chain, address))
+            continue
+        valid.add((chain, canonical))
+        if canonical != address:
+            normalized[(chain, address)] = canonical
+    return {"valid": valid, "invalid": invalid, "normalized": normalized}
+
+def normalize_any_address(wallet: str) -> Optional[str]:
+    # Wallet lists carry no chain column, so take the first chain the address parses for
+    for chain in ("ETH", "SOL", "XRP"):
+        canonical = normalize_address(wallet, chain)
+        if canonical is not None:
+            return canonical
+    return None
+
+# Wallet Lists
+# blacklist/whitelist are held in memory as sets. Lists longer than
+# WALLET_LIST_MEMORY_LIMIT keep only a Bloom filter in memory and confirm hits in
+# SQLite. Every change bumps the list's row in data_versions so other processes reload.
+# Entries are stored normalized; rows written before that are rewritten once on first
+# load, recorded as format version 1 under '<list>_format'.
+WALLET_LIST_MEMORY_LIMIT = int(os.getenv('WALLET_LIST_MEMORY_LIMIT', '2000000'))
+WALLET_IMPORT_CHUNK = 5000
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / max(capacity, 1) * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+class WalletList:
+    def __init__(self, table: str):
+        self.table = table
+        self.members = None
+        self.bloom = None
+        self.version = None
+        self.data_version = None
+        self.checked_at = 0.0
+
+    def _backfill(self):
+        # Lookups and the SQLite confirmation in Bloom mode use the normalized key, so older raw rows are rewritten
+        row = cursor.execute("SELECT version FROM data_versions WHERE name = ?", (f"{self.table}_format",)).fetchone()
+        if row and row[0] >= 1:
+            return
+        rewrites = []
+        for (wallet,) in conn.execute(f"SELECT wallet FROM {self.table}"):
+            key = normalize_any_address(wallet) or wallet.strip()
+            if key != wallet:
+                rewrites.append((wallet, key))
         try:
-            Pubkey.from_string(wallet)
-            return True
-        except:
-            return False
-    if chain == "XRP" and 25 <= len(wallet) <= 35 and wallet.startswith("r"):
+            for start in range(0, len(rewrites), WALLET_IMPORT_CHUNK):
+                chunk = rewrites[start:start + WALLET_IMPORT_CHUNK]
+                cursor.executemany(f"DELETE FROM {self.table} WHERE wallet = ?", [(wallet,) for wallet, _ in chunk])
+                cursor.executemany(f"INSERT OR IGNORE INTO {self.table} (wallet) VALUES (?)", [(key,) for _, key in chunk])
+            if rewrites:
+                cursor.execute("""INSERT INTO data_versions (name, version) VALUES (?, 1)
+                                  ON CONFLICT(name) DO UPDATE SET version = version + 1""", (self.table,))
+            cursor.execute("INSERT OR REPLACE INTO data_versions (name, version) VALUES (?, 1)", (f"{self.table}_format",))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if rewrites:
+            logger.info(f"Normalized {len(rewrites)} stored {self.table} wallets")
+
+    def _reload(self):
+        self._backfill()
+        count = cursor.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        rows = conn.execute(f"SELECT wallet FROM {self.table}")
+        if count > WALLET_LIST_MEMORY_LIMIT:
+            self.members = None
+            self.bloom = BloomFilter(count * 2)
+            for (wallet,) in rows:
+                self.bloom.add(normalize_any_address(wallet) or wallet)
+        else:
+            self.bloom = None
+            self.members = {normalize_any_address(wallet) or wallet for (wallet,) in rows}
+
+    def _refresh(self):
+        # Lookups between checks are answered from memory; changes made by this process are applied
+        # in place, and other processes' commits show up within CONFIG_REFRESH_SECONDS, as with RuntimeConfig
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < CONFIG_REFRESH_SECONDS:
+            return
+        self.checked_at = now
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if self.version is not None and data_version == self.data_version:
+            return
+        self.data_version = data_version
+        # The version is read before reloading, so a commit landing during the reload is picked up by the next check
+        row = cursor.execute("SELECT version FROM data_versions WHERE name = ?", (self.table,)).fetchone()
+        version = row[0] if row else 0
+        if version != self.version:
+            self._reload()
+            self.version = version
+
+    def __contains__(self, wallet: str) -> bool:
+        self._refresh()
+        key = normalize_any_address(wallet) or wallet.strip()
+        if self.members is not None:
+            return key in self.members
+        return key in self.bloom and cursor.execute(f"SELECT 1 FROM {self.table} WHERE wallet = ?", (key,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        self._refresh()
+        if self.members is not None:
+            return len(self.members)
+        return cursor.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def add_many(self, wallets) -> dict:
+        # Streams normalized wallets into the table in one transaction
+        self._refresh()
+        counts = {"added": 0, "duplicates": 0, "invalid": 0}
+        chunk = []
+
+        def flush():
+            before = conn.total_changes
+            cursor.executemany(f"INSERT OR IGNORE INTO {self.table} (wallet) VALUES (?)", [(wallet,) for wallet in chunk])
+            added = conn.total_changes - before
+            counts["added"] += added
+            counts["duplicates"] += len(chunk) - added
+            for wallet in chunk:
+                if self.members is not None:
+                    self.members.add(wallet)
+                else:
+                    self.bloom.add(wallet)
+            chunk.clear()
+
         try:
-            from xrpl.core import addresscodec
-            return addresscodec.is_valid_classic_address(wallet)
-        except:
+            for wallet in wallets:
+                canonical = normalize_any_address(wallet)
+                if canonical is None:
+                    counts["invalid"] += 1
+                    continue
+                chunk.append(canonical)
+                if len(chunk) >= WALLET_IMPORT_CHUNK:
+                    flush()
+            if chunk:
+                flush()
+            cursor.execute("""INSERT INTO data_versions (name, version) VALUES (?, 1)
+                              ON CONFLICT(name) DO UPDATE SET version = version + 1""", (self.table,))
+            # Read inside the write transaction so the stored version is exactly the one this import produced
+            version = cursor.execute("SELECT version FROM data_versions WHERE name = ?", (self.table,)).fetchone()[0]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            self.version = None
+            raise
+        self.version = version
+        return counts
+
+blacklist = WalletList("blacklist")
+whitelist = WalletList("whitelist")
+
+def iter_uploaded_wallets(data: bytes):
+    # One wallet per line or the first address-looking cell of each CSV row; headers and junk count as invalid
+    reader = csv.reader(io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", errors="replace", newline=""))
+    for row in reader:
+        cells = [cell.strip() for cell in row if cell.strip()]
+        if not cells:
+            continue
+        yield next((cell for cell in cells if normalize_any_address(cell)), cells[0])
+
+# Runtime Config
+# The config table is loaded once into typed values; hot paths read runtime_config[key]
+# from memory. Writes go through set(), which validates against CONFIG_SCHEMA and
+# notifies subscribers. Other processes notice commits via PRAGMA data_version, checked
+# at most every CONFIG_REFRESH_SECONDS.
+CONFIG_REFRESH_SECONDS = float(os.getenv('CONFIG_REFRESH_SECONDS', '5'))
+# key: (type, default, minimum)
+CONFIG_SCHEMA = {
+    "total_supply": (float, 1000000.0, 0.0),
+    "tier_1_amount": (float, 1000.0, 0.0),
+    "tier_2_amount": (float, 2000.0, 0.0),
+    "tier_3_amount": (float, 5000.0, 0.0),
+    "referral_bonus": (float, 15.0, 0.0),
+    "min_token_balance": (float, 100.0, 0.0),
+}
+CONFIG_VALUE = Gauge("airdrop_config_value", "Current runtime config values")
+
+def parse_config_value(key: str, raw) -> Union[int, float]:
+    if key not in CONFIG_SCHEMA:
+        raise ValueError(f"Unknown config key '{key}'. Valid keys: {', '.join(CONFIG_SCHEMA)}")
+    kind, _, minimum = CONFIG_SCHEMA[key]
+    try:
+        value = kind(raw)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a {kind.__name__}")
+    if not math.isfinite(value) or value < minimum:
+        raise ValueError(f"{key} must be a finite number >= {minimum:g}")
+    return value
+
+class RuntimeConfig:
+    def __init__(self):
+        self.values = {key: default for key, (_, default, _) in CONFIG_SCHEMA.items()}
+        self.subscribers = []
+        self.data_version = None
+        self.checked_at = 0.0
+
+    def subscribe(self, callback):
+        # callback(key, value) runs after every change, local or from another process
+        self.subscribers.append(callback)
+
+    def _notify(self, key: str, value):
+        for callback in self.subscribers:
+            try:
+                callback(key, value)
+            except Exception as e:
+                logger.error(f"Config subscriber failed for {key}: {str(e)}")
+
+    def load(self):
+        first_load = self.data_version is None
+        self.data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        self.checked_at = time.monotonic()
+        values = {key: default for key, (_, default, _) in CONFIG_SCHEMA.items()}
+        for key, raw in cursor.execute("SELECT key, value FROM config").fetchall():
+            if key not in CONFIG_SCHEMA:
+                continue
+            try:
+                values[key] = parse_config_value(key, raw)
+            except ValueError as e:
+                logger.warning(f"Ignoring stored config {key}={raw!r}: {str(e)}")
+        for key, value in values.items():
+            if first_load or self.values[key] != value:
+                self.values[key] = value
+                self._notify(key, value)
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self.data_version is not None and now - self.checked_at < CONFIG_REFRESH_SECONDS:
+            return
+        self.checked_at = now
+        if self.data_version is None or conn.execute("PRAGMA data_version").fetchone()[0] != self.data_version:
+            self.load()
+
+    def __getitem__(self, key: str):
+        self._refresh()
+        return self.values[key]
+
+    def set(self, key: str, raw):
+        value = parse_config_value(key, raw)
+        cursor.execute("REPLACE INTO config (key, value) VALUES (?, ?)", (key, str(value)))
+        conn.commit()
+        self.values[key] = value
+        self._notify(key, value)
+        return value
+
+runtime_config = RuntimeConfig()
+runtime_config.subscribe(lambda key, value: CONFIG_VALUE.set(value, (("key", key),)))
+runtime_config.subscribe(lambda key, value: logger.info(f"Config {key} = {value}"))
+
+# Referral Graph
+# referral_counts holds pending/approved totals per referrer, maintained by triggers on
+# referrals so every write path (start, approvals, resets) keeps it exact. The graph
+# itself is mirrored in memory as parent/children maps; write paths update it in place
+# and other processes reload when the 'referrals' row in data_versions (bumped by the
+# same triggers) moves. Multi-level attribution walks the approved edges once per level.
+REFERRAL_LEVELS = int(os.getenv('REFERRAL_LEVELS', '3'))
+REFERRAL_DECAY = float(os.getenv('REFERRAL_DECAY', '0.5'))
+
+class ReferralGraph:
+    def __init__(self):
+        self.parent = {}
+        self.children = {}
+        self.status = {}
+        self.counts = {}
+        self.version = None
+        self.data_version = None
+
+    def _link(self, referrer_id: str, referee_id: str, status: str):
+        self.parent[referee_id] = referrer_id
+        self.children.setdefault(referrer_id, []).append(referee_id)
+        self.status[referee_id] = status
+        self.counts.setdefault(referrer_id, [0, 0])[status == "approved"] += 1
+
+    def _reload(self):
+        self.parent, self.children, self.status, self.counts = {}, {}, {}, {}
+        for referrer_id, referee_id, status in conn.execute("SELECT referrer_id, referee_id, status FROM referrals"):
+            self._link(referrer_id, referee_id, status)
+
+    def _mark_current(self):
+        # The version is read first. If no other connection has committed since the last check,
+        # it only counts this process's writes, which are already applied in place; otherwise the
+        # mirror is reloaded and the pre-read version stored, so a commit that lands meanwhile
+        # still moves the version past it.
+        row = cursor.execute("SELECT version FROM data_versions WHERE name = 'referrals'").fetchone()
+        version = row[0] if row else 0
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self.data_version:
+            self._reload()
+        self.version, self.data_version = version, data_version
+
+    def _refresh(self):
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if self.version is not None and data_version == self.data_version:
+            return
+        self.data_version = data_version
+        row = cursor.execute("SELECT version FROM data_versions WHERE name = 'referrals'").fetchone()
+        version = row[0] if row else 0
+        if version != self.version:
+            self._reload()
+            self.version = version
+
+    # Called after the matching referrals write has been committed
+    def added(self, referrer_id: str, referee_id: str):
+        self._refresh()
+        if referee_id not in self.parent:
+            self._link(referrer_id, referee_id, "pending")
+        self._mark_current()
+
+    def approved(self, referee_ids: list):
+        self._refresh()
+        for referee_id in referee_ids:
+            if self.status.get(referee_id) == "pending":
+                self.status[referee_id] = "approved"
+                counts = self.counts[self.parent[referee_id]]
+                counts[0] -= 1
+                counts[1] += 1
+        self._mark_current()
+
+    def removed(self, user_id: str):
+        # Resets are rare admin actions, so the mirror is simply rebuilt on next use
+        self.version = None
+
+    def stats(self, user_id: str) -> dict:
+        self._refresh()
+        pending, approved = self.counts.get(user_id, (0, 0))
+        return {"pending": pending, "approved": approved, "referred_by": self.parent.get(user_id)}
+
+    def recent(self, user_id: str, limit: int = 10) -> list:
+        self._refresh()
+        return [(referee_id, self.status[referee_id]) for referee_id in self.children.get(user_id, [])[-limit:]]
+
+    def downline(self, user_id: str, levels: int = REFERRAL_LEVELS) -> list:
+        # Approved referees per level below user_id; visited guards against referral cycles
+        self._refresh()
+        counts, frontier, seen = [], [user_id], {user_id}
+        for _ in range(levels):
+            frontier = [child for node in frontier for child in self.children.get(node, [])
+                        if self.status[child] == "approved" and child not in seen]
+            seen.update(frontier)
+            counts.append(len(frontier))
+        return counts
+
+    def chain_edges(self) -> list:
+        # Links in single-file chains of at least two links (A refers only B, B refers only C):
+        # the shape referral farms take, unlike a promoter's fan of referees or a lone invite
+        self._refresh()
+        links = {referrer_id: referees[0] for referrer_id, referees in self.children.items()
+                 if len(referees) == 1 and len(self.children.get(referees[0], ())) <= 1}
+        return [(referrer_id, referee_id) for referrer_id, referee_id in links.items()
+                if referee_id in links or self.parent.get(referrer_id) in links]
+
+    def approved_edges(self) -> tuple[list, dict]:
+        # Snapshot for attribute_referrals, taken on the event loop so it can run in a thread
+        self._refresh()
+        edges = [(referee_id, referrer_id) for referee_id, referrer_id in self.parent.items()
+                 if self.status[referee_id] == "approved"]
+        direct = {user_id: counts[1] for user_id, counts in self.counts.items() if counts[1]}
+        return edges, direct
+
+    def attribution(self, levels: int = REFERRAL_LEVELS, decay: float = REFERRAL_DECAY) -> dict:
+        return attribute_referrals(*self.approved_edges(), levels, decay)
+
+def attribute_referrals(edges: list, direct: dict, levels: int = REFERRAL_LEVELS, decay: float = REFERRAL_DECAY) -> dict:
+    # user_id -> (score, approved referees per level); each level is one pass over the edges
+    previous = direct
+    per_level = [direct]
+    for _ in range(levels - 1):
+        current = {}
+        for referee_id, referrer_id in edges:
+            below = previous.get(referee_id)
+            if below:
+                current[referrer_id] = current.get(referrer_id, 0) + below
+        per_level.append(current)
+        previous = current
+    result = {}
+    for user_id in direct:
+        counts = [level.get(user_id, 0) for level in per_level]
+        result[user_id] = (sum(count * decay ** depth for depth, count in enumerate(counts)), counts)
+    return result
+
+referral_graph = ReferralGraph()
+
+def top_referrers(limit: int = 10) -> list:
+    return cursor.execute("""SELECT rc.user_id, u.username, rc.approved, rc.pending FROM referral_counts rc
+                             LEFT JOIN users u ON u.user_id = rc.user_id
+                             WHERE rc.approved > 0 ORDER BY rc.approved DESC LIMIT ?""", (limit,)).fetchall()
+
+# Sybil Clustering
+# Users are linked when they share a wallet (submissions.wallet or users.kyc_wallet), an
+# X or Telegram handle, or sit on a referral chain of two or more links. Each identifier is hashed into a dict
+# that points at the first user seen with it, so every link is one union-find call and a
+# full sweep is near-linear. Each link is independent evidence with its own weight and a
+# cluster scores 1 - prod(1 - weight) over the links holding it together, so one reused
+# wallet or a long referral chain both flag. Flagged clusters keep their earliest member
+# and the rest lose eligibility, with their wallets blacklisted above SYBIL_BLACKLIST_SCORE.
+# Users a sweep disqualified are verified again once a later sweep stops dropping them.
+SYBIL_MIN_CLUSTER = int(os.getenv('SYBIL_MIN_CLUSTER', '2'))
+SYBIL_FLAG_SCORE = float(os.getenv('SYBIL_FLAG_SCORE', '0.6'))
+SYBIL_BLACKLIST_SCORE = float(os.getenv('SYBIL_BLACKLIST_SCORE', '0.9'))
+SYBIL_KEEP_ONE = os.getenv('SYBIL_KEEP_ONE', '1') == '1'
+SYBIL_SWEEP_BEFORE_DISTRIBUTION = os.getenv('SYBIL_SWEEP_BEFORE_DISTRIBUTION', '1') == '1'
+SYBIL_LINK_WEIGHTS = {"wallet": 0.9, "x": 0.7, "telegram": 0.7, "referral_chain": 0.3}
+
+class UnionFind:
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, item):
+        parent = self.parent
+        if item not in parent:
+            parent[item] = item
+            self.size[item] = 1
+            return item
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a, b) -> bool:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
             return False
-    return False
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size.pop(root_b)
+        return True
+
+def handle_from_link(link: Optional[str]) -> Optional[str]:
+    match = re.search(r"([A-Za-z0-9_]+)/?$", link.strip()) if link else None
+    return match.group(1).lower() if match else None
+
+def wallet_key(wallet: str) -> str:
+    # Identity for matching only: case-folds EVM hex instead of paying for a checksum per row
+    wallet = wallet.strip()
+    return wallet.lower() if EVM_ADDRESS_RE.fullmatch(wallet) else wallet
+
+def sybil_identifiers() -> tuple[list, dict]:
+    # (user_id, kind, value) for every identifier, plus each user's first submission time
+    identifiers, first_seen = [], {}
+    for user_id, wallet, timestamp in conn.execute("SELECT user_id, wallet, timestamp FROM submissions"):
+        first_seen[user_id] = timestamp or ""
+        if wallet:
+            identifiers.append((user_id, "wallet", wallet_key(wallet)))
+    for user_id, wallet, x_link, telegram_link in conn.execute(
+            "SELECT user_id, kyc_wallet, kyc_x_link, kyc_telegram_link FROM users "
+            "WHERE kyc_wallet IS NOT NULL OR kyc_x_link IS NOT NULL OR kyc_telegram_link IS NOT NULL"):
+        if wallet:
+            identifiers.append((user_id, "wallet", wallet_key(wallet)))
+        for kind, handle in (("x", handle_from_link(x_link)), ("telegram", handle_from_link(telegram_link))):
+            if handle:
+                identifiers.append((user_id, kind, handle))
+    return identifiers, first_seen
+
+def cluster_sybils(identifiers: list, chain_edges: list) -> list:
+    # Pure computation over snapshots, so sweeps can run in a worker thread
+    uf = UnionFind()
+    owners = {}
+    links = []
+    for user_id, kind, value in identifiers:
+        owner = owners.setdefault((kind, value), user_id)
+        if owner != user_id and uf.union(owner, user_id):
+            links.append((owner, kind))
+    for referrer_id, referee_id in chain_edges:
+        if uf.union(referrer_id, referee_id):
+            links.append((referrer_id, "referral_chain"))
+    clusters = {}
+    for user_id in uf.parent:
+        clusters.setdefault(uf.find(user_id), {"members": [], "links": {}, "innocent": 1.0})["members"].append(user_id)
+    for user_id, kind in links:
+        cluster = clusters[uf.find(user_id)]
+        cluster["links"][kind] = cluster["links"].get(kind, 0) + 1
+        cluster["innocent"] *= 1 - SYBIL_LINK_WEIGHTS[kind]
+    result = []
+    for cluster in clusters.values():
+        size = len(cluster["members"])
+        if size >= 2:
+            result.append({"members": cluster["members"], "size": size, "links": cluster["links"],
+                           "score": round(1 - cluster["innocent"], 4)})
+    result.sort(key=lambda cluster: (cluster["score"], cluster["size"]), reverse=True)
+    return result
+
+def apply_sybil_clusters(clusters: list, identifiers: list, first_seen: dict) -> dict:
+    wallets = {}
+    for user_id, kind, value in identifiers:
+        if kind == "wallet":
+            wallets.setdefault(user_id, set()).add(value)
+    cluster_rows, member_rows, dropped, blacklist_wallets = [], [], [], set()
+    for cluster_id, cluster in enumerate(clusters, 1):
+        flagged = cluster["size"] >= SYBIL_MIN_CLUSTER and cluster["score"] >= SYBIL_FLAG_SCORE
+        members = sorted(cluster["members"], key=lambda user_id: (first_seen.get(user_id, "~"), user_id))
+        keeper = members[0] if flagged and SYBIL_KEEP_ONE else None
+        cluster_rows.append((cluster_id, cluster["size"], cluster["score"], json.dumps(cluster["links"]), int(flagged)))
+        for user_id in members:
+            drop = flagged and user_id != keeper
+            member_rows.append((user_id, cluster_id, int(drop)))
+            if drop:
+                dropped.append((user_id,))
+                if cluster["score"] >= SYBIL_BLACKLIST_SCORE:
+                    blacklist_wallets.update(wallets.get(user_id, ()) - wallets.get(keeper, set()))
+    try:
+        cursor.execute("DELETE FROM sybil_clusters")
+        cursor.execute("DELETE FROM sybil_members")
+        cursor.executemany("INSERT INTO sybil_clusters (id, size, score, links, flagged) VALUES (?, ?, ?, ?, ?)", cluster_rows)
+        cursor.executemany("INSERT INTO sybil_members (user_id, cluster_id, dropped) VALUES (?, ?, ?)", member_rows)
+        # sybil_hold marks the rows a sweep disqualified, so they are verified again once a later
+        # sweep no longer drops them
+        cursor.executemany("UPDATE eligible SET verified = 0, sybil_hold = 1 WHERE user_id = ?", dropped)
+        restored = cursor.execute("""UPDATE eligible SET verified = 1, sybil_hold = 0 WHERE sybil_hold = 1
+                                     AND user_id NOT IN (SELECT user_id FROM sybil_members WHERE dropped = 1)""").rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    blacklisted = blacklist.add_many(sorted(blacklist_wallets))["added"] if blacklist_wallets else 0
+    return {"clusters": len(clusters), "flagged": sum(row[4] for row in cluster_rows),
+            "clustered_users": len(member_rows), "dropped": len(dropped), "restored": restored, "blacklisted": blacklisted}
+
+async def sybil_sweep() -> dict:
+    started = time.perf_counter()
+    identifiers, first_seen = sybil_identifiers()
+    chain_edges = referral_graph.chain_edges()
+    clusters = await asyncio.to_thread(cluster_sybils, identifiers, chain_edges)
+    report = apply_sybil_clusters(clusters, identifiers, first_seen)
+    report["users"] = len(first_seen)
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    logger.info(f"Sybil sweep: {report}")
+    return report
+
+def sybil_dropped(user_id: str) -> bool:
+    row = cursor.execute("SELECT dropped FROM sybil_members WHERE user_id = ?", (user_id,)).fetchone()
+    return bool(row and row[0])
+
+def format_sybil_report(report: dict) -> str:
+    return (f"Sybil sweep over {report['users']} users in {report['seconds']}s: {report['clusters']} clusters, "
+            f"{report['flagged']} flagged, {report['dropped']} users made ineligible, {report['restored']} re-verified, "
+            f"{report['blacklisted']} wallets blacklisted.")
+
+def sybil_clusters_csv() -> io.BytesIO:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["cluster_id", "score", "size", "links", "user_id", "dropped"])
+    for row in conn.execute("""SELECT c.id, c.score, c.size, c.links, m.user_id, m.dropped FROM sybil_clusters c
+                               JOIN sybil_members m ON m.cluster_id = c.id WHERE c.flagged = 1 ORDER BY c.id"""):
+        writer.writerow(row)
+    document = io.BytesIO(output.getvalue().encode())
+    document.name = "sybil_clusters.csv"
+    return document
 
 def check_mandatory_tasks(user_id: str) -> bool:
     cursor.execute("SELECT id FROM daily_tasks WHERE mandatory = 1")
@@ -339,27 +1566,33 @@ def has_joined_groups(user_id: str) -> bool:
     result = cursor.fetchone()
     return result[0] == 1 if result else False
 
+def balance_tier(chain: str, balance: float) -> int:
+    if chain in ("ETH", "BSC"):
+        return min(3, max(1, int(balance // 100)))
+    if chain == "XRP":
+        return min(3, max(1, int(balance // 10)))
+    return 1  # SOL placeholder
+
 async def check_eligibility(wallet: str, chain: str) -> tuple[int, float]:
     try:
         token_balance = 0.0
         tier = 0
-        if chain == "ETH":
-            token_balance = web3_eth.eth.get_balance(wallet) / 10**18
-            tier = min(3, max(1, int(token_balance // 100)))
-        elif chain == "BSC":
-            token_balance = web3_bsc.eth.get_balance(wallet) / 10**18
-            tier = min(3, max(1, int(token_balance // 100)))
+        if chain in ("ETH", "BSC"):
+            reply = (await rpc_batch(chain, "eth_getBalance", [("eth_getBalance", [wallet, "latest"])], hedge=True))[0]
+            if "result" not in reply:
+                raise Exception(reply.get("error", {}).get("message", "eth_getBalance failed"))
+            token_balance = int(reply["result"], 16) / 10**18
+            tier = balance_tier(chain, token_balance)
         elif chain == "SOL":
-            tier, token_balance = 1, 0.0  # Placeholder
+            tier, token_balance = balance_tier(chain, 0.0), 0.0
         elif chain == "XRP":
-            response = xrp_client.request({"method": "account_info", "params": [{"account": wallet}]})
-            if "error" in response.result:
+            result = await xrp_rpc("account_info", {"account": wallet, "ledger_index": "validated"}, hedge=True)
+            if "error" in result:
                 tier, token_balance = 0, 0.0
             else:
-                xrp_balance = float(response.result["account_data"]["Balance"]) / 10**6
-                tier = min(3, max(1, int(xrp_balance // 10)))
-                token_balance = xrp_balance
-        min_balance = float(cursor.execute("SELECT value FROM config WHERE key = 'min_token_balance'").fetchone()[0])
+                token_balance = float(result["account_data"]["Balance"]) / 10**6
+                tier = balance_tier(chain, token_balance)
+        min_balance = runtime_config["min_token_balance"]
         return tier if tier > 0 or token_balance >= min_balance else 0, token_balance
     except Exception as e:
         logger.error(f"Eligibility check failed: {str(e)}")
@@ -376,6 +1609,8 @@ def get_main_menu(user_id, lang):
          InlineKeyboardButton("Daily Tasks", callback_data="daily_tasks")],
         [InlineKeyboardButton("Refer", callback_data="refer"),
          InlineKeyboardButton("Claim Tokens", callback_data="claim_tokens")],
+        [InlineKeyboardButton("My Referrals", callback_data="my_referrals"),
+         InlineKeyboardButton("Top Referrers", callback_data="referral_leaderboard")],
         [InlineKeyboardButton("Leaderboard", callback_data="leaderboard")]
     ]
     if is_admin(user_id):
@@ -390,7 +1625,14 @@ def get_main_menu(user_id, lang):
             admin_buttons.extend([
                 [InlineKeyboardButton("Distribute BirdzCoin Tier 1", callback_data="start_distribution_1_tier1")],
                 [InlineKeyboardButton("Distribute BirdzCoin Tier 2", callback_data="start_distribution_1_tier2")],
-                [InlineKeyboardButton("Distribute BirdzCoin Tier 3", callback_data="start_distribution_1_tier3")]
+                [InlineKeyboardButton("Distribute BirdzCoin Tier 3", callback_data="start_distribution_1_tier3")],
+                [InlineKeyboardButton("Pause Distribution", callback_data="pause_distribution"),
+                 InlineKeyboardButton("Resume Distribution", callback_data="resume_distribution")],
+                [InlineKeyboardButton("Retry Failed Transfers", callback_data="retry_failed_distributions"),
+                 InlineKeyboardButton("Check Confirmations", callback_data="check_confirmations")],
+                [InlineKeyboardButton("Take Balance Snapshot", callback_data="snapshot_now"),
+                 InlineKeyboardButton("Jobs", callback_data="jobs")],
+                [InlineKeyboardButton("Publish Claim Root", callback_data="claim_distribution")]
             ])
             
             cursor.execute("SELECT token_id, name FROM tokens WHERE token_id NOT IN (1, 2, 3, 4, 5, 6, 8, 9)")
@@ -413,7 +1655,10 @@ def get_main_menu(user_id, lang):
             admin_buttons.extend([
                 [InlineKeyboardButton("View Users", callback_data="view_users"),
                  InlineKeyboardButton("Reset User", callback_data="reset_user")],
-                [InlineKeyboardButton("Approve Referrals", callback_data="approve_referrals")]
+                [InlineKeyboardButton("Approve Referrals", callback_data="approve_referrals"),
+                 InlineKeyboardButton("Audit Wallets", callback_data="audit_wallets")],
+                [InlineKeyboardButton("Referral Attribution", callback_data="referral_attribution"),
+                 InlineKeyboardButton("Sybil Sweep", callback_data="sybil_sweep")]
             ])
         
         if has_permission(user_id, "manage_config"):
@@ -425,7 +1670,8 @@ def get_main_menu(user_id, lang):
                  InlineKeyboardButton("Set Token Amount", callback_data="set_token_amount")],
                 [InlineKeyboardButton("Set Campaign", callback_data="set_campaign"),
                  InlineKeyboardButton("Edit Campaign", callback_data="edit_campaign")],
-                [InlineKeyboardButton("Delete Campaign", callback_data="delete_campaign")]
+                [InlineKeyboardButton("Delete Campaign", callback_data="delete_campaign"),
+                 InlineKeyboardButton("Set Snapshot Block", callback_data="set_snapshot_block")]
             ])
         
         if has_permission(user_id, "manage_blacklist"):
@@ -433,18 +1679,1785 @@ def get_main_menu(user_id, lang):
                 [InlineKeyboardButton("Admin: Blacklist", callback_data="blacklist"),
                  InlineKeyboardButton("Admin: Whitelist", callback_data="whitelist")],
                 [InlineKeyboardButton("View Blacklist", callback_data="view_blacklist"),
-                 InlineKeyboardButton("View Whitelist", callback_data="view_whitelist")]
+                 InlineKeyboardButton("View Whitelist", callback_data="view_whitelist")],
+                [InlineKeyboardButton("Import Wallet List", callback_data="import_wallet_list")]
             ])
         
         keyboard.extend(admin_buttons)
     return InlineKeyboardMarkup(keyboard)
 
+# Distribution Journal
+# Rows move pending (planned) -> signed -> broadcast -> confirmed/failed. The signed
+# transaction is stored before it is broadcast, so a restart rebroadcasts the same
+# bytes instead of paying twice.
+DIST_PENDING = "pending"
+DIST_SIGNED = "signed"
+DIST_BROADCAST = "broadcast"
+DIST_CONFIRMED = "confirmed"
+DIST_FAILED = "failed"
+DIST_MAX_ATTEMPTS = int(os.getenv('DIST_MAX_ATTEMPTS', '3'))
+DIST_BATCH_SIZE = int(os.getenv('DIST_BATCH_SIZE', '200'))
+SOL_SUBMIT_CONCURRENCY = int(os.getenv('SOL_SUBMIT_CONCURRENCY', '8'))
+SOL_BLOCKHASH_TTL = int(os.getenv('SOL_BLOCKHASH_TTL', '45'))
+XRP_SUBMIT_CONCURRENCY = int(os.getenv('XRP_SUBMIT_CONCURRENCY', '8'))
+XRP_LEDGER_WINDOW = int(os.getenv('XRP_LEDGER_WINDOW', '20'))
+XRP_USE_TICKETS = os.getenv('XRP_USE_TICKETS', '1') == '1'
+XRP_MAX_FEE_DROPS = int(os.getenv('XRP_MAX_FEE_DROPS', '1000'))
+
+# Rows that were already signed or sent are never re-planned
+PLAN_DISTRIBUTION_UPSERT = """
+    ON CONFLICT(user_id) DO UPDATE SET wallet = excluded.wallet, chain = excluded.chain, amount = excluded.amount, amount_base = excluded.amount_base,
+        status = 'pending', attempts = 0, last_error = NULL, tx_hash = NULL, nonce = NULL, updated_at = excluded.updated_at
+    WHERE distributions.status = 'pending' OR (distributions.status = 'failed' AND distributions.signed_tx IS NULL)
+"""
+
+def plan_distribution(user_id: str, wallet: str, chain: str, amount: float, amount_base: Optional[str] = None):
+    cursor.execute("""
+        INSERT INTO distributions (user_id, wallet, chain, amount, amount_base, status, attempts, updated_at) VALUES (?, ?, ?, ?, ?, 'pending', 0, ?)
+    """ + PLAN_DISTRIBUTION_UPSERT, (user_id, wallet, chain, amount, amount_base, datetime.utcnow().isoformat()))
+
+def plan_distributions(plan: tuple):
+    # plan columns: (user_ids, wallets, chains, amounts, amount_bases), as build_allocation returns them
+    cursor.executemany("""
+        INSERT INTO distributions (user_id, wallet, chain, amount, amount_base, status, attempts, updated_at) VALUES (?, ?, ?, ?, ?, 'pending', 0, ?)
+    """ + PLAN_DISTRIBUTION_UPSERT, zip(*plan, itertools.repeat(datetime.utcnow().isoformat())))
+
+# Allocation Uploads
+# An uploaded CSV/xlsx of user_id,amount rows is parsed row by row into a temp table,
+# joined against submissions in one statement and applied in a single transaction.
+ALLOCATION_REPORT_EXAMPLES = 20
+
+def iter_allocation_rows(data: bytes, file_name: str):
+    # Yields (line number, user_id, raw amount); header and blank rows are skipped
+    if file_name.lower().endswith(".xlsx"):
+        workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+    else:
+        rows = csv.reader(io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", errors="replace", newline=""))
+    for line, row in enumerate(rows, 1):
+        cells = ["" if cell is None else str(cell).strip() for cell in row]
+        if not any(cells):
+            continue
+        if line == 1 and cells[0].lower() in ("user_id", "user", "id"):
+            continue
+        user_id = cells[0]
+        if user_id.endswith(".0") and user_id[:-2].isdigit():
+            user_id = user_id[:-2]  # spreadsheets store numeric ids as floats
+        yield line, user_id, cells[1] if len(cells) > 1 else ""
+
+def apply_allocation_upload(rows) -> dict:
+    report = {"rows": 0, "applied": 0, "unknown_users": [], "bad_amounts": [], "duplicates": [], "locked": []}
+    seen = set()
+
+    def valid_rows():
+        for line, user_id, raw_amount in rows:
+            report["rows"] += 1
+            try:
+                amount = float(raw_amount)
+            except ValueError:
+                amount = None
+            if amount is None or not math.isfinite(amount) or amount <= 0 or not user_id:
+                report["bad_amounts"].append((line, user_id, raw_amount))
+                continue
+            if user_id in seen:
+                report["duplicates"].append((line, user_id, raw_amount))
+                continue
+            seen.add(user_id)
+            yield user_id, amount
+
+    try:
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS allocation_upload (user_id TEXT PRIMARY KEY, amount REAL)")
+        cursor.execute("DELETE FROM allocation_upload")
+        cursor.executemany("INSERT INTO allocation_upload (user_id, amount) VALUES (?, ?)", valid_rows())
+        cursor.execute("""SELECT a.user_id, a.amount FROM allocation_upload a
+                          LEFT JOIN submissions s ON s.user_id = a.user_id WHERE s.user_id IS NULL""")
+        report["unknown_users"] = cursor.fetchall()
+        cursor.execute("""SELECT a.user_id, d.status FROM allocation_upload a JOIN distributions d ON d.user_id = a.user_id
+                          WHERE NOT (d.status = 'pending' OR (d.status = 'failed' AND d.signed_tx IS NULL))""")
+        report["locked"] = cursor.fetchall()
+        before = conn.total_changes
+        # WHERE true keeps SQLite from reading ON CONFLICT as part of the join
+        cursor.execute("""
+            INSERT INTO distributions (user_id, wallet, chain, amount, status, attempts, updated_at)
+            SELECT a.user_id, s.wallet, s.chain, a.amount, 'pending', 0, ? FROM allocation_upload a
+            JOIN submissions s ON s.user_id = a.user_id WHERE true
+        """ + PLAN_DISTRIBUTION_UPSERT, (datetime.utcnow().isoformat(),))
+        report["applied"] = conn.total_changes - before
+        cursor.execute("DELETE FROM allocation_upload")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return report
+
+def format_allocation_report(report: dict) -> tuple[str, Optional[io.BytesIO]]:
+    problems = len(report["unknown_users"]) + len(report["bad_amounts"]) + len(report["duplicates"]) + len(report["locked"])
+    summary = (f"Allocation upload: {report['rows']} rows, {report['applied']} allocations set.\n"
+               f"Unknown users: {len(report['unknown_users'])}, bad amounts: {len(report['bad_amounts'])}, "
+               f"duplicates: {len(report['duplicates'])}, already sent: {len(report['locked'])}")
+    if not problems:
+        return summary, None
+    examples = [f"unknown user {user_id}" for user_id, _ in report["unknown_users"][:ALLOCATION_REPORT_EXAMPLES]]
+    examples += [f"line {line}: bad amount '{amount}' for {user_id}" for line, user_id, amount in report["bad_amounts"][:ALLOCATION_REPORT_EXAMPLES]]
+    examples += [f"line {line}: duplicate {user_id}" for line, user_id, _ in report["duplicates"][:ALLOCATION_REPORT_EXAMPLES]]
+    summary += "\n" + "\n".join(examples)
+    # The full list goes back as a CSV since it can run to thousands of rows
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["problem", "line", "user_id", "value"])
+    writer.writerows(("unknown_user", "", user_id, amount) for user_id, amount in report["unknown_users"])
+    writer.writerows(("bad_amount", line, user_id, amount) for line, user_id, amount in report["bad_amounts"])
+    writer.writerows(("duplicate", line, user_id, amount) for line, user_id, amount in report["duplicates"])
+    writer.writerows(("already_sent", "", user_id, status) for user_id, status in report["locked"])
+    document = io.BytesIO(output.getvalue().encode())
+    document.name = "allocation_report.csv"
+    return summary, document
+
+def get_active_distribution_run() -> Optional[tuple]:
+    cursor.execute("SELECT id, token_id, chat_id, lang, status FROM distribution_runs WHERE status IN ('running', 'paused')")
+    return cursor.fetchone()
+
+def set_distribution_run_status(run_id: int, status: str):
+    cursor.execute("UPDATE distribution_runs SET status = ?, updated_at = ? WHERE id = ?", (status, datetime.utcnow().isoformat(), run_id))
+    conn.commit()
+
+def resume_distribution_run(run_id: int) -> bool:
+    # Only one caller can move a paused run back to running, whichever process or shard it runs in
+    cursor.execute("UPDATE distribution_runs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'paused'",
+                   (datetime.utcnow().isoformat(), run_id))
+    conn.commit()
+    return cursor.rowcount == 1
+
+# Run Leases
+# A drain holds a lease on its run (owner plus expiry in distribution_runs), renewed every
+# RUN_LEASE_SECONDS/3 while it works, so two processes or shards can never drain the same
+# run and sign the same rows with different nonces. A crashed owner's lease simply expires.
+RUN_LEASE_SECONDS = int(os.getenv('RUN_LEASE_SECONDS', '120'))
+
+class RunLease:
+    def __init__(self, run_id: int):
+        self.run_id = run_id
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{os.urandom(4).hex()}"
+        self.lost = False
+        self.renewer = None
+
+    def expiry(self) -> str:
+        return (datetime.utcnow() + timedelta(seconds=RUN_LEASE_SECONDS)).isoformat()
+
+    def try_acquire(self) -> bool:
+        cursor.execute("""UPDATE distribution_runs SET lease_owner = ?, lease_until = ?
+                          WHERE id = ? AND status = 'running' AND (lease_owner IS NULL OR lease_until < ?)""",
+                       (self.owner, self.expiry(), self.run_id, datetime.utcnow().isoformat()))
+        conn.commit()
+        return cursor.rowcount == 1
+
+    async def acquire(self) -> bool:
+        # A lease left by a crashed process expires within one lease period; a live owner keeps renewing it
+        deadline = time.monotonic() + RUN_LEASE_SECONDS + 5
+        while not self.try_acquire():
+            if time.monotonic() > deadline:
+                return False
+            await asyncio.sleep(5)
+        self.renewer = asyncio.create_task(self.renew())
+        return True
+
+    async def renew(self):
+        while True:
+            await asyncio.sleep(RUN_LEASE_SECONDS / 3)
+            cursor.execute("UPDATE distribution_runs SET lease_until = ? WHERE id = ? AND lease_owner = ?", (self.expiry(), self.run_id, self.owner))
+            conn.commit()
+            if cursor.rowcount != 1:
+                self.lost = True
+                logger.error(f"Lost the lease on distribution run {self.run_id}")
+                return
+
+    def release(self):
+        if self.renewer:
+            self.renewer.cancel()
+        cursor.execute("UPDATE distribution_runs SET lease_owner = NULL, lease_until = NULL WHERE id = ? AND lease_owner = ?", (self.run_id, self.owner))
+        conn.commit()
+
+async def retry_failed_distributions() -> int:
+    now = datetime.utcnow().isoformat()
+    cursor.execute("UPDATE distributions SET status = 'pending', attempts = 0, updated_at = ? WHERE status = 'failed' AND signed_tx IS NULL", (now,))
+    retried = cursor.rowcount
+    cursor.execute("UPDATE distributions SET status = 'signed', attempts = 0, updated_at = ? WHERE status = 'failed' AND signed_tx IS NOT NULL AND chain IN ('ETH', 'BSC')", (now,))
+    retried += cursor.rowcount
+    conn.commit()
+    # A Solana or XRP blob past its blockhash/LastLedgerSequence can never land, so rebroadcasting it would fail
+    # forever; it goes back to pending for a fresh signature, but only once the chain confirms it never landed
+    cursor.execute("SELECT rowid, chain, tx_hash, signed_tx, nonce FROM distributions WHERE status = 'failed' AND signed_tx IS NOT NULL AND chain IN ('SOL', 'XRP')")
+    rows = cursor.fetchall()
+    outcomes = []
+    sol_rows = [row for row in rows if row[1] == "SOL"]
+    if sol_rows:
+        outcomes.extend(await sol_landing_states(sol_rows))
+    for row in rows:
+        if row[1] == "XRP":
+            outcomes.append((row[0], await xrp_landing_state(row[2], row[3])))
+    now = datetime.utcnow().isoformat()
+    for rowid, state in outcomes:
+        if state == "landed":
+            cursor.execute("UPDATE distributions SET status = 'broadcast', attempts = 0, updated_at = ? WHERE rowid = ?", (now, rowid))
+        elif state == "expired":
+            cursor.execute("UPDATE distributions SET status = 'pending', signed_tx = NULL, tx_hash = NULL, nonce = NULL, attempts = 0, updated_at = ? WHERE rowid = ?", (now, rowid))
+        elif state == "live":
+            cursor.execute("UPDATE distributions SET status = 'signed', attempts = 0, updated_at = ? WHERE rowid = ?", (now, rowid))
+        else:
+            continue
+        retried += 1
+    conn.commit()
+    return retried
+
+async def sol_landing_states(rows: list) -> list:
+    # rows: (rowid, chain, signature, signed_tx, last_valid_height); returns (rowid, "landed" | "expired" | "live")
+    height, statuses = await sol_signature_statuses(list(dict.fromkeys(row[2] for row in rows)))
+    results = []
+    for rowid, _, signature, _, last_valid in rows:
+        if signature not in statuses:
+            continue
+        if statuses[signature] is not None:
+            results.append((rowid, "landed"))
+        elif last_valid is not None and height is not None and height > last_valid:
+            results.append((rowid, "expired"))
+        else:
+            results.append((rowid, "live"))
+    return results
+
+async def xrp_landing_state(tx_hash: str, signed_tx: str) -> Optional[str]:
+    last_ledger = xrpl_decode(signed_tx).get("LastLedgerSequence")
+    if not last_ledger:
+        return "live"
+    validated = (await xrp_rpc("ledger", {"ledger_index": "validated"}))
+    if int(validated.get("ledger_index", 0)) <= last_ledger:
+        return "live"
+    # Asking only about the ledgers the payment could have landed in lets rippled say whether it searched them all
+    result = await xrp_rpc("tx", {"transaction": tx_hash, "min_ledger": max(1, last_ledger - XRP_LEDGER_WINDOW - 10), "max_ledger": last_ledger})
+    if result.get("validated"):
+        return "landed"
+    if result.get("error") == "txnNotFound" and result.get("searched_all") is not False:
+        return "expired"
+    return None
+
+def evm_client(chain: str):
+    # Only used to encode and sign; network calls go through the endpoint pool
+    if chain not in evm_clients:
+        evm_clients[chain] = Web3(Web3.HTTPProvider(ETH_RPC_URL if chain == "ETH" else BSC_RPC_URL))
+    return evm_clients[chain]
+
+async def evm_call(chain: str, method: str, params: list, hedge: bool = True):
+    reply = (await rpc_batch(chain, method, [(method, params)], hedge))[0]
+    if "result" not in reply:
+        raise Exception(reply.get("error", {}).get("message", f"{method} failed"))
+    return reply["result"]
+
+EVM_CHAIN_IDS = {}
+
+async def evm_chain_id(chain: str) -> int:
+    if chain not in EVM_CHAIN_IDS:
+        EVM_CHAIN_IDS[chain] = int(await evm_call(chain, "eth_chainId", []), 16)
+    return EVM_CHAIN_IDS[chain]
+
+# EVM Fee Engine
+# Samples eth_feeHistory at most once per block interval and prices transfers with
+# EIP-1559 fields (legacy gasPrice where the chain reports no base fee). Gas limits
+# are estimated once per token contract.
+EVM_BLOCK_INTERVAL = {"ETH": 12, "BSC": 3}
+TRANSFER_SELECTOR = bytes.fromhex("a9059cbb")
+
+class FeeEngine:
+    def __init__(self, chain: str, percentile: float, max_fee_gwei: float):
+        self.chain = chain
+        self.percentile = percentile
+        self.max_fee = Web3.to_wei(max_fee_gwei, 'gwei')
+        self.block_interval = EVM_BLOCK_INTERVAL[chain]
+        self.cached = None
+        self.fetched_at = 0.0
+        self.gas_limits = {}
+
+    async def fee_fields(self) -> dict:
+        if self.cached and time.monotonic() - self.fetched_at < self.block_interval:
+            return self.cached
+        try:
+            history = await evm_call(self.chain, "eth_feeHistory", [hex(10), "latest", [self.percentile]])
+            base_fee = int(history["baseFeePerGas"][-1], 16)
+            rewards = sorted(int(reward[0], 16) for reward in history.get("reward") or [] if reward)
+            if not base_fee:
+                raise ValueError("no base fee")
+            tip = rewards[len(rewards) // 2] if rewards else Web3.to_wei(1, 'gwei')
+            max_fee = min(2 * base_fee + tip, self.max_fee)
+            self.cached = {"maxFeePerGas": max_fee, "maxPriorityFeePerGas": min(tip, max_fee)}
+        except Exception as e:
+            logger.info(f"{self.chain} fee history unavailable ({str(e)}), using gasPrice")
+            self.cached = {"gasPrice": min(int(await evm_call(self.chain, "eth_gasPrice", []), 16), self.max_fee)}
+        self.fetched_at = time.monotonic()
+        return self.cached
+
+    async def gas_limit(self, contract_address: str) -> int:
+        if contract_address in self.gas_limits:
+            return self.gas_limits[contract_address]
+        contract_address = Web3.to_checksum_address(contract_address)
+        if contract_address not in self.gas_limits:
+            # Worst case is a transfer to an address that holds no tokens yet
+            probe = Account.create().address
+            data = TRANSFER_SELECTOR + bytes.fromhex(probe[2:].rjust(64, "0")) + (1).to_bytes(32, "big")
+            try:
+                estimate = int(await evm_call(self.chain, "eth_estimateGas", [{"from": sender_lanes(self.chain)[0].address, "to": contract_address, "data": "0x" + data.hex()}]), 16)
+                self.gas_limits[contract_address] = int(estimate * 1.25)
+            except Exception as e:
+                logger.error(f"Gas estimate for {contract_address} on {self.chain} failed: {str(e)}")
+                return 200000
+        return self.gas_limits[contract_address]
+
+    async def bumped_fields(self, previous: dict) -> Optional[dict]:
+        # Bumps never go past the chain's fee cap; None once the previous transaction already sits at it
+        current = await self.fee_fields()
+        factor = 1 + FEE_BUMP_PERCENT / 100
+        if "gasPrice" in previous:
+            if previous["gasPrice"] >= self.max_fee:
+                return None
+            return {"gasPrice": min(max(int(previous["gasPrice"] * factor) + 1, current.get("gasPrice", current.get("maxFeePerGas", 0))), self.max_fee)}
+        if previous["maxFeePerGas"] >= self.max_fee:
+            return None
+        max_fee = min(max(int(previous["maxFeePerGas"] * factor) + 1, current.get("maxFeePerGas", current.get("gasPrice", 0))), self.max_fee)
+        priority = max(int(previous["maxPriorityFeePerGas"] * factor) + 1, current.get("maxPriorityFeePerGas", 0))
+        return {"maxFeePerGas": max_fee, "maxPriorityFeePerGas": min(priority, max_fee)}
+
+FEE_ENGINES = {}
+
+def fee_engine(chain: str) -> FeeEngine:
+    if chain not in FEE_ENGINES:
+        FEE_ENGINES[chain] = FeeEngine(chain, FEE_PERCENTILE, ETH_MAX_FEE_GWEI if chain == "ETH" else BSC_MAX_FEE_GWEI)
+    return FEE_ENGINES[chain]
+
+# EVM Signing Pipeline
+# Transfer calldata comes from a cached per-contract encoder (selector plus padded
+# arguments, no web3 contract objects). Nonces are assigned in order on the event loop
+# and batches of unsigned transactions are signed in a process pool, so signing uses
+# every core; the drain signs the next batch while a broadcaster stage sends the last
+# one in nonce order as JSON-RPC batches. SIGNING_WORKERS=0 signs on a thread instead.
+SIGNING_WORKERS = int(os.getenv('SIGNING_WORKERS', str(os.cpu_count() or 1)))
+SIGNING_BATCH = int(os.getenv('SIGNING_BATCH', '250'))
+EVM_BROADCAST_BATCH = int(os.getenv('EVM_BROADCAST_BATCH', '100'))
+signing_keys = {}
+signing_pools = []
+
+class TransferEncoder:
+    def __init__(self, contract_address: str):
+        self.contract = Web3.to_checksum_address(contract_address)
+        self.prefix = "0x" + TRANSFER_SELECTOR.hex()
+
+    def calldata(self, to_address: str, amount: int) -> str:
+        if not EVM_ADDRESS_RE.fullmatch(to_address):
+            raise ValueError(f"Invalid recipient {to_address}")
+        if not 0 < amount < 2**256:
+            raise ValueError(f"Invalid transfer amount {amount}")
+        return self.prefix + to_address[2:].lower().rjust(64, "0") + format(amount, "064x")
+
+@functools.lru_cache(maxsize=None)
+def transfer_encoder(contract_address: str) -> TransferEncoder:
+    return TransferEncoder(contract_address)
+
+def evm_signing_keys() -> dict:
+    return {lane.address: lane.key for chain in ("ETH", "BSC") for lane in sender_lanes(chain)}
+
+def init_signing_worker(keys: dict):
+    signing_keys.update(keys)
+
+def sign_evm_batch(transactions: list) -> list:
+    # Runs in a signing worker: (sender, unsigned tx) -> (tx_hash, raw_tx, error)
+    signed = []
+    for sender, tx in transactions:
+        try:
+            result = Account.sign_transaction(tx, signing_keys[sender])
+            signed.append((Web3.to_hex(result.hash), Web3.to_hex(result.rawTransaction), None))
+        except Exception as e:
+            signed.append((None, None, str(e) or type(e).__name__))
+    return signed
+
+def signing_pool() -> concurrent.futures.ProcessPoolExecutor:
+    if not signing_pools:
+        signing_pools.append(concurrent.futures.ProcessPoolExecutor(
+            max_workers=SIGNING_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_signing_worker, initargs=(evm_signing_keys(),)))
+    return signing_pools[0]
+
+async def sign_evm_transactions(transactions: list) -> list:
+    # Splits the batch evenly across workers, in chunks of at most SIGNING_BATCH
+    size = max(1, min(SIGNING_BATCH, -(-len(transactions) // max(SIGNING_WORKERS, 1))))
+    chunks = [transactions[start:start + size] for start in range(0, len(transactions), size)]
+    if SIGNING_WORKERS <= 0:
+        init_signing_worker(evm_signing_keys())
+        results = [await asyncio.to_thread(sign_evm_batch, chunk) for chunk in chunks]
+    else:
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(loop.run_in_executor(signing_pool(), sign_evm_batch, chunk) for chunk in chunks))
+    return [signed for chunk in results for signed in chunk]
+
+async def evm_send_outcome(chain: str, reply: dict, tx_hash: str) -> str:
+    # DIST_BROADCAST, or DIST_PENDING when the nonce went to another transaction; raises on other errors
+    if "error" not in reply:
+        return DIST_BROADCAST
+    message = reply["error"].get("message", "eth_sendRawTransaction failed")
+    if "already known" in message.lower():
+        return DIST_BROADCAST
+    if "nonce too low" in message.lower():
+        # Re-sent only when every endpoint in rotation answers and none of them has a receipt
+        payload = [{"jsonrpc": "2.0", "id": 0, "method": "eth_getTransactionReceipt", "params": [tx_hash]}]
+        replies = await rpc_pools[chain].request_all(payload, "batch:eth_getTransactionReceipt")
+        answered = [reply[0] for reply in replies if isinstance(reply, list) and reply and "result" in reply[0]]
+        if not answered or len(answered) < len(replies):
+            raise Exception(f"{message}; could not confirm whether {tx_hash} was mined")
+        return DIST_BROADCAST if any(reply["result"] for reply in answered) else DIST_PENDING
+    raise Exception(message)
+
+def decode_evm_transaction(raw_hex: str) -> dict:
+    raw = bytes.fromhex(raw_hex[2:] if raw_hex.startswith("0x") else raw_hex)
+    if raw[0] == 2:
+        fields = rlp.decode(raw[1:])
+        return {
+            "chainId": int.from_bytes(fields[0], "big"), "nonce": int.from_bytes(fields[1], "big"),
+            "maxPriorityFeePerGas": int.from_bytes(fields[2], "big"), "maxFeePerGas": int.from_bytes(fields[3], "big"),
+            "gas": int.from_bytes(fields[4], "big"), "to": Web3.to_checksum_address(fields[5]),
+            "value": int.from_bytes(fields[6], "big"), "data": "0x" + fields[7].hex(), "type": 2,
+        }
+    fields = rlp.decode(raw)
+    v = int.from_bytes(fields[6], "big")
+    return {
+        "nonce": int.from_bytes(fields[0], "big"), "gasPrice": int.from_bytes(fields[1], "big"),
+        "gas": int.from_bytes(fields[2], "big"), "to": Web3.to_checksum_address(fields[3]),
+        "value": int.from_bytes(fields[4], "big"), "data": "0x" + fields[5].hex(),
+        "chainId": (v - 35) // 2 if v >= 35 else None,
+    }
+
+class TransferExpired(Exception):
+    pass
+
+# Solana Batch Sender
+# Packs many system transfers into each transaction up to the 1232-byte packet limit,
+# signing with a keypair decoded once and a blockhash reused until it nears expiry.
+# The blockhash's lastValidBlockHeight is kept in distributions.nonce, so an unknown
+# signature is only treated as dropped once the chain has passed that height.
+SOL_PACKET_LIMIT = 1232
+
+class SolanaSender:
+    def __init__(self, secret: str):
+        self.secret = secret
+        self._keypair = None
+        self._blockhash = None
+        self._blockhash_at = 0.0
+        self.last_valid_height = None
+
+    @property
+    def keypair(self) -> Keypair:
+        if self._keypair is None:
+            self._keypair = Keypair.from_base58_string(self.secret)
+        return self._keypair
+
+    @property
+    def address(self) -> str:
+        return str(self.keypair.pubkey())
+
+    async def blockhash(self) -> Hash:
+        # A blockhash stays valid for ~150 blocks (60-90s); refresh well before that
+        if self._blockhash is None or time.monotonic() - self._blockhash_at > SOL_BLOCKHASH_TTL:
+            reply = (await rpc_batch("SOL", "getLatestBlockhash", [("getLatestBlockhash", [{"commitment": "finalized"}])], hedge=True))[0]
+            if "result" not in reply:
+                raise Exception(reply.get("error", {}).get("message", "getLatestBlockhash failed"))
+            self._blockhash = Hash.from_string(reply["result"]["value"]["blockhash"])
+            self.last_valid_height = reply["result"]["value"].get("lastValidBlockHeight")
+            self._blockhash_at = time.monotonic()
+        return self._blockhash
+
+    def expire_blockhash(self):
+        self._blockhash = None
+
+    def instruction(self, to_address: str, lamports: int):
+        return transfer(TransferParams(
+            from_pubkey=self.keypair.pubkey(),
+            to_pubkey=Pubkey.from_string(to_address),
+            lamports=lamports
+        ))
+
+    def sign(self, instructions: list, blockhash: Hash) -> Transaction:
+        return Transaction([self.keypair], Message(instructions, self.keypair.pubkey()), blockhash)
+
+    def packed_size(self, instructions: list) -> int:
+        # A single-signer transaction is a one-byte signature count, the 64-byte signature and the message
+        return 1 + 64 + len(bytes(Message(instructions, self.keypair.pubkey())))
+
+    async def pack(self, transfers: list) -> list:
+        # transfers: (key, instruction) pairs; returns (keys, signature, base64 transaction) per packed transaction
+        # Sizes are measured on the unsigned message, so each packed transaction is signed exactly once
+        blockhash = await self.blockhash()
+        batches = []
+        keys, instructions = [], []
+        for key, instruction in transfers:
+            if instructions and self.packed_size(instructions + [instruction]) > SOL_PACKET_LIMIT:
+                batches.append((keys, instructions))
+                keys, instructions = [], []
+            keys.append(key)
+            instructions.append(instruction)
+        if instructions:
+            batches.append((keys, instructions))
+        packed = []
+        for keys, instructions in batches:
+            tx = self.sign(instructions, blockhash)
+            packed.append((keys, str(tx.signatures[0]), base64.b64encode(bytes(tx)).decode()))
+        return packed
+
+    async def submit(self, signed_tx: str):
+        reply = (await rpc_batch("SOL", "sendTransaction", [("sendTransaction", [signed_tx, {"encoding": "base64"}])]))[0]
+        if "error" in reply and "already been processed" not in reply["error"].get("message", ""):
+            message = reply["error"].get("message", "sendTransaction failed")
+            if "blockhash not found" in message.lower():
+                landed, expired = await self.landing_state(signed_tx)
+                if landed:
+                    return
+                if expired:
+                    # The blockhash expired before the transaction landed, so it can be safely re-signed
+                    self.expire_blockhash()
+                    raise TransferExpired(message)
+            raise Exception(message)
+
+    async def landing_state(self, signed_tx: str) -> tuple[bool, bool]:
+        # "Blockhash not found" also comes from a node that is behind, and an earlier copy may already have landed,
+        # so the blockhash is checked first and then the signature, both on one endpoint with full history search
+        tx = Transaction.from_bytes(base64.b64decode(signed_tx))
+        endpoint = rpc_pools["SOL"].ranked()[0]
+        reply = (await rpc_batch("SOL", "isBlockhashValid", [("isBlockhashValid", [str(tx.message.recent_blockhash), {"commitment": "finalized"}])], endpoint=endpoint))[0]
+        if "result" not in reply:
+            return False, False
+        valid = reply["result"]["value"]
+        reply = (await rpc_batch("SOL", "getSignatureStatuses", [("getSignatureStatuses", [[str(tx.signatures[0])], {"searchTransactionHistory": True}])], endpoint=endpoint))[0]
+        if "result" not in reply:
+            return False, False
+        status = (reply["result"].get("value") or [None])[0]
+        return status is not None, status is None and not valid
+
+# XRP Batch Sender
+# Derives the wallet once and signs payments locally against Tickets (or locally tracked
+# Sequence numbers once Tickets run out), so many payments are in flight per ledger.
+# The Ticket or Sequence a payment uses is kept in distributions.nonce.
+XRP_MAX_TICKETS = 250
+
+class XrpSender:
+    def __init__(self, seed: str, address: Optional[str] = None):
+        self.seed = seed
+        self._address = address
+        self._wallet = None
+
+    @property
+    def wallet(self) -> Wallet:
+        if self._wallet is None:
+            self._wallet = Wallet.from_seed(self.seed)
+        return self._wallet
+
+    @property
+    def address(self) -> str:
+        # XRP_SENDER_ADDRESS may differ from the seed's own address when the seed is a regular key
+        if self._address is None:
+            self._address = self.wallet.classic_address
+        return self._address
+
+    async def request(self, method: str, params: dict) -> dict:
+        # Only used for reads, so they may hedge
+        result = await xrp_rpc(method, params, hedge=True)
+        if result.get("status") == "error" or "error" in result:
+            raise Exception(result.get("error_message") or result.get("error") or f"{method} failed")
+        return result
+
+    async def ledger_state(self) -> tuple[int, int, int]:
+        account = await self.request("account_info", {"account": self.address, "ledger_index": "current"})
+        fee = await self.request("fee", {})
+        fee_drops = min(max(int(fee["drops"]["open_ledger_fee"]), int(fee["drops"]["base_fee"])), XRP_MAX_FEE_DROPS)
+        return account["account_data"]["Sequence"], int(fee["ledger_current_index"]), fee_drops
+
+    async def tickets(self) -> list:
+        tickets, marker = [], None
+        while True:
+            params = {"account": self.address, "type": "ticket", "ledger_index": "validated", "limit": 400}
+            if marker:
+                params["marker"] = marker
+            page = await self.request("account_objects", params)
+            tickets.extend(obj["TicketSequence"] for obj in page.get("account_objects", []))
+            marker = page.get("marker")
+            if not marker:
+                return sorted(tickets)
+
+    async def create_tickets(self, count: int, sequence: int, ledger: int, fee: int):
+        tx = xrpl_sign(TicketCreate(account=self.address, ticket_count=count, sequence=sequence, fee=str(fee),
+                                    last_ledger_sequence=ledger + XRP_LEDGER_WINDOW, signing_pub_key=self.wallet.public_key), self.wallet)
+        await self.submit(xrpl_encode(tx.to_xrpl()))
+        # Tickets only exist once the TicketCreate is validated
+        while True:
+            result = await xrp_rpc("tx", {"transaction": tx.get_hash()}, hedge=True)
+            if result.get("validated"):
+                outcome = result.get("meta", {}).get("TransactionResult")
+                if outcome != "tesSUCCESS":
+                    raise Exception(f"TicketCreate failed: {outcome}")
+                return
+            current = await self.request("ledger_current", {})
+            if current["ledger_current_index"] > ledger + XRP_LEDGER_WINDOW:
+                raise Exception("TicketCreate expired")
+            await asyncio.sleep(1)
+
+    async def reserve(self, count: int, in_flight: set) -> tuple[list, int, int]:
+        # Returns one ("ticket" | "sequence", number) slot per payment plus the ledger bound and fee to sign with
+        sequence, ledger, fee = await self.ledger_state()
+        slots = []
+        if XRP_USE_TICKETS:
+            existing = await self.tickets()
+            free = [ticket for ticket in existing if ticket not in in_flight]
+            wanted = min(count - len(free), XRP_MAX_TICKETS - len(existing))
+            # A TicketCreate takes the next Sequence, so it waits while Sequence payments at or past it are in flight
+            if wanted > 0 and not any(number >= sequence for number in in_flight):
+                try:
+                    await self.create_tickets(wanted, sequence, ledger, fee)
+                    existing = await self.tickets()
+                    free = [ticket for ticket in existing if ticket not in in_flight]
+                    sequence, ledger, fee = await self.ledger_state()
+                except Exception as e:
+                    logger.error(f"Could not allocate XRP tickets: {str(e)}")
+            slots = [("ticket", ticket) for ticket in free[:count]]
+        # Anything beyond the available Tickets uses consecutive Sequence numbers
+        while len(slots) < count:
+            if sequence not in in_flight:
+                slots.append(("sequence", sequence))
+            sequence += 1
+        return slots, ledger + XRP_LEDGER_WINDOW, fee
+
+    def sign_payment(self, to_address: str, drops: int, slot: tuple, last_ledger: int, fee: int) -> tuple[str, str]:
+        kind, number = slot
+        payment = Payment(
+            account=self.address,
+            destination=to_address,
+            amount=str(drops),
+            fee=str(fee),
+            sequence=0 if kind == "ticket" else number,
+            ticket_sequence=number if kind == "ticket" else None,
+            last_ledger_sequence=last_ledger,
+            signing_pub_key=self.wallet.public_key
+        )
+        signed = xrpl_sign(payment, self.wallet)
+        return signed.get_hash(), xrpl_encode(signed.to_xrpl())
+
+    async def submit(self, signed_tx: str):
+        result = await xrp_rpc("submit", {"tx_blob": signed_tx})
+        engine_result = result.get("engine_result", "")
+        if engine_result == "tefMAX_LEDGER":
+            raise TransferExpired(result.get("engine_result_message") or engine_result)
+        # ter results are held and retried by the server; tef past-sequence/ticket results mean it was already applied
+        if not (engine_result.startswith("tes") or engine_result.startswith("ter")
+                or engine_result in ("tefPAST_SEQ", "tefALREADY", "tefNO_TICKET")):
+            raise Exception(result.get("engine_result_message") or result.get("error_message") or engine_result or "submit failed")
+
+# Hot Wallet Sharding
+# Each chain may send from several hot wallets: ETH_SENDER_KEYS, BSC_SENDER_KEYS (default
+# the ETH keys), SOL_SENDER_KEYS and XRP_SENDER_SEEDS are comma-separated lists that fall
+# back to the single-sender settings. A recipient always maps to the same sender by a hash
+# of its wallet, and every sender is its own lane with its own nonces, Sequences/Tickets
+# and Solana packing, so lanes sign and broadcast side by side. Journaled rows record the
+# sender that signed them. Before a run starts, each sender's balance is checked against
+# the transfers it will pay for (SENDER_PREFLIGHT=0 skips the check).
+SENDER_PREFLIGHT = os.getenv('SENDER_PREFLIGHT', '1') == '1'
+SOL_FEE_LAMPORTS = 5000
+BALANCE_OF_SELECTOR = "70a08231"
+NATIVE_SYMBOLS = {"ETH": "ETH", "BSC": "BNB", "SOL": "SOL", "XRP": "XRP"}
+
+def env_list(name: str, fallback: Optional[str] = None) -> list:
+    values = [value.strip() for value in (os.getenv(name) or '').split(',') if value.strip()]
+    return values or ([fallback] if fallback else [])
+
+SENDER_KEYS = {
+    "ETH": env_list('ETH_SENDER_KEYS', ETH_PRIVATE_KEY),
+    "BSC": env_list('BSC_SENDER_KEYS') or env_list('ETH_SENDER_KEYS', ETH_PRIVATE_KEY),
+    "SOL": env_list('SOL_SENDER_KEYS', SOL_SENDER_PRIVATE_KEY),
+    "XRP": env_list('XRP_SENDER_SEEDS', XRP_SENDER_SEED),
+}
+sender_pools = {}
+
+class EvmSender:
+    def __init__(self, key: str, address: Optional[str] = None):
+        self.key = key
+        self._address = address
+
+    @property
+    def address(self) -> str:
+        if self._address is None:
+            self._address = Account.from_key(self.key).address
+        return self._address
+
+def sender_lanes(chain: str) -> list:
+    if chain not in sender_pools:
+        keys = SENDER_KEYS.get(chain, [])
+        if chain in ("ETH", "BSC"):
+            sender_pools[chain] = [EvmSender(key, ETH_SENDER_ADDRESS if key == ETH_PRIVATE_KEY else None) for key in keys]
+        elif chain == "SOL":
+            sender_pools[chain] = [SolanaSender(key) for key in keys]
+        else:
+            sender_pools[chain] = [XrpSender(seed, XRP_SENDER_ADDRESS if seed == XRP_SENDER_SEED else None) for seed in keys]
+    return sender_pools[chain]
+
+def sender_for(chain: str, wallet: str):
+    lanes = sender_lanes(chain)
+    if not lanes:
+        raise ValueError(f"No {chain} sender configured")
+    return lanes[shard_for(wallet_key(wallet), len(lanes))] if len(lanes) > 1 else lanes[0]
+
+def sender_lane(chain: str, address: Optional[str]):
+    # The lane that signed a journaled row; rows signed before senders were recorded came from the first one
+    lanes = sender_lanes(chain)
+    if not address:
+        return lanes[0] if lanes else None
+    return next((lane for lane in lanes if lane.address == address), None)
+
+def format_units(units: int, decimals: int) -> str:
+    return f"{Decimal(units).scaleb(-decimals).normalize():f}"
+
+async def evm_sender_balances(chain: str, lanes: dict, decimals: int) -> list:
+    # lanes: address -> {contract: [transfers, token units]}; gas is priced at the current fee cap
+    fees = await fee_engine(chain).fee_fields()
+    price = fees.get("maxFeePerGas", fees.get("gasPrice", 0))
+    calls, checks = [], []
+    for address, assets in lanes.items():
+        gas = 0
+        for contract, (count, units) in assets.items():
+            calls.append(("eth_call", [{"to": contract, "data": "0x" + BALANCE_OF_SELECTOR + address[2:].lower().rjust(64, "0")}, "latest"]))
+            checks.append((address, f"tokens of {contract}", units, decimals))
+            gas += count * await fee_engine(chain).gas_limit(contract)
+        calls.append(("eth_getBalance", [address, "latest"]))
+        checks.append((address, f"{NATIVE_SYMBOLS[chain]} for gas", gas * price, 18))
+    replies = await rpc_batch(chain, "sender_balances", calls, hedge=True)
+    return [(address, what, needed, int(reply["result"], 16) if reply.get("result") not in (None, "0x") else None, places)
+            for (address, what, needed, places), reply in zip(checks, replies)]
+
+async def sol_sender_balances(lanes: dict) -> list:
+    # A transfer shares its signature fee with the rest of its packed transaction, so this is an upper bound
+    addresses = list(lanes)
+    replies = await rpc_batch("SOL", "getBalance", [("getBalance", [address, {"commitment": "confirmed"}]) for address in addresses], hedge=True)
+    return [(address, "SOL", lanes[address][None][1] + lanes[address][None][0] * SOL_FEE_LAMPORTS,
+             reply["result"]["value"] if "result" in reply else None, CHAIN_DECIMALS["SOL"])
+            for address, reply in zip(addresses, replies)]
+
+async def xrp_sender_balances(lanes: dict) -> list:
+    # Besides payments and fees an account keeps its base reserve plus one increment per owned object (Tickets included)
+    ledger = (await xrp_rpc("server_info", {}, hedge=True))["info"]["validated_ledger"]
+    reserve_base = int(Decimal(str(ledger["reserve_base_xrp"])).scaleb(6))
+    reserve_inc = int(Decimal(str(ledger["reserve_inc_xrp"])).scaleb(6))
+    addresses = list(lanes)
+    accounts = await asyncio.gather(*(xrp_rpc("account_info", {"account": address, "ledger_index": "validated"}, hedge=True)
+                                      for address in addresses), return_exceptions=True)
+    balances = []
+    for address, account in zip(addresses, accounts):
+        count, drops = lanes[address][None]
+        data = account.get("account_data") if isinstance(account, dict) else None
+        owned = (data or {}).get("OwnerCount", 0) + (min(count, XRP_MAX_TICKETS) if XRP_USE_TICKETS else 0)
+        balances.append((address, "XRP", drops + count * XRP_MAX_FEE_DROPS + reserve_base + owned * reserve_inc,
+                         int(data["Balance"]) if data else None, CHAIN_DECIMALS["XRP"]))
+    return balances
+
+async def sender_shortfalls(token_id) -> list:
+    # One line per sender balance that does not cover the rows still to send; unreadable balances are logged and skipped
+    decimals = token_decimals(token_id)
+    contracts = dict(cursor.execute("SELECT tier, contract_address FROM token_distributions WHERE token_id = ?", (token_id,)).fetchall())
+    needs = {}
+    for wallet, chain, amount, amount_base, status, sender, tier in conn.execute(
+            """SELECT wallet, chain, amount, amount_base, status, sender, (SELECT tier FROM eligible e WHERE e.user_id = distributions.user_id)
+               FROM distributions WHERE status IN ('pending', 'signed') AND attempts < ?""", (DIST_MAX_ATTEMPTS,)):
+        try:
+            lane = sender_lane(chain, sender) if status == DIST_SIGNED else sender_for(chain, wallet)
+            if chain in ("ETH", "BSC"):
+                asset, units = transfer_encoder(contracts.get(tier or 0) or TOKEN_CONTRACT_ADDRESS).contract, base_amount(amount, amount_base, decimals)
+            else:
+                asset, units = None, base_amount(amount, amount_base, CHAIN_DECIMALS[chain])
+        except Exception:
+            # Rows that cannot be sent fail in the drain without spending anything
+            continue
+        if lane is None:
+            continue
+        need = needs.setdefault(chain, {}).setdefault(lane.address, {}).setdefault(asset, [0, 0])
+        need[0] += 1
+        need[1] += units
+    shortfalls = []
+    for chain, lanes in needs.items():
+        try:
+            if chain in ("ETH", "BSC"):
+                balances = await evm_sender_balances(chain, lanes, decimals)
+            elif chain == "SOL":
+                balances = await sol_sender_balances(lanes)
+            else:
+                balances = await xrp_sender_balances(lanes)
+        except Exception as e:
+            logger.error(f"Could not read {chain} sender balances: {str(e)}")
+            continue
+        for address, what, needed, held, places in balances:
+            if held is None:
+                logger.error(f"Could not read {what} balance of {chain} sender {address}")
+            elif held < needed:
+                shortfalls.append(f"{chain} {address}: needs {format_units(needed, places)} {what}, holds {format_units(held, places)}")
+    return shortfalls
+
+# JSON-RPC Helpers
+async def rpc_batch(chain: str, method: str, calls: list, hedge: bool = False, endpoint: Optional[Endpoint] = None) -> list:
+    payload = [{"jsonrpc": "2.0", "id": i, "method": call_method, "params": params} for i, (call_method, params) in enumerate(calls)]
+    response = await rpc_pools[chain].request(payload, f"batch:{method}", hedge, endpoint)
+    if isinstance(response, dict):
+        raise Exception(response.get("error", {}).get("message", "batch request rejected"))
+    by_id = {item.get("id"): item for item in response}
+    return [by_id.get(i, {}) for i in range(len(calls))]
+
+async def xrp_rpc(method: str, params: dict, hedge: bool = False, endpoint: Optional[Endpoint] = None) -> dict:
+    return (await rpc_pools["XRP"].request({"method": method, "params": [params]}, method, hedge, endpoint))["result"]
+
+async def sol_signature_statuses(signatures: list) -> tuple[Optional[int], dict]:
+    # The finalized block height is read before the statuses and on the same endpoint, so a signature that is
+    # still unknown afterwards and whose lastValidBlockHeight is below that height can no longer land
+    endpoint = rpc_pools["SOL"].ranked()[0]
+    reply = (await rpc_batch("SOL", "getBlockHeight", [("getBlockHeight", [{"commitment": "finalized"}])], endpoint=endpoint))[0]
+    height = reply.get("result")
+    statuses = {}
+    for start in range(0, len(signatures), 256):
+        chunk = signatures[start:start + 256]
+        reply = (await rpc_batch("SOL", "getSignatureStatuses", [("getSignatureStatuses", [chunk, {"searchTransactionHistory": True}])], endpoint=endpoint))[0]
+        # Signatures missing from the result (failed lookup) stay out of the dict and are treated as undecided
+        if "result" in reply:
+            statuses.update(zip(chunk, reply["result"].get("value") or [None] * len(chunk)))
+    return height, statuses
+
+# Balance Snapshots
+# Tiers come from one snapshot of every submitted wallet, taken when a campaign ends
+# (end_date, or snapshot_block on snapshot_chain) instead of at verification time. EVM
+# and XRP reads are pinned to one block/ledger per chain; Solana has no historical
+# balance reads, so it is read at the latest slot. Balances are fetched in JSON-RPC
+# batches (XRP in parallel single calls) under SNAPSHOT_CONCURRENCY, and each snapshot
+# is a new version in balance_snapshots, so the planner always reads one complete set.
+# Failed reads are retried up to SNAPSHOT_RETRIES times; a snapshot that still has
+# errors is stored as 'partial', which the planner and eligible never read from.
+SNAPSHOT_TIERS = os.getenv('SNAPSHOT_TIERS', '1') == '1'
+SNAPSHOT_BATCH = int(os.getenv('SNAPSHOT_BATCH', '100'))
+SNAPSHOT_CONCURRENCY = int(os.getenv('SNAPSHOT_CONCURRENCY', '8'))
+SNAPSHOT_RETRIES = int(os.getenv('SNAPSHOT_RETRIES', '3'))
+SNAPSHOT_CHECK_INTERVAL = int(os.getenv('SNAPSHOT_CHECK_INTERVAL', '60'))
+
+async def chain_height(chain: str) -> int:
+    if chain in ("ETH", "BSC"):
+        return int(await evm_call(chain, "eth_blockNumber", []), 16)
+    if chain == "XRP":
+        return int((await xrp_rpc("ledger", {"ledger_index": "validated"}, hedge=True))["ledger_index"])
+    raise ValueError(f"No block height for {chain}")
+
+async def fetch_snapshot_chunk(chain: str, rows: list, pin: Optional[int]) -> list:
+    # rows: (user_id, wallet); returns (user_id, wallet, chain, balance, tier, error)
+    results = []
+    if chain in ("ETH", "BSC"):
+        block = hex(pin) if pin is not None else "latest"
+        replies = await rpc_batch(chain, "eth_getBalance", [("eth_getBalance", [wallet, block]) for _, wallet in rows])
+        for (user_id, wallet), reply in zip(rows, replies):
+            if "result" in reply:
+                balance = int(reply["result"], 16) / 10**18
+                results.append((user_id, wallet, chain, balance, balance_tier(chain, balance), None))
+            else:
+                results.append((user_id, wallet, chain, 0.0, 0, reply.get("error", {}).get("message", "no reply")))
+    elif chain == "SOL":
+        replies = await rpc_batch(chain, "getBalance", [("getBalance", [wallet, {"commitment": "finalized"}]) for _, wallet in rows])
+        for (user_id, wallet), reply in zip(rows, replies):
+            if "result" in reply:
+                balance = reply["result"]["value"] / 10**9
+                results.append((user_id, wallet, chain, balance, balance_tier(chain, balance), None))
+            else:
+                results.append((user_id, wallet, chain, 0.0, 0, reply.get("error", {}).get("message", "no reply")))
+    else:
+        replies = await asyncio.gather(*(xrp_rpc("account_info", {"account": wallet, "ledger_index": pin if pin is not None else "validated"})
+                                         for _, wallet in rows), return_exceptions=True)
+        for (user_id, wallet), reply in zip(rows, replies):
+            if isinstance(reply, Exception) or "error" in reply:
+                results.append((user_id, wallet, chain, 0.0, 0, str(reply) if isinstance(reply, Exception) else reply["error"]))
+            else:
+                balance = float(reply["account_data"]["Balance"]) / 10**6
+                results.append((user_id, wallet, chain, balance, balance_tier(chain, balance), None))
+    return results
+
+def latest_snapshot(campaign_id: int) -> Optional[int]:
+    row = cursor.execute("SELECT id FROM balance_snapshots WHERE campaign_id = ? AND status = 'complete' ORDER BY version DESC LIMIT 1",
+                         (campaign_id,)).fetchone()
+    return row[0] if row else None
+
+def eligible_tiers(campaign_id: int) -> list:
+    # (user_id, tier) the planner works from: the latest complete snapshot when there is one
+    snapshot_id = latest_snapshot(campaign_id) if SNAPSHOT_TIERS else None
+    if snapshot_id is None:
+        return cursor.execute("SELECT user_id, tier FROM eligible WHERE verified = 1 AND social_tasks_completed = 1").fetchall()
+    return cursor.execute("""SELECT e.user_id, s.tier FROM eligible e JOIN snapshot_balances s ON s.snapshot_id = ? AND s.user_id = e.user_id
+                             WHERE e.verified = 1 AND e.social_tasks_completed = 1 AND s.tier > 0""", (snapshot_id,)).fetchall()
+
+async def take_balance_snapshot(campaign_id: int, trigger: str, job: Optional[Job] = None) -> dict:
+    started = time.perf_counter()
+    version = cursor.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM balance_snapshots WHERE campaign_id = ?", (campaign_id,)).fetchone()[0]
+    cursor.execute("INSERT INTO balance_snapshots (campaign_id, version, status, trigger, started_at) VALUES (?, ?, 'running', ?, ?)",
+                   (campaign_id, version, trigger, datetime.utcnow().isoformat()))
+    conn.commit()
+    snapshot_id = cursor.lastrowid
+    status = "failed"
+    try:
+        by_chain = {}
+        for user_id, wallet, chain in conn.execute("SELECT user_id, wallet, chain FROM submissions WHERE wallet IS NOT NULL"):
+            by_chain.setdefault(chain, []).append((user_id, wallet))
+        campaign = cursor.execute("SELECT snapshot_chain, snapshot_block FROM campaigns WHERE id = ?", (campaign_id,)).fetchone()
+        pins = {}
+        for chain in by_chain:
+            if campaign and campaign[0] == chain and campaign[1]:
+                pins[chain] = campaign[1]
+            elif chain in ("ETH", "BSC", "XRP"):
+                pins[chain] = await chain_height(chain)
+            else:
+                pins[chain] = None
+        cursor.execute("UPDATE balance_snapshots SET pins = ? WHERE id = ?", (json.dumps(pins), snapshot_id))
+        conn.commit()
+
+        total = sum(len(rows) for rows in by_chain.values())
+        done = errors = 0
+        semaphore = asyncio.Semaphore(SNAPSHOT_CONCURRENCY)
+
+        async def fetch(chain, rows):
+            # Only the reads that errored are asked for again, with a growing pause between attempts
+            fetched = []
+            for attempt in range(SNAPSHOT_RETRIES + 1):
+                if attempt:
+                    await asyncio.sleep(attempt)
+                async with semaphore:
+                    try:
+                        results = await fetch_snapshot_chunk(chain, rows, pins[chain])
+                    except Exception as e:
+                        results = [(user_id, wallet, chain, 0.0, 0, str(e)) for user_id, wallet in rows]
+                fetched.extend(result for result in results if not result[5])
+                failed = [result for result in results if result[5]]
+                if not failed:
+                    return fetched
+                rows = [(result[0], result[1]) for result in failed]
+            return fetched + failed
+
+        tasks = [asyncio.create_task(fetch(chain, rows[i:i + SNAPSHOT_BATCH]))
+                 for chain, rows in by_chain.items() for i in range(0, len(rows), SNAPSHOT_BATCH)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                results = await finished
+                cursor.executemany("INSERT OR REPLACE INTO snapshot_balances (snapshot_id, user_id, wallet, chain, balance, tier, error) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   [(snapshot_id,) + result for result in results])
+                done += len(results)
+                errors += sum(1 for result in results if result[5])
+                if job:
+                    job.progress(done, total, f"Snapshot v{version}")
+        finally:
+            for task in tasks:
+                task.cancel()
+        if errors:
+            # A tier 0 standing in for an unread balance would drop that user, so nothing from this snapshot is used
+            status = "partial"
+        else:
+            # Other readers of eligible (per-tier contracts, views) see the snapshot tiers too
+            cursor.execute("""UPDATE eligible SET tier = s.tier, token_balance = s.balance FROM snapshot_balances s
+                              WHERE s.snapshot_id = ? AND s.user_id = eligible.user_id AND s.error IS NULL""", (snapshot_id,))
+            status = "complete"
+        return {"snapshot_id": snapshot_id, "version": version, "status": status, "wallets": done, "errors": errors,
+                "pins": pins, "seconds": round(time.perf_counter() - started, 2)}
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    finally:
+        cursor.execute("UPDATE balance_snapshots SET status = ?, wallets = (SELECT COUNT(*) FROM snapshot_balances WHERE snapshot_id = ?), "
+                       "errors = (SELECT COUNT(*) FROM snapshot_balances WHERE snapshot_id = ? AND error IS NOT NULL), finished_at = ? WHERE id = ?",
+                       (status, snapshot_id, snapshot_id, datetime.utcnow().isoformat(), snapshot_id))
+        conn.commit()
+
+def format_snapshot_report(report: dict) -> str:
+    pins = ", ".join(f"{chain}@{pin if pin is not None else 'latest'}" for chain, pin in report["pins"].items())
+    text = (f"Balance snapshot v{report['version']}: {report['wallets']} wallets in {report['seconds']}s, "
+            f"{report['errors']} errors ({pins or 'no wallets'}).")
+    if report["status"] == "partial":
+        text += " Some balances could not be read after retries, so tiers still come from the previous snapshot; take a new one."
+    return text
+
+def parse_campaign_date(value: str) -> Optional[datetime]:
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+async def due_snapshot_campaigns() -> list:
+    # Active campaigns whose end_date or snapshot block has passed and that have no scheduled snapshot yet
+    due = []
+    heights = {}
+    rows = cursor.execute("""SELECT c.id, c.end_date, c.snapshot_chain, c.snapshot_block FROM campaigns c WHERE c.active = 1
+                             AND NOT EXISTS (SELECT 1 FROM balance_snapshots b WHERE b.campaign_id = c.id AND b.trigger = 'scheduled'
+                                             AND b.status IN ('running', 'complete'))
+                             AND NOT EXISTS (SELECT 1 FROM jobs j WHERE j.kind = 'snapshot' AND j.status IN ('queued', 'running', 'cancelling')
+                                             AND json_extract(j.params, '$.campaign_id') = c.id)""").fetchall()
+    for campaign_id, end_date, snapshot_chain, snapshot_block in rows:
+        if snapshot_chain and snapshot_block:
+            if snapshot_chain not in heights:
+                heights[snapshot_chain] = await chain_height(snapshot_chain)
+            if heights[snapshot_chain] >= snapshot_block:
+                due.append(campaign_id)
+        else:
+            end = parse_campaign_date(end_date)
+            if end and end <= datetime.now(timezone.utc):
+                due.append(campaign_id)
+    return due
+
+async def run_snapshot_scheduler(airdrop_bot, context, interval: int):
+    while True:
+        try:
+            for campaign_id in await due_snapshot_campaigns():
+                logger.info(f"Scheduling balance snapshot for campaign {campaign_id}")
+                airdrop_bot.jobs.enqueue("snapshot", {"campaign_id": campaign_id, "trigger": "scheduled"}, ADMIN_ID, "en", "system", context)
+        except Exception as e:
+            logger.error(f"Snapshot scheduler check failed: {str(e)}")
+        await asyncio.sleep(interval)
+
+# Allocation Engine
+# Plans are computed over NumPy arrays of eligible users. A policy turns (tier, balance)
+# arrays into weights and allocate() splits the budget by largest remainder in integer
+# units, so a plan always sums to exactly total_tokens. Units are the smallest decimals
+# of the chains in the plan, coarsened until the budget fits ALLOCATION_MAX_UNITS (float
+# quotas stay exact); base units below that go to the largest allocation. Balances are
+# compared as-is across chains. amount_base keeps the exact integer the senders transfer.
+np = LazyImport("numpy")
+ALLOCATION_POLICY = os.getenv('ALLOCATION_POLICY', 'tiered')
+ALLOCATION_CAP_SHARE = float(os.getenv('ALLOCATION_CAP_SHARE', '0.01'))
+ALLOCATION_MAX_UNITS = 2**40
+CHAIN_DECIMALS = {"SOL": 9, "XRP": 6}
+
+def equal_weights(tiers, balances):
+    return np.ones(len(tiers))
+
+def tiered_weights(tiers, balances):
+    return tiers.astype(np.float64)
+
+def pro_rata_weights(tiers, balances):
+    return np.maximum(balances, 0.0)
+
+def sqrt_weights(tiers, balances):
+    return np.sqrt(np.maximum(balances, 0.0))
+
+def capped_weights(tiers, balances):
+    # Pro-rata by balance, but no user above ALLOCATION_CAP_SHARE of the budget: weights are
+    # clipped at the level where the clipped top-k users hold exactly the cap share each
+    weights = np.maximum(balances, 0.0)
+    total = weights.sum()
+    if total <= 0:
+        return weights
+    cap = max(ALLOCATION_CAP_SHARE, 1.0 / len(weights))
+    ordered = np.sort(weights)[::-1]
+    rest = total - np.concatenate(([0.0], np.cumsum(ordered)))
+    clipped = np.arange(len(ordered) + 1)
+    valid = clipped * cap < 1
+    level = np.where(valid, cap * rest / np.where(valid, 1 - clipped * cap, 1.0), np.inf)
+    fits = valid & (level >= np.concatenate((ordered, [0.0])))
+    if not fits.any():
+        return np.ones(len(weights))
+    return np.minimum(weights, level[np.argmax(fits)])
+
+ALLOCATION_POLICIES = {
+    "equal": equal_weights,
+    "tiered": tiered_weights,
+    "pro_rata": pro_rata_weights,
+    "sqrt": sqrt_weights,
+    "capped": capped_weights,
+}
+
+def allocate(weights, total_units: int):
+    # Floor every quota, then hand the missing units to the largest fractional parts
+    weights = np.asarray(weights, dtype=np.float64)
+    total_weight = weights.sum()
+    units = np.zeros(len(weights), dtype=np.int64)
+    if total_units <= 0 or total_weight <= 0:
+        return units
+    quotas = weights * (total_units / total_weight)
+    units = np.floor(quotas).astype(np.int64)
+    fractions = quotas - units
+    remainder = total_units - int(units.sum())
+    while remainder > 0:
+        count = min(remainder, len(units))
+        top = np.argpartition(-fractions, count - 1)[:count]
+        units[top] += 1
+        fractions[top] = -1.0
+        remainder -= len(top)
+    while remainder < 0:
+        # Float error overshot the budget; take units back from the smallest fractions
+        order = np.argsort(fractions, kind="stable")
+        order = order[units[order] > 0][:-remainder]
+        units[order] -= 1
+        remainder += len(order)
+    return units
+
+def to_base_units(amount: float, decimals: int) -> int:
+    return int(Decimal(str(amount)).scaleb(decimals).to_integral_value(rounding=ROUND_DOWN))
+
+def base_amount(amount: float, amount_base: Optional[str], decimals: int) -> int:
+    # Rows planned before amount_base existed (or set by hand) fall back to the float amount
+    return int(amount_base) if amount_base else to_base_units(amount, decimals)
+
+def chain_decimals(chain: str, token_decimals: int) -> int:
+    return CHAIN_DECIMALS.get(chain, token_decimals)
+
+def token_decimals(token_id) -> int:
+    row = cursor.execute("SELECT decimals FROM tokens WHERE token_id = ?", (token_id,)).fetchone()
+    return row[0] if row and row[0] is not None else 18
+
+def eligible_holders(campaign_id: int) -> list:
+    # (user_id, wallet, chain, tier, balance) from the same source as eligible_tiers
+    snapshot_id = latest_snapshot(campaign_id) if SNAPSHOT_TIERS else None
+    if snapshot_id is None:
+        return cursor.execute("""SELECT e.user_id, s.wallet, s.chain, e.tier, COALESCE(e.token_balance, 0) FROM eligible e
+                                 JOIN submissions s ON s.user_id = e.user_id
+                                 WHERE e.verified = 1 AND e.social_tasks_completed = 1""").fetchall()
+    return cursor.execute("""SELECT e.user_id, sub.wallet, sub.chain, s.tier, s.balance FROM eligible e
+                             JOIN snapshot_balances s ON s.snapshot_id = ? AND s.user_id = e.user_id
+                             JOIN submissions sub ON sub.user_id = e.user_id
+                             WHERE e.verified = 1 AND e.social_tasks_completed = 1 AND s.tier > 0""", (snapshot_id,)).fetchall()
+
+def build_allocation(holders: list, total_tokens: float, policy: str, fixed: dict, decimals: int) -> tuple:
+    # holders: (user_id, wallet, chain, tier, balance); fixed maps tier -> tokens per user for
+    # tiers with a token_distributions amount. Returns the plan as columns (user_ids, wallets,
+    # chains, amounts, amount_bases), so a million rows never exist as tuples at once.
+    if policy not in ALLOCATION_POLICIES:
+        raise ValueError(f"Unknown allocation policy {policy}")
+    plan = ([], [], [], [], [])
+    pooled = holders
+    fixed_tokens = Decimal(0)
+    if fixed:
+        pooled = []
+        for holder in holders:
+            amount = fixed.get(holder[3])
+            if amount is None:
+                pooled.append(holder)
+                continue
+            holder_decimals = chain_decimals(holder[2], decimals)
+            base = to_base_units(amount, holder_decimals)
+            fixed_tokens += Decimal(base).scaleb(-holder_decimals)
+            for column, value in zip(plan, (holder[0], holder[1], holder[2], float(amount), str(base))):
+                column.append(value)
+    budget = max(Decimal(str(total_tokens)) - fixed_tokens, Decimal(0))
+    if not pooled or budget == 0:
+        return plan
+
+    chains = [holder[2] for holder in pooled]
+    by_chain = {chain: chain_decimals(chain, decimals) for chain in set(chains)}
+    user_decimals = np.array([by_chain[chain] for chain in chains], dtype=np.int64)
+    exponent = min(by_chain.values())
+    while exponent > 0 and budget.scaleb(exponent) > ALLOCATION_MAX_UNITS:
+        exponent -= 1
+    total_units = int(budget.scaleb(exponent).to_integral_value(rounding=ROUND_DOWN))
+    tiers = np.nan_to_num(np.array([holder[3] for holder in pooled], dtype=np.float64)).astype(np.int64)
+    balances = np.nan_to_num(np.array([holder[4] for holder in pooled], dtype=np.float64))
+    units = allocate(ALLOCATION_POLICIES[policy](tiers, balances), total_units)
+    if not units.any():
+        return plan
+
+    # Each unit is 10**(chain decimals - exponent) base units, written out as a zero-padded string
+    padding = {d: "0" * (d - exponent) for d in by_chain.values()}
+    if len(padding) == 1:
+        pad = next(iter(padding.values()))
+        bases = [f"{count}{pad}" for count in units.tolist()]
+    else:
+        bases = [f"{count}{padding[d]}" for count, d in zip(units.tolist(), user_decimals.tolist())]
+    amounts = (units / 10.0 ** exponent).tolist()
+    # Whatever the unit grid could not express lands on the largest allocation
+    top = int(np.argmax(units))
+    top_decimals = int(user_decimals[top])
+    top_base = to_base_units(budget, top_decimals) - (total_units - int(units[top])) * 10 ** (top_decimals - exponent)
+    bases[top] = str(top_base)
+    amounts[top] = float(Decimal(top_base).scaleb(-top_decimals))
+    if units.all():
+        plan[0].extend([holder[0] for holder in pooled])
+        plan[1].extend([holder[1] for holder in pooled])
+        plan[2].extend(chains)
+        plan[3].extend(amounts)
+        plan[4].extend(bases)
+    else:
+        keep = np.flatnonzero(units).tolist()
+        for column, values in zip(plan, ([holder[0] for holder in pooled], [holder[1] for holder in pooled], chains, amounts, bases)):
+            column.extend([values[i] for i in keep])
+    return plan
+
+# Merkle Claims
+# Claim mode moves EVM allocations into a Merkle tree instead of pushing one transfer
+# each: leaves are keccak256(abi.encodePacked(uint256 index, address account, uint256
+# amount)) with sorted-pair hashing, as in Uniswap's MerkleDistributor, and the bot
+# only sends setMerkleRoot(bytes32) to the chain's distributor contract (which must be
+# funded separately). Every node is kept in merkle_nodes, so a proof is one indexed
+# read per level. Rows in a tree move to status 'merkle' and are never pushed.
+# setMerkleRoot replaces the distributor's root while its claimed bitmap stays, so each
+# tree is cumulative: it carries every leaf of the distributor's confirmed root at the
+# same index and appends new claims after them (base_root_id records which root).
+MERKLE_DISTRIBUTORS = {chain: os.getenv(f'{chain}_MERKLE_DISTRIBUTOR') for chain in ("ETH", "BSC")}
+MERKLE_CONFIRM_TIMEOUT = int(os.getenv('MERKLE_CONFIRM_TIMEOUT', '600'))
+SET_MERKLE_ROOT_SELECTOR = bytes.fromhex("7cb64759")
+DIST_MERKLE = "merkle"
+keccak = LazyImport("eth_hash.auto", "keccak")
+
+def merkle_leaf(index: int, account: str, amount: int) -> bytes:
+    return keccak(index.to_bytes(32, "big") + bytes.fromhex(account[2:]) + amount.to_bytes(32, "big"))
+
+def build_merkle_layers(leaves: list) -> list:
+    # An odd node out is carried up unchanged, so its proof skips that level
+    layers = [leaves]
+    while len(layers[-1]) > 1:
+        layer = layers[-1]
+        parents = [keccak(a + b if a <= b else b + a) for a, b in zip(layer[0::2], layer[1::2])]
+        if len(layer) % 2:
+            parents.append(layer[-1])
+        layers.append(parents)
+    return layers
+
+def merkle_proof_positions(index: int, leaves: int) -> list:
+    # (level, sibling position) for every level where the node has a sibling
+    positions = []
+    level = 0
+    while leaves > 1:
+        sibling = index ^ 1
+        if sibling < leaves:
+            positions.append((level, sibling))
+        index //= 2
+        leaves = (leaves + 1) // 2
+        level += 1
+    return positions
+
+def verify_merkle_proof(leaf: bytes, proof: list, root: bytes) -> bool:
+    node = leaf
+    for sibling in proof:
+        node = keccak(node + sibling if node <= sibling else sibling + node)
+    return node == root
+
+def merkle_claim(user_id: str) -> Optional[dict]:
+    # The user's claim in the newest confirmed root, with its proof read back from merkle_nodes
+    row = cursor.execute("""SELECT r.id, r.chain, r.distributor, r.root, r.leaves, c.idx, c.account, c.amount_base FROM merkle_claims c
+                            JOIN merkle_roots r ON r.id = c.root_id WHERE c.user_id = ? AND r.status = 'confirmed'
+                            ORDER BY r.id DESC LIMIT 1""", (user_id,)).fetchone()
+    if not row:
+        return None
+    root_id, chain, distributor, root, leaves, index, account, amount_base = row
+    positions = merkle_proof_positions(index, leaves)
+    # One primary-key lookup per level; a row-value IN list would scan the whole tree
+    hashes = dict(((level, position), node) for level, position, node in cursor.execute(
+        " UNION ALL ".join("SELECT level, position, hash FROM merkle_nodes WHERE root_id = ? AND level = ? AND position = ?" for _ in positions)
+        or "SELECT NULL, NULL, NULL WHERE 0",
+        tuple(value for pair in positions for value in (root_id, *pair))).fetchall())
+    return {"root_id": root_id, "chain": chain, "distributor": distributor, "root": root, "index": index, "account": account,
+            "amount_base": amount_base, "proof": ["0x" + hashes[pair].hex() for pair in positions]}
+
+def format_merkle_claim(claim: dict, decimals: int) -> str:
+    amount = Decimal(claim["amount_base"]).scaleb(-decimals).normalize()
+    return (f"You can claim {amount:f} Birdz Coins on {claim['chain']} from the distributor contract {claim['distributor']}.\n"
+            f"Call claim(index, account, amount, merkleProof) with:\n"
+            f"index: {claim['index']}\naccount: {claim['account']}\namount: {claim['amount_base']}\n"
+            f"merkleProof: [{', '.join(claim['proof'])}]")
+
+def confirmed_merkle_root(distributor: str) -> Optional[int]:
+    row = cursor.execute("SELECT MAX(id) FROM merkle_roots WHERE distributor = ? AND status = 'confirmed'", (distributor,)).fetchone()
+    return row[0] if row else None
+
+async def build_claim_tree(chain: str, token_id, job: Optional[Job] = None) -> Optional[dict]:
+    # Turns every planned, unsigned row on this chain into one tree on top of the distributor's confirmed root;
+    # returns None when there is nothing new to claim or a previous tree for the distributor is still unpublished
+    distributor = MERKLE_DISTRIBUTORS[chain]
+    if cursor.execute("SELECT 1 FROM merkle_roots WHERE distributor = ? AND status IN ('built', 'signed', 'broadcast')", (distributor,)).fetchone():
+        return None
+    decimals = token_decimals(token_id)
+    rows = cursor.execute("""SELECT rowid, user_id, wallet, amount, amount_base FROM distributions
+                             WHERE chain = ? AND status = 'pending' AND signed_tx IS NULL AND amount > 0 ORDER BY rowid""", (chain,)).fetchall()
+    claims = []
+    for rowid, user_id, wallet, amount, amount_base in rows:
+        # Wallets were validated on submission; anything malformed stays pending and fails on the push path
+        account = wallet_key(wallet)
+        if EVM_ADDRESS_RE.fullmatch(account):
+            claims.append((rowid, user_id, account, base_amount(amount, amount_base, decimals)))
+    if not claims:
+        return None
+    base_root_id = confirmed_merkle_root(distributor)
+    carried = [(None, user_id, account, int(amount_base)) for user_id, account, amount_base in cursor.execute(
+        "SELECT user_id, account, amount_base FROM merkle_claims WHERE root_id = ? ORDER BY idx", (base_root_id,)).fetchall()] if base_root_id else []
+    new_rowids = [claim[0] for claim in claims]
+    claims = carried + claims
+    if job:
+        job.progress(0, len(claims), f"Building {chain} Merkle tree", force=True)
+    started = time.perf_counter()
+    leaves = await asyncio.to_thread(lambda: [merkle_leaf(index, claim[2], claim[3]) for index, claim in enumerate(claims)])
+    layers = await asyncio.to_thread(build_merkle_layers, leaves)
+    root = "0x" + layers[-1][0].hex()
+    now = datetime.utcnow().isoformat()
+    try:
+        cursor.execute("""INSERT INTO merkle_roots (chain, token_id, distributor, root, leaves, total_base, status, base_root_id, created_at, updated_at)
+                          VALUES (?, ?, ?, ?, ?, ?, 'built', ?, ?, ?)""",
+                       (chain, str(token_id), distributor, root, len(claims), str(sum(claim[3] for claim in claims)), base_root_id, now, now))
+        root_id = cursor.lastrowid
+        cursor.executemany("INSERT INTO merkle_claims (root_id, idx, user_id, account, amount_base) VALUES (?, ?, ?, ?, ?)",
+                           ((root_id, index, claim[1], claim[2], str(claim[3])) for index, claim in enumerate(claims)))
+        cursor.executemany("INSERT INTO merkle_nodes (root_id, level, position, hash) VALUES (?, ?, ?, ?)",
+                           ((root_id, level, position, node) for level, layer in enumerate(layers) for position, node in enumerate(layer)))
+        cursor.executemany("UPDATE distributions SET status = 'merkle', tx_hash = ?, updated_at = ? WHERE rowid = ?",
+                           ((root, now, rowid) for rowid in new_rowids))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {"root_id": root_id, "chain": chain, "root": root, "leaves": len(claims), "new": len(new_rowids), "depth": len(layers) - 1,
+            "seconds": round(time.perf_counter() - started, 2)}
+
+def release_merkle_root(root_id: int):
+    # A root that failed on chain hands the rows it added back to the push planner; carried leaves stay with their root
+    cursor.execute("""UPDATE distributions SET status = 'pending', tx_hash = NULL, updated_at = ? WHERE status = 'merkle'
+                      AND tx_hash = (SELECT root FROM merkle_roots WHERE id = ?)
+                      AND user_id IN (SELECT user_id FROM merkle_claims WHERE root_id = ?)""", (datetime.utcnow().isoformat(), root_id, root_id))
+    cursor.execute("UPDATE merkle_roots SET status = 'failed', updated_at = ? WHERE id = ?", (datetime.utcnow().isoformat(), root_id))
+    conn.commit()
+
+# Confirmation Tracker
+# Polls broadcast transfers in batches and moves them to confirmed/failed. Transfers
+# that can provably never land (nonce used CONFIRM_DROP_DEPTH blocks ago with no receipt
+# for any of their hashes, blockhash or ledger window passed) go back to pending so the
+# next drain re-sends them.
+class ConfirmationTracker:
+    def __init__(self, airdrop_bot, context: Optional["BotContext"] = None):
+        self.airdrop_bot = airdrop_bot
+        self.context = context
+
+    async def run(self, interval: int):
+        while True:
+            try:
+                counts = await self.poll_once()
+                if counts["requeued"]:
+                    await self.resend()
+            except Exception as e:
+                logger.error(f"Confirmation poll failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def outstanding(self, chain: str) -> list:
+        cursor.execute("SELECT rowid, tx_hash, nonce, signed_tx, updated_at, prior_hashes, sender FROM distributions WHERE status IN ('broadcast', 'completed') AND chain = ? AND tx_hash IS NOT NULL ORDER BY rowid",
+                       (chain,))
+        return cursor.fetchall()
+
+    async def poll_once(self) -> dict:
+        counts = {"confirmed": 0, "failed": 0, "requeued": 0, "pending": 0}
+        for chain in ("ETH", "BSC"):
+            self.apply(await self.check_evm(chain, self.outstanding(chain)), counts)
+        self.apply(await self.check_sol(self.outstanding("SOL")), counts)
+        self.apply(await self.check_xrp(self.outstanding("XRP")), counts)
+        logger.info(f"Confirmation poll: {counts}")
+        return counts
+
+    def apply(self, results: list, counts: dict):
+        now = datetime.utcnow().isoformat()
+        confirmed = [(now, rowid) for rowid, outcome, _ in results if outcome == DIST_CONFIRMED]
+        failed = [(error, now, rowid) for rowid, outcome, error in results if outcome == DIST_FAILED]
+        requeued = [(error, now, rowid) for rowid, outcome, error in results if outcome == DIST_PENDING]
+        cursor.executemany("UPDATE distributions SET status = 'confirmed', updated_at = ? WHERE rowid = ?", confirmed)
+        cursor.executemany("UPDATE distributions SET status = 'failed', last_error = ?, updated_at = ? WHERE rowid = ?", failed)
+        cursor.executemany("UPDATE distributions SET status = 'pending', signed_tx = NULL, tx_hash = NULL, prior_hashes = NULL, nonce = NULL, last_error = ?, updated_at = ? WHERE rowid = ?", requeued)
+        conn.commit()
+        counts["confirmed"] += len(confirmed)
+        counts["failed"] += len(failed)
+        counts["requeued"] += len(requeued)
+        counts["pending"] += sum(1 for _, outcome, _ in results if outcome is None)
+
+    async def check_evm(self, chain: str, rows: list) -> list:
+        if not rows:
+            return []
+        # Every read of a poll goes to one endpoint without hedging: a lagging node answering "no receipt"
+        # next to another node's nonce would look exactly like a dropped transaction
+        endpoint = rpc_pools[chain].ranked()[0]
+        head = int((await rpc_batch(chain, "eth_blockNumber", [("eth_blockNumber", [])], endpoint=endpoint))[0]["result"], 16)
+        # Nonces are per sender and read before any receipt: once a nonce is below the count CONFIRM_DROP_DEPTH
+        # blocks back, a receipt fetched afterwards would show the transfer if any of its hashes had used it
+        addresses = {}
+        for row in rows:
+            lane = sender_lane(chain, row[6])
+            addresses[row[0]] = lane.address if lane else row[6]
+        senders = list(dict.fromkeys(addresses.values()))
+        calls = [("eth_getTransactionCount", [address, tag]) for address in senders for tag in ("latest", hex(max(head - CONFIRM_DROP_DEPTH, 0)))]
+        replies = await rpc_batch(chain, "eth_getTransactionCount", calls, endpoint=endpoint)
+        counts = [int(reply["result"], 16) if "result" in reply else None for reply in replies]
+        mined_nonces = {address: counts[2 * i] for i, address in enumerate(senders)}
+        settled_nonces = {address: counts[2 * i + 1] for i, address in enumerate(senders)}
+
+        results = []
+        stuck = []
+        dropped = []
+        for start in range(0, len(rows), CONFIRM_EVM_BATCH):
+            chunk = rows[start:start + CONFIRM_EVM_BATCH]
+            receipts = await self.evm_receipts(chain, chunk, endpoint)
+            for rowid, tx_hash, nonce, signed_tx, updated_at, prior_hashes, sender in chunk:
+                if rowid in receipts:
+                    results.append(self.evm_result(rowid, tx_hash, *receipts[rowid]))
+                    continue
+                if nonce is not None:
+                    address = addresses[rowid]
+                    settled = settled_nonces.get(address)
+                    if settled is not None and nonce < settled:
+                        dropped.append((rowid, tx_hash, nonce, signed_tx, updated_at, prior_hashes, sender))
+                        continue
+                    mined = mined_nonces.get(address)
+                    if mined is not None and nonce < mined:
+                        # Used recently by some transaction; wait for the receipt or for the nonce to settle
+                        results.append((rowid, None, None))
+                        continue
+                    if signed_tx and datetime.utcnow() - datetime.fromisoformat(updated_at) > timedelta(seconds=FEE_BUMP_AFTER):
+                        stuck.append((rowid, signed_tx, tx_hash, prior_hashes, sender))
+                results.append((rowid, None, None))
+        # Receipts are asked for again right before requeueing; only a transfer none of whose hashes was mined is re-sent
+        if dropped:
+            receipts = await self.evm_receipts(chain, dropped, endpoint)
+            for rowid, tx_hash, *_ in dropped:
+                if rowid in receipts:
+                    results.append(self.evm_result(rowid, tx_hash, *receipts[rowid]))
+                else:
+                    results.append((rowid, DIST_PENDING, f"Transaction {tx_hash} dropped"))
+        for rowid, signed_tx, tx_hash, prior_hashes, sender in stuck:
+            try:
+                await self.airdrop_bot.bump_evm_transfer(chain, rowid, signed_tx, tx_hash, prior_hashes, sender)
+            except Exception as e:
+                logger.error(f"Fee bump for {tx_hash} on {chain} failed: {str(e)}")
+        return results
+
+    async def evm_receipts(self, chain: str, rows: list, endpoint: Endpoint) -> dict:
+        # Fee-bumped transfers are checked under every hash they were broadcast with
+        lookups = [(row, tx_hash) for row in rows for tx_hash in [row[1]] + (row[5].split(",") if row[5] else [])]
+        replies = await rpc_batch(chain, "eth_getTransactionReceipt", [("eth_getTransactionReceipt", [tx_hash]) for _, tx_hash in lookups], endpoint=endpoint)
+        receipts = {}
+        for (row, tx_hash), reply in zip(lookups, replies):
+            if "result" not in reply:
+                raise Exception(reply.get("error", {}).get("message", f"Receipt lookup for {tx_hash} failed"))
+            if reply["result"]:
+                receipts[row[0]] = (tx_hash, reply["result"])
+        return receipts
+
+    def evm_result(self, rowid: int, tx_hash: str, mined_hash: str, receipt: dict) -> tuple:
+        if mined_hash != tx_hash:
+            cursor.execute("UPDATE distributions SET tx_hash = ? WHERE rowid = ?", (mined_hash, rowid))
+        if int(receipt.get("status", "0x1"), 16) == 1:
+            return (rowid, DIST_CONFIRMED, None)
+        return (rowid, DIST_FAILED, f"Transaction {mined_hash} reverted")
+
+    async def check_sol(self, rows: list) -> list:
+        if not rows:
+            return []
+        # Packed transfers share one signature, so each signature is looked up once
+        height, statuses = await sol_signature_statuses(list(dict.fromkeys(row[1] for row in rows)))
+        results = []
+        for rowid, tx_hash, last_valid, _, _, _, _ in rows:
+            if tx_hash not in statuses:
+                results.append((rowid, None, None))
+                continue
+            status = statuses[tx_hash]
+            if status is None:
+                # A signature unknown once the chain is past its blockhash's lastValidBlockHeight can no longer land
+                expired = last_valid is not None and height is not None and height > last_valid
+                results.append((rowid, DIST_PENDING, f"Transaction {tx_hash} expired at block height {last_valid}") if expired else (rowid, None, None))
+            elif status.get("err") is not None:
+                results.append((rowid, DIST_FAILED, f"Transaction {tx_hash} failed: {status['err']}"))
+            elif status.get("confirmationStatus") == "finalized":
+                results.append((rowid, DIST_CONFIRMED, None))
+            else:
+                results.append((rowid, None, None))
+        return results
+
+    async def check_xrp(self, rows: list) -> list:
+        # Each sender's history is paged separately; the paying account is read from the signed blob itself
+        by_account = {}
+        for row in rows:
+            tx = xrpl_decode(row[3]) if row[3] else {}
+            lane = sender_lane("XRP", row[6])
+            by_account.setdefault(tx.get("Account") or (lane.address if lane else row[6]), []).append((row, tx.get("LastLedgerSequence")))
+        results = []
+        for account, account_rows in by_account.items():
+            results.extend(await self.check_xrp_account(account, account_rows))
+        return results
+
+    async def check_xrp_account(self, account: str, rows: list) -> list:
+        # account_tx returns up to 400 of the sender's transactions per call, far fewer calls than one tx lookup per hash
+        outstanding = {}
+        for row, last_ledger in rows:
+            outstanding[row[1].upper()] = (row[0], last_ledger)
+        known_ledgers = [ledger for _, ledger in outstanding.values() if ledger]
+        oldest_ledger = min(known_ledgers) - 40 if known_ledgers and len(known_ledgers) == len(outstanding) else None
+        results = []
+        marker = None
+        validated_ledger = None
+        # Every page comes from one endpoint, unhedged: a missing hash is requeued against that node's own validated ledger
+        endpoint = rpc_pools["XRP"].ranked()[0]
+        while outstanding:
+            params = {"account": account, "ledger_index_min": -1, "ledger_index_max": -1, "limit": 400, "forward": False}
+            if marker:
+                params["marker"] = marker
+            page = await xrp_rpc("account_tx", params, endpoint=endpoint)
+            validated_ledger = validated_ledger or page.get("ledger_index_max")
+            entries = page.get("transactions", [])
+            for entry in entries:
+                tx_hash = entry.get("tx", {}).get("hash", "").upper()
+                if tx_hash in outstanding and entry.get("validated"):
+                    rowid, _ = outstanding.pop(tx_hash)
+                    result = entry.get("meta", {}).get("TransactionResult", "")
+                    results.append((rowid, DIST_CONFIRMED, None) if result == "tesSUCCESS" else (rowid, DIST_FAILED, f"Transaction {tx_hash} failed: {result}"))
+            marker = page.get("marker")
+            oldest_seen = entries[-1].get("tx", {}).get("ledger_index") if entries else None
+            if not marker or (oldest_ledger and oldest_seen and oldest_seen < oldest_ledger):
+                break
+        for tx_hash, (rowid, last_ledger) in outstanding.items():
+            if last_ledger and validated_ledger and last_ledger < validated_ledger:
+                results.append((rowid, DIST_PENDING, f"Transaction {tx_hash} expired at ledger {last_ledger}"))
+            else:
+                results.append((rowid, None, None))
+        return results
+
+    async def resend(self):
+        run = get_active_distribution_run()
+        if run or self.context is None:
+            return
+        cursor.execute("SELECT token_id, chat_id, lang FROM distribution_runs ORDER BY id DESC LIMIT 1")
+        last_run = cursor.fetchone()
+        if last_run:
+            logger.info("Re-sending dropped transfers")
+            self.airdrop_bot.jobs.enqueue("distribution", {"token_id": last_run[0], "mode": "drain"}, last_run[1], last_run[2], "system", self.context)
+
+# Callback data is client-supplied (free text on Discord), so only known actions become label values
+CALLBACK_ACTIONS = frozenset((
+    "add_admin", "add_task", "agree_terms", "approve_all_referrals", "approve_all_tasks", "approve_referrals",
+    "approve_tasks", "audit_wallets", "balance", "blacklist", "change_contract", "check_confirmations", "check_groups",
+    "claim_distribution", "claim_tokens", "confirm_groups", "daily_tasks", "delete_campaign", "delete_task",
+    "distribute_all", "edit_campaign", "edit_permissions", "edit_task", "export_data", "import_wallet_list", "jobs",
+    "join_airdrop", "kyc_start", "leaderboard", "manage_admins", "my_referrals", "pause_distribution", "refer",
+    "referral_attribution", "referral_leaderboard", "remove_admin", "reset_user", "resume_distribution",
+    "retry_failed_distributions", "set_bulk_amounts", "set_campaign", "set_config", "set_distribution_amount",
+    "set_snapshot_block", "set_token_amount", "snapshot_now", "start", "submit_wallet", "sybil_sweep", "tasks",
+    "terms", "view_admins", "view_blacklist", "view_users", "view_whitelist", "whitelist"
+))
+CALLBACK_PREFIXES = ("wallet_", "start_distribution_", "cancel_job_")
+
+def handler_action(kind: str, update, context) -> str:
+    if kind == "callback":
+        data = getattr(getattr(update, "callback_query", None), "data", None) or ""
+        if data in CALLBACK_ACTIONS:
+            return data
+        return next((prefix.rstrip("_") for prefix in CALLBACK_PREFIXES if data.startswith(prefix)), "other")
+    if kind == "message":
+        for key, value in context.user_data.items():
+            if key.startswith("awaiting_") and value:
+                return key
+        if context.user_data.get("kyc_step"):
+            return f"kyc_{context.user_data['kyc_step']}"
+        return "text"
+    return kind
+
+def instrument_handler(kind: str):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, update, context):
+            labels = (("handler", kind), ("action", handler_action(kind, update, context)))
+            started = time.perf_counter()
+            try:
+                return await func(self, update, context)
+            except Exception:
+                HANDLER_ERRORS.inc(labels)
+                raise
+            finally:
+                HANDLER_LATENCY.observe(time.perf_counter() - started, labels)
+                if (("phase", "first_update"),) not in STARTUP_SECONDS.values:
+                    STARTUP_SECONDS.set(time.perf_counter() - PROCESS_STARTED, (("phase", "first_update"),))
+        return wrapper
+    return decorator
+
+# Background Jobs
+# Long admin actions (distributions, exports, sybil sweeps) run as jobs: the handler
+# inserts a row into jobs and returns, and the runner executes it under a per-kind
+# concurrency cap, writing progress back to the row. The cap holds across every process
+# sharing the database: a job starts by a conditional UPDATE that claims the row only
+# while fewer than JOB_LIMITS jobs of its kind hold a live lease. The owning process
+# renews the lease (owner, lease_until) while the job waits or runs, so recovery only
+# touches rows whose owner stopped renewing. Cancelling only marks the row, so any
+# process can cancel any job; the owning runner polls for the mark and either asks the
+# job to stop at its next checkpoint or cancels its task.
+JOB_LIMITS = {"distribution": 1, "export": 2, "sybil": 1, "snapshot": 1}
+for item in os.getenv('JOB_LIMITS', '').split(','):
+    if '=' in item:
+        JOB_LIMITS[item.split('=')[0].strip()] = int(item.split('=')[1])
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '1'))
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '60'))
+JOB_PERMISSIONS = {"distribution": "distribute", "export": "all", "sybil": "manage_users", "snapshot": "distribute"}
+JOB_ACTIVE = ("queued", "running", "cancelling")
+JOBS_RUNNING = Gauge("airdrop_jobs_running", "Background jobs currently running by kind")
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    def __init__(self, job_id: int, kind: str, params: dict, chat_id: str, lang: str, context: BotContext):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.chat_id = chat_id
+        self.lang = lang
+        self.context = context
+        self.cancelled = False
+        self.reported_at = 0.0
+
+    def progress(self, done: int, total: int, message: str = None, force: bool = False):
+        # Persisted at most once per JOB_POLL_SECONDS; the row is what /jobs shows
+        now = time.monotonic()
+        if not force and now - self.reported_at < JOB_POLL_SECONDS:
+            return
+        self.reported_at = now
+        cursor.execute("UPDATE jobs SET done = ?, total = ?, message = COALESCE(?, message), updated_at = ? WHERE id = ?",
+                       (done, total, message, datetime.utcnow().isoformat(), self.id))
+        conn.commit()
+
+    def checkpoint(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+class JobRunner:
+    def __init__(self, handlers: dict, graceful: set = ()):
+        # graceful kinds check job.cancelled at safe points instead of being interrupted
+        self.handlers = handlers
+        self.graceful = set(graceful)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{os.urandom(4).hex()}"
+        self.tasks = {}
+
+    def lease_until(self) -> str:
+        return (datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)).isoformat()
+
+    def recover(self):
+        # Only jobs whose owner stopped renewing the lease (a crashed or stopped process) are given up;
+        # rows without a lease predate leases and can only belong to a previous process
+        now = datetime.utcnow().isoformat()
+        cursor.execute("UPDATE jobs SET status = 'interrupted', finished_at = ? WHERE status IN ('queued', 'running', 'cancelling') "
+                       "AND (lease_until IS NULL OR lease_until < ?)", (now, now))
+        conn.commit()
+
+    def renew(self, job: Job) -> bool:
+        cursor.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ?", (self.lease_until(), job.id, self.owner))
+        conn.commit()
+        return cursor.rowcount == 1
+
+    def claim(self, job: Job) -> bool:
+        # Atomic across processes: SQLite applies one write at a time, so the running count cannot change under the UPDATE
+        now = datetime.utcnow().isoformat()
+        cursor.execute("""UPDATE jobs SET status = 'running', lease_until = ?, started_at = ?, updated_at = ?
+                          WHERE id = ? AND owner = ? AND status = 'queued'
+                          AND (SELECT COUNT(*) FROM jobs WHERE kind = ? AND status IN ('running', 'cancelling') AND lease_until >= ?) < ?""",
+                       (self.lease_until(), now, now, job.id, self.owner, job.kind, now, JOB_LIMITS.get(job.kind, 1)))
+        conn.commit()
+        return cursor.rowcount == 1
+
+    def enqueue(self, kind: str, params: dict, chat_id: str, lang: str, created_by: str, context: BotContext) -> int:
+        now = datetime.utcnow().isoformat()
+        cursor.execute("""INSERT INTO jobs (kind, params, status, done, total, chat_id, lang, created_by, created_at, updated_at, owner, lease_until)
+                          VALUES (?, ?, 'queued', 0, 0, ?, ?, ?, ?, ?, ?, ?)""",
+                       (kind, json.dumps(params), chat_id, lang, created_by, now, now, self.owner, self.lease_until()))
+        conn.commit()
+        job = Job(cursor.lastrowid, kind, params, chat_id, lang, context)
+        self.tasks[job.id] = asyncio.create_task(self._run(job))
+        return job.id
+
+    def _finish(self, job: Job, status: str, message: str):
+        cursor.execute("UPDATE jobs SET status = ?, message = ?, lease_until = NULL, finished_at = ?, updated_at = ? WHERE id = ?",
+                       (status, message, datetime.utcnow().isoformat(), datetime.utcnow().isoformat(), job.id))
+        conn.commit()
+
+    async def _watch(self, job: Job, task: asyncio.Task):
+        renewed_at = time.monotonic()
+        while not task.done():
+            await asyncio.sleep(JOB_POLL_SECONDS)
+            if time.monotonic() - renewed_at >= JOB_LEASE_SECONDS / 3:
+                renewed_at = time.monotonic()
+                if not self.renew(job):
+                    # Another process recovered the row; stop rather than run a job nobody tracks
+                    logger.error(f"Job {job.id} ({job.kind}) lost its lease")
+                    job.cancelled = True
+                    task.cancel()
+                    continue
+            if job.cancelled:
+                continue
+            row = cursor.execute("SELECT status FROM jobs WHERE id = ?", (job.id,)).fetchone()
+            if row and row[0] == "cancelling":
+                job.cancelled = True
+                if job.kind not in self.graceful:
+                    task.cancel()
+
+    async def _run(self, job: Job):
+        try:
+            renewed_at = time.monotonic()
+            while not self.claim(job):
+                row = cursor.execute("SELECT status, owner FROM jobs WHERE id = ?", (job.id,)).fetchone()
+                if row[0] == "cancelled":
+                    self._finish(job, "cancelled", "Cancelled before it started.")
+                    return
+                if row[0] != "queued" or row[1] != self.owner:
+                    logger.error(f"Job {job.id} ({job.kind}) was recovered by another process before it started")
+                    return
+                # A queued job keeps its lease too, so recovery elsewhere leaves it alone while it waits for a slot
+                if time.monotonic() - renewed_at >= JOB_LEASE_SECONDS / 3:
+                    renewed_at = time.monotonic()
+                    self.renew(job)
+                await asyncio.sleep(JOB_POLL_SECONDS)
+            JOBS_RUNNING.inc((("kind", job.kind),))
+            task = asyncio.create_task(self.handlers[job.kind](job))
+            watcher = asyncio.create_task(self._watch(job, task))
+            try:
+                message = await task
+                status = "cancelled" if job.cancelled else "completed"
+            except (asyncio.CancelledError, JobCancelled):
+                status, message = "cancelled", "Cancelled."
+            except Exception as e:
+                logger.error(f"Job {job.id} ({job.kind}) failed: {str(e)}")
+                status, message = "failed", str(e)
+            finally:
+                watcher.cancel()
+                JOBS_RUNNING.dec((("kind", job.kind),))
+            self._finish(job, status, message or status.capitalize())
+            await job.context.send_message(job.chat_id, f"Job #{job.id} ({job.kind}) {status}: {message or ''}".strip())
+        finally:
+            self.tasks.pop(job.id, None)
+
+    def cancel(self, job_id: int) -> bool:
+        cursor.execute("UPDATE jobs SET status = CASE status WHEN 'queued' THEN 'cancelled' ELSE 'cancelling' END, updated_at = ? "
+                       "WHERE id = ? AND status IN ('queued', 'running')", (datetime.utcnow().isoformat(), job_id))
+        conn.commit()
+        return cursor.rowcount > 0
+
+def list_jobs(limit: int = 10) -> list:
+    return cursor.execute("SELECT id, kind, status, done, total, message, created_at FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+
+def write_distribution_workbook(rows: list, path: str):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["User ID", "Wallet", "Chain", "Amount", "Status", "Tx Hash"])
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+def format_jobs(rows: list) -> tuple[str, list]:
+    if not rows:
+        return "No jobs yet.", []
+    lines, buttons = [], []
+    for job_id, kind, status, done, total, message, created_at in rows:
+        progress = f" {done}/{total}" if total else ""
+        lines.append(f"#{job_id} {kind} - {status}{progress}" + (f" - {message}" if message else ""))
+        if status in ("queued", "running"):
+            buttons.append([InlineKeyboardButton(f"Cancel #{job_id}", callback_data=f"cancel_job_{job_id}")])
+    return "\n".join(lines), buttons
+
 # Core Bot Logic
 class AirdropBot:
     def __init__(self):
         self.telegram_app = None
         self.discord_bot = None
+        self.jobs = JobRunner({"distribution": self.distribution_job, "export": self.export_job, "sybil": self.sybil_job,
+                               "snapshot": self.snapshot_job},
+                              graceful={"distribution"})
 
+    @instrument_handler("start")
     async def start(self, update: Union[Update, discord.Message], context: BotContext):
         user_id = str(update.message.from_user.id if context.platform == "telegram" else update.author.id)
         user_name = update.message.from_user.first_name if context.platform == "telegram" else update.author.name
@@ -468,6 +3481,7 @@ class AirdropBot:
                                    (referrer[0], user_id, datetime.utcnow().isoformat()))
                     cursor.execute("UPDATE users SET referred_by = ? WHERE user_id = ?", (referrer[0], user_id))
                     conn.commit()
+                    referral_graph.added(referrer[0], user_id)
                     await context.send_message(referrer[0], LANGUAGES[lang]["referral_pending"].format(referee=user_name))
 
         if not has_seen_menu(user_id):
@@ -480,6 +3494,44 @@ class AirdropBot:
             context.user_data["format_args"] = {"balance": balance, "ref_link": referral_code}
             await context.send_message(chat_id, LANGUAGES[lang]["welcome"], reply_markup)
 
+    async def metrics_command(self, update: Union[Update, discord.Message], context: BotContext):
+        user_id = str(update.message.from_user.id if context.platform == "telegram" else update.author.id)
+        chat_id = str(update.message.chat_id if context.platform == "telegram" else update.channel.id)
+        if not is_admin(user_id):
+            await context.send_message(chat_id, LANGUAGES[get_user_language(user_id)]["admin_only"])
+            return
+        document = io.BytesIO(render_metrics().encode())
+        document.name = "metrics.txt"
+        await context.send_document(chat_id, document)
+        if SHARD_ID is not None:
+            await context.send_message(chat_id, "Metrics" + shard_scope_note() + ".")
+
+    async def sqltop_command(self, update: Union[Update, discord.Message], context: BotContext):
+        user_id = str(update.message.from_user.id if context.platform == "telegram" else update.author.id)
+        chat_id = str(update.message.chat_id if context.platform == "telegram" else update.channel.id)
+        if not is_admin(user_id):
+            await context.send_message(chat_id, LANGUAGES[get_user_language(user_id)]["admin_only"])
+            return
+        args = (update.message.text if context.platform == "telegram" else update.content).split()[1:]
+        if context.platform == "discord":
+            args = args[1:]
+        arg = args[0].lower() if args else "10"
+        if arg in ("on", "off"):
+            sql_profiler.enabled = arg == "on"
+            await context.send_message(chat_id, f"SQL profiler turned {arg}{shard_scope_note()}.")
+            return
+        if arg == "reset":
+            sql_profiler.stats.clear()
+            await context.send_message(chat_id, f"SQL profiler statistics cleared{shard_scope_note()}.")
+            return
+        limit = int(arg) if arg.isdigit() else 10
+        document = io.BytesIO(sql_profiler.report(limit).encode())
+        document.name = "sqltop.txt"
+        await context.send_document(chat_id, document)
+        if SHARD_ID is not None:
+            await context.send_message(chat_id, "SQL profile" + shard_scope_note() + ".")
+
+    @instrument_handler("callback")
     async def button_handler(self, update: Union[Update, discord.Message], context: BotContext):
         user_id = str(update.callback_query.from_user.id if context.platform == "telegram" else update.author.id)
         lang = get_user_language(user_id)
@@ -600,12 +3652,65 @@ class AirdropBot:
             reply_markup = InlineKeyboardMarkup(keyboard)
             await context.send_message(chat_id, f"Your referral link: {referral_code}", reply_markup)
 
+        elif data == "my_referrals":
+            stats = referral_graph.stats(user_id)
+            levels = referral_graph.downline(user_id)
+            recent = referral_graph.recent(user_id)
+            names = {}
+            if recent:
+                placeholders = ",".join("?" * len(recent))
+                names = dict(cursor.execute(f"SELECT user_id, username FROM users WHERE user_id IN ({placeholders})",
+                                            [referee_id for referee_id, _ in recent]).fetchall())
+            lines = [f"Approved: {stats['approved']}", f"Pending: {stats['pending']}",
+                     "Approved by level: " + ", ".join(f"L{depth}: {count}" for depth, count in enumerate(levels, 1))]
+            if recent:
+                lines.append("\nLatest referrals:")
+                lines.extend(f"{names.get(referee_id) or referee_id} ({status})" for referee_id, status in reversed(recent))
+            keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            await context.send_message(chat_id, "\n".join(lines), reply_markup)
+
+        elif data == "referral_leaderboard":
+            top = top_referrers()
+            if top:
+                text = "🏆 Top Referrers 🏆\n\n" + "\n".join(f"{i}. {username or referrer_id} - {approved} referrals"
+                                                             for i, (referrer_id, username, approved, _) in enumerate(top, 1))
+            else:
+                text = "No approved referrals yet."
+            keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            await context.send_message(chat_id, text, reply_markup)
+
+        elif data == "referral_attribution" and has_permission(user_id, "manage_users"):
+            scores = await asyncio.to_thread(attribute_referrals, *referral_graph.approved_edges())
+            ranked = sorted(scores.items(), key=lambda item: item[1][0], reverse=True)
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(["user_id", "score"] + [f"level_{depth}" for depth in range(1, REFERRAL_LEVELS + 1)])
+            for referrer_id, (score, counts) in ranked:
+                writer.writerow([referrer_id, f"{score:g}"] + counts)
+            document = io.BytesIO(output.getvalue().encode())
+            document.name = "referral_attribution.csv"
+            await context.send_document(chat_id, document)
+            summary = "\n".join(f"{i}. {referrer_id} - score {score:g} ({', '.join(map(str, counts))})"
+                                 for i, (referrer_id, (score, counts)) in enumerate(ranked[:10], 1))
+            keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            await context.send_message(chat_id, f"Referral attribution over {REFERRAL_LEVELS} levels (decay {REFERRAL_DECAY:g}):\n{summary or 'No approved referrals yet.'}", reply_markup)
+
+        elif data == "sybil_sweep" and has_permission(user_id, "manage_users"):
+            await self.enqueue_job("sybil", {}, user_id, chat_id, context, lang)
+
         elif data == "claim_tokens":
             cursor.execute("SELECT amount FROM distributions WHERE user_id = ? AND status = 'claimable'", (user_id,))
             distribution = cursor.fetchone()
             keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
-            if not distribution:
+            claim = merkle_claim(user_id)
+            if claim:
+                cursor.execute("SELECT token_id FROM merkle_roots WHERE id = ?", (claim["root_id"],))
+                await context.send_message(chat_id, format_merkle_claim(claim, token_decimals(cursor.fetchone()[0])), reply_markup)
+            elif not distribution:
                 await context.send_message(chat_id, "No claimable Birdz Coins found.", reply_markup)
             else:
                 amount = distribution[0]
@@ -623,37 +3728,94 @@ class AirdropBot:
             parts = data.split("_")
             token_id = int(parts[2])
             tier = parts[3] if len(parts) > 3 else None
-            
-            if tier:
-                tier_num = int(tier.replace("tier", ""))
-                await self.calculate_airdrop_by_tier(1, token_id, tier_num)
+            params = {"token_id": token_id, "mode": "tier", "tier": int(tier.replace("tier", ""))} if tier else {"token_id": token_id, "mode": "weighted"}
+            await self.enqueue_job("distribution", params, user_id, chat_id, context, lang)
+
+        elif data == "distribute_all" and is_admin(user_id):
+            await self.enqueue_job("distribution", {"token_id": "1", "mode": "all"}, user_id, chat_id, context, lang)
+
+        elif data == "claim_distribution" and has_permission(user_id, "distribute"):
+            await self.enqueue_job("distribution", {"token_id": "1", "mode": "claim"}, user_id, chat_id, context, lang)
+
+        elif data == "pause_distribution" and has_permission(user_id, "distribute"):
+            run = get_active_distribution_run()
+            keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            if run and run[4] == "running":
+                set_distribution_run_status(run[0], "paused")
+                await context.send_message(chat_id, f"Pausing distribution run {run[0]} once the current batch of up to {DIST_BATCH_SIZE} transfers finishes.", reply_markup)
             else:
-                await calculate_airdrop(1, token_id)
-                
-            await self.distribute_tokens(chat_id, context, token_id, lang)
+                await context.send_message(chat_id, "No running distribution.", reply_markup)
+
+        elif data == "resume_distribution" and has_permission(user_id, "distribute"):
+            run = get_active_distribution_run()
+            if not run or not resume_distribution_run(run[0]):
+                await context.send_message(chat_id, "No paused distribution to resume.", reply_markup=get_main_menu(user_id, lang))
+            else:
+                await context.send_message(chat_id, f"Resuming distribution run {run[0]}.")
+                await self.enqueue_job("distribution", {"token_id": run[1], "mode": "drain", "run_id": run[0]}, user_id, run[2], context, run[3])
+
+        elif data == "check_confirmations" and has_permission(user_id, "distribute"):
+            counts = await ConfirmationTracker(self).poll_once()
             keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
-            await context.send_message(chat_id, "Token distribution completed!", reply_markup)
+            await context.send_message(chat_id, f"Confirmed: {counts['confirmed']}, Failed: {counts['failed']}, "
+                                                f"Re-queued: {counts['requeued']}, Still pending: {counts['pending']}", reply_markup)
 
-        elif data == "distribute_all" and is_admin(user_id):
-            await calculate_airdrop_all(1, "1")
-            await self.distribute_tokens(chat_id, context, "1", lang)
+        elif data == "retry_failed_distributions" and has_permission(user_id, "distribute"):
+            retried = await retry_failed_distributions()
+            keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            await context.send_message(chat_id, f"{retried} failed transfers queued for retry. Start or resume a distribution to send them.", reply_markup)
+
+        elif data == "audit_wallets" and has_permission(user_id, "manage_users"):
+            cursor.execute("SELECT user_id, wallet, chain FROM submissions")
+            submissions = cursor.fetchall()
+            report = validate_addresses((chain, wallet) for _, wallet, chain in submissions)
+            fixes = [(report["normalized"][((chain or "").strip().upper(), wallet)], user_id) for user_id, wallet, chain in submissions
+                     if ((chain or "").strip().upper(), wallet) in report["normalized"]]
+            cursor.executemany("UPDATE submissions SET wallet = ? WHERE user_id = ?", fixes)
+            conn.commit()
+            invalid_users = [str(user_id) for user_id, wallet, chain in submissions if ((chain or "").strip().upper(), wallet) in report["invalid"]]
+            message = (f"Audited {len(submissions)} wallets: {len(submissions) - len(invalid_users)} valid, "
+                       f"{len(invalid_users)} invalid, {len(fixes)} normalized.")
+            if invalid_users:
+                message += "\nInvalid wallets from users: " + ", ".join(invalid_users[:50]) + (" ..." if len(invalid_users) > 50 else "")
             keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
-            await context.send_message(chat_id, "Distribution to all users started!", reply_markup)
+            await context.send_message(chat_id, message, reply_markup)
 
         elif data == "export_data" and is_admin(user_id):
-            wb = Workbook()
-            ws = wb.active
-            ws.append(["User ID", "Wallet", "Chain", "Amount", "Status", "Tx Hash"])
-            cursor.execute("SELECT user_id, wallet, chain, amount, status, tx_hash FROM distributions")
-            for row in cursor.fetchall():
-                ws.append(row)
-            wb.save("airdrop_log.xlsx")
-            await context.send_document(chat_id, open("airdrop_log.xlsx", "rb"))
+            await self.enqueue_job("export", {}, user_id, chat_id, context, lang)
+
+        elif data == "snapshot_now" and has_permission(user_id, "distribute"):
+            await self.enqueue_job("snapshot", {"campaign_id": 1, "trigger": "manual"}, user_id, chat_id, context, lang)
+
+        elif data == "set_snapshot_block" and has_permission(user_id, "manage_config"):
+            context.user_data['awaiting_snapshot_block'] = True
             keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
-            await context.send_message(chat_id, "Data exported!", reply_markup)
+            await context.send_message(chat_id, "Enter campaign ID, chain and block height to snapshot at (e.g., '1 ETH 19000000'), or 'campaign_id end' to use the end date:", reply_markup)
+
+        elif data == "jobs" and is_admin(user_id):
+            text, buttons = format_jobs(list_jobs())
+            keyboard = buttons + [[InlineKeyboardButton("Refresh", callback_data="jobs")],
+                                  [InlineKeyboardButton("Back to Menu", callback_data="start")]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            await context.send_message(chat_id, text, reply_markup)
+
+        elif data.startswith("cancel_job_") and is_admin(user_id):
+            job_id = int(data.split("_")[2])
+            row = cursor.execute("SELECT kind FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            keyboard = [[InlineKeyboardButton("Jobs", callback_data="jobs")],
+                        [InlineKeyboardButton("Back to Menu", callback_data="start")]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            if not row or not has_permission(user_id, JOB_PERMISSIONS.get(row[0], "all")):
+                await context.send_message(chat_id, "You don't have permission to cancel this job.", reply_markup)
+            elif self.jobs.cancel(job_id):
+                await context.send_message(chat_id, f"Cancelling job #{job_id}.", reply_markup)
+            else:
+                await context.send_message(chat_id, f"Job #{job_id} is not running.", reply_markup)
 
         elif data == "blacklist" and is_admin(user_id):
             context.user_data['awaiting_blacklist'] = True
@@ -667,19 +3829,26 @@ class AirdropBot:
             reply_markup = InlineKeyboardMarkup(keyboard)
             await context.send_message(chat_id, "Enter wallet to whitelist:", reply_markup)
 
+        elif data == "import_wallet_list" and has_permission(user_id, "manage_blacklist"):
+            keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            await context.send_message(chat_id, "Upload a .csv or .txt file with one wallet per line, captioned 'blacklist' or 'whitelist'.", reply_markup)
+
         elif data == "view_blacklist" and is_admin(user_id):
-            cursor.execute("SELECT wallet FROM blacklist")
+            cursor.execute("SELECT wallet FROM blacklist LIMIT 100")
             wallets = [row[0] for row in cursor.fetchall()]
-            response = "\n".join(wallets) if wallets else "No wallets blacklisted."
+            total = len(blacklist)
+            response = "\n".join(wallets) + (f"\n... and {total - len(wallets)} more" if total > len(wallets) else "") if wallets else "No wallets blacklisted."
             keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             context.user_data["format_args"] = {"wallets": response}
             await context.send_message(chat_id, LANGUAGES[lang]["view_blacklist"], reply_markup)
 
         elif data == "view_whitelist" and is_admin(user_id):
-            cursor.execute("SELECT wallet FROM whitelist")
+            cursor.execute("SELECT wallet FROM whitelist LIMIT 100")
             wallets = [row[0] for row in cursor.fetchall()]
-            response = "\n".join(wallets) if wallets else "No wallets whitelisted."
+            total = len(whitelist)
+            response = "\n".join(wallets) + (f"\n... and {total - len(wallets)} more" if total > len(wallets) else "") if wallets else "No wallets whitelisted."
             keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             context.user_data["format_args"] = {"wallets": response}
@@ -691,17 +3860,16 @@ class AirdropBot:
             reply_markup = InlineKeyboardMarkup(keyboard)
             await context.send_message(chat_id, "Enter user_id and amount (e.g., '12345 500'):", reply_markup)
 
-        elif data == "set_bulk_amounts" and is_admin(user_id):
-            context.user_data['awaiting_bulk_amounts'] = True
+        elif data == "set_bulk_amounts" and has_permission(user_id, "manage_config"):
             keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
-            await context.send_message(chat_id, "Enter amounts as 'user_id:amount' pairs (e.g., '123:500 456:1000'):", reply_markup)
+            await context.send_message(chat_id, "Upload a .csv or .xlsx file with 'user_id,amount' rows, captioned 'allocations'.", reply_markup)
 
         elif data == "set_config" and is_admin(user_id):
             context.user_data['awaiting_config'] = True
             keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
-            await context.send_message(chat_id, "Enter config key and value (e.g., total_supply 2000000):", reply_markup)
+            await context.send_message(chat_id, f"Enter config key and value (e.g., total_supply 2000000). Keys: {', '.join(CONFIG_SCHEMA)}", reply_markup)
 
         elif data == "approve_referrals" and is_admin(user_id):
             cursor.execute("SELECT referrer_id, referee_id, timestamp FROM referrals WHERE status = 'pending'")
@@ -720,7 +3888,7 @@ class AirdropBot:
         elif data == "approve_all_referrals" and is_admin(user_id):
             cursor.execute("SELECT referrer_id, referee_id FROM referrals WHERE status = 'pending'")
             referrals = cursor.fetchall()
-            bonus = float(cursor.execute("SELECT value FROM config WHERE key = 'referral_bonus'").fetchone()[0])
+            bonus = runtime_config["referral_bonus"]
             for referrer_id, referee_id in referrals:
                 cursor.execute("UPDATE referrals SET status = 'approved' WHERE referee_id = ?", (referee_id,))
                 update_user_balance(referrer_id, bonus)
@@ -729,6 +3897,7 @@ class AirdropBot:
                 context.user_data["format_args"] = {"bonus": bonus, "referee": referee_name}
                 await context.send_message(referrer_id, LANGUAGES[lang]["referral_bonus"])
             conn.commit()
+            referral_graph.approved([referee_id for _, referee_id in referrals])
             keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await context.send_message(chat_id, "All referrals approved!", reply_markup)
@@ -887,6 +4056,179 @@ class AirdropBot:
         if context.platform == "telegram":
             await update.callback_query.answer()
 
+    async def enqueue_job(self, kind: str, params: dict, user_id: str, chat_id: str, context: BotContext, lang: str):
+        job_id = self.jobs.enqueue(kind, params, chat_id, lang, user_id, context)
+        keyboard = [[InlineKeyboardButton("Jobs", callback_data="jobs")],
+                    [InlineKeyboardButton("Back to Menu", callback_data="start")]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        await context.send_message(chat_id, f"Started job #{job_id} ({kind}). Open Jobs to watch or cancel it.", reply_markup)
+
+    async def distribution_job(self, job: Job) -> str:
+        params = job.params
+        # Resumed runs and re-sends ("drain") only send what is already planned
+        if params["mode"] != "drain":
+            if SYBIL_SWEEP_BEFORE_DISTRIBUTION:
+                job.progress(0, 0, "Sybil sweep", force=True)
+                await job.context.send_message(job.chat_id, format_sybil_report(await sybil_sweep()))
+                job.checkpoint()
+            if SNAPSHOT_TIERS and latest_snapshot(1) is None:
+                job.progress(0, 0, "Balance snapshot", force=True)
+                await job.context.send_message(job.chat_id, format_snapshot_report(await take_balance_snapshot(1, "distribution", job)))
+                job.checkpoint()
+            job.progress(0, 0, "Planning", force=True)
+            if params["mode"] == "tier":
+                planned = await self.calculate_airdrop_by_tier(1, params["token_id"], params["tier"])
+            elif params["mode"] == "all":
+                planned = await self.calculate_airdrop_all(1, params["token_id"])
+            else:
+                planned = await self.calculate_airdrop(1, params["token_id"], params.get("policy", ALLOCATION_POLICY))
+            job.progress(0, 0, f"Planned {planned} allocations", force=True)
+            job.checkpoint()
+        if params["mode"] == "claim":
+            return await self.publish_claims(params["token_id"], job)
+        status = await self.distribute_tokens(job.chat_id, job.context, params["token_id"], job.lang, run_id=params.get("run_id"), job=job)
+        return f"Distribution run {status}."
+
+    async def publish_claims(self, token_id, job: Job) -> str:
+        # One tree per EVM chain with a distributor, then one root transaction each; roots an
+        # interrupted job left built, signed or broadcast are finished here as well
+        lines = []
+        for chain, distributor in MERKLE_DISTRIBUTORS.items():
+            if not distributor:
+                continue
+            tree = await build_claim_tree(chain, token_id, job)
+            if tree:
+                lines.append(f"{chain}: {tree['new']} new of {tree['leaves']} claims, depth {tree['depth']}, root {tree['root']} ({tree['seconds']}s)")
+            job.checkpoint()
+        for root_id, chain in cursor.execute("SELECT id, chain FROM merkle_roots WHERE status IN ('built', 'signed', 'broadcast') ORDER BY id").fetchall():
+            job.progress(0, 0, f"Publishing {chain} root #{root_id}", force=True)
+            lines.append(f"{chain} root #{root_id}: {await self.publish_merkle_root(root_id, job)}")
+        left = cursor.execute("SELECT COUNT(*) FROM distributions WHERE status = 'pending'").fetchone()[0]
+        if left:
+            lines.append(f"{left} allocations are left planned, for push distribution or for the next claim run where a root was still being published.")
+        return "\n".join(lines) or "Nothing to publish."
+
+    async def publish_merkle_root(self, root_id: int, job: Optional[Job] = None) -> str:
+        chain, distributor, root, status, signed_tx, tx_hash, base_root_id = cursor.execute(
+            "SELECT chain, distributor, root, status, signed_tx, tx_hash, base_root_id FROM merkle_roots WHERE id = ?", (root_id,)).fetchone()
+        if status == "built" and confirmed_merkle_root(distributor) != base_root_id:
+            # Publishing would drop the leaves of a root confirmed after this tree was built
+            release_merkle_root(root_id)
+            return "the distributor has a newer confirmed root; its allocations are planned again for the next claim run"
+        if status == "built":
+            # Signed and stored before it is sent, like distribution rows, so a restart rebroadcasts the same bytes
+            data = "0x" + (SET_MERKLE_ROOT_SELECTOR + bytes.fromhex(root[2:])).hex()
+            web3_client = evm_client(chain)
+            # Roots always come from the first sender, which should be the distributor's owner
+            owner = sender_lanes(chain)[0]
+            gas = int(await evm_call(chain, "eth_estimateGas", [{"from": owner.address, "to": distributor, "data": data}]), 16)
+            nonce = await self.next_evm_nonce(chain, owner.address)
+            signed = web3_client.eth.account.sign_transaction({
+                'chainId': await evm_chain_id(chain),
+                'from': owner.address,
+                'to': Web3.to_checksum_address(distributor),
+                'data': data,
+                'value': 0,
+                'nonce': nonce,
+                'gas': int(gas * 1.25),
+                **(await fee_engine(chain).fee_fields())
+            }, private_key=owner.key)
+            tx_hash, signed_tx = web3_client.to_hex(signed.hash), web3_client.to_hex(signed.rawTransaction)
+            cursor.execute("UPDATE merkle_roots SET status = 'signed', tx_hash = ?, signed_tx = ?, nonce = ?, updated_at = ? WHERE id = ?",
+                           (tx_hash, signed_tx, nonce, datetime.utcnow().isoformat(), root_id))
+            conn.commit()
+            status = "signed"
+        if status == "signed":
+            if await self.broadcast_transfer(chain, signed_tx, tx_hash) == DIST_PENDING:
+                cursor.execute("UPDATE merkle_roots SET status = 'built', tx_hash = NULL, signed_tx = NULL, nonce = NULL, updated_at = ? WHERE id = ?",
+                               (datetime.utcnow().isoformat(), root_id))
+                conn.commit()
+                return "its nonce was taken by another transaction; it is signed again on the next claim run"
+            cursor.execute("UPDATE merkle_roots SET status = 'broadcast', updated_at = ? WHERE id = ?", (datetime.utcnow().isoformat(), root_id))
+            conn.commit()
+        deadline = time.monotonic() + MERKLE_CONFIRM_TIMEOUT
+        while time.monotonic() < deadline:
+            receipt = (await rpc_batch(chain, "eth_getTransactionReceipt", [("eth_getTransactionReceipt", [tx_hash])], hedge=True))[0].get("result")
+            if receipt:
+                if int(receipt.get("status", "0x1"), 16) != 1:
+                    release_merkle_root(root_id)
+                    return f"setMerkleRoot reverted in {tx_hash}; its allocations are planned for push distribution again"
+                cursor.execute("UPDATE merkle_roots SET status = 'confirmed', updated_at = ? WHERE id = ?", (datetime.utcnow().isoformat(), root_id))
+                conn.commit()
+                return f"published in {tx_hash}; users can claim now"
+            if job:
+                job.checkpoint()
+            await asyncio.sleep(EVM_BLOCK_INTERVAL[chain])
+        return f"broadcast as {tx_hash} but not confirmed after {MERKLE_CONFIRM_TIMEOUT}s; the next claim run keeps watching it"
+
+    async def export_job(self, job: Job) -> str:
+        rows = cursor.execute("SELECT user_id, wallet, chain, amount, status, tx_hash FROM distributions").fetchall()
+        job.progress(0, len(rows), "Building workbook", force=True)
+        path = f"airdrop_log_{job.id}.xlsx"
+        await asyncio.to_thread(write_distribution_workbook, rows, path)
+        try:
+            with open(path, "rb") as document:
+                await job.context.send_document(job.chat_id, document)
+        finally:
+            os.remove(path)
+        job.progress(len(rows), len(rows), force=True)
+        return f"Exported {len(rows)} distributions."
+
+    async def snapshot_job(self, job: Job) -> str:
+        return format_snapshot_report(await take_balance_snapshot(job.params["campaign_id"], job.params.get("trigger", "manual"), job))
+
+    async def sybil_job(self, job: Job) -> str:
+        report = await sybil_sweep()
+        await job.context.send_document(job.chat_id, sybil_clusters_csv())
+        return format_sybil_report(report)
+
+    async def read_upload(self, document, platform: str) -> bytes:
+        if platform == "telegram":
+            return bytes(await (await document.get_file()).download_as_bytearray())
+        return await document.read()
+
+    @instrument_handler("document")
+    async def handle_document(self, update: Union[Update, discord.Message], context: BotContext):
+        # Uploads are routed by their caption, so they need no pending conversation state
+        if context.platform == "telegram":
+            user_id = str(update.message.from_user.id)
+            chat_id = str(update.message.chat_id)
+            caption = (update.message.caption or "").strip().lower()
+            document = update.message.document
+            file_name = document.file_name or ""
+        else:
+            user_id = str(update.author.id)
+            chat_id = str(update.channel.id)
+            caption = update.content.strip().lower()
+            document = update.attachments[0]
+            file_name = document.filename or ""
+        keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+
+        if caption in ("blacklist", "whitelist") and has_permission(user_id, "manage_blacklist"):
+            if not file_name.lower().endswith((".csv", ".txt")):
+                await context.send_message(chat_id, "Please upload a .csv or .txt file.", reply_markup)
+                return
+            data = await self.read_upload(document, context.platform)
+            wallet_list = blacklist if caption == "blacklist" else whitelist
+            counts = wallet_list.add_many(iter_uploaded_wallets(data))
+            await context.send_message(chat_id, f"Imported {counts['added']} wallets into the {caption} "
+                                                f"({counts['duplicates']} already listed, {counts['invalid']} invalid lines skipped).", reply_markup)
+            return
+        if caption == "allocations" and has_permission(user_id, "manage_config"):
+            if not file_name.lower().endswith((".csv", ".txt", ".xlsx")):
+                await context.send_message(chat_id, "Please upload a .csv or .xlsx file.", reply_markup)
+                return
+            data = await self.read_upload(document, context.platform)
+            report = apply_allocation_upload(iter_allocation_rows(data, file_name))
+            summary, report_file = format_allocation_report(report)
+            await context.send_message(chat_id, summary, reply_markup)
+            if report_file:
+                await context.send_document(chat_id, report_file)
+            return
+        await context.send_message(chat_id, "Unrecognized upload. Caption the file with 'blacklist', 'whitelist' or 'allocations'.", reply_markup)
+
+    @instrument_handler("message")
     async def handle_message(self, update: Union[Update, discord.Message], context: BotContext):
         user_id = str(update.message.from_user.id if context.platform == "telegram" else update.author.id)
         lang = get_user_language(user_id)
@@ -928,6 +4270,7 @@ class AirdropBot:
                     reply_markup = InlineKeyboardMarkup(keyboard)
                     await context.send_message(chat_id, LANGUAGES[lang]["invalid_address"].format(chain=chain), reply_markup)
                     return
+                wallet = normalize_address(wallet, chain)
                 submission_time = datetime.utcnow().isoformat()
                 cursor.execute("UPDATE users SET kyc_telegram_link = ?, kyc_x_link = ?, kyc_wallet = ?, kyc_chain = ?, kyc_status = 'submitted', kyc_submission_time = ? WHERE user_id = ?",
                                (context.user_data['kyc_telegram_link'], context.user_data['kyc_x_link'], wallet, chain, submission_time, user_id))
@@ -959,8 +4302,8 @@ class AirdropBot:
                 await context.send_message(chat_id, LANGUAGES[lang]["invalid_address"].format(chain=chain), reply_markup)
                 context.user_data['awaiting_wallet'] = False
                 return
-            cursor.execute("SELECT wallet FROM blacklist WHERE wallet = ?", (wallet,))
-            if cursor.fetchone():
+            wallet = normalize_address(wallet, chain)
+            if wallet in blacklist:
                 keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
                 reply_markup = InlineKeyboardMarkup(keyboard)
                 await context.send_message(chat_id, LANGUAGES[lang]["blacklisted"], reply_markup)
@@ -1004,22 +4347,24 @@ class AirdropBot:
             context.user_data['awaiting_captcha'] = False
 
         elif context.user_data.get('awaiting_blacklist'):
-            wallet = text
-            cursor.execute("INSERT OR IGNORE INTO blacklist (wallet) VALUES (?)", (wallet,))
-            conn.commit()
+            counts = blacklist.add_many([text])
             context.user_data['awaiting_blacklist'] = False
             keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
-            await context.send_message(chat_id, f"{wallet} blacklisted.", reply_markup)
+            if counts["invalid"]:
+                await context.send_message(chat_id, "Invalid wallet address.", reply_markup)
+            else:
+                await context.send_message(chat_id, f"{normalize_any_address(text)} blacklisted.", reply_markup)
 
         elif context.user_data.get('awaiting_whitelist'):
-            wallet = text
-            cursor.execute("INSERT OR IGNORE INTO whitelist (wallet) VALUES (?)", (wallet,))
-            conn.commit()
+            counts = whitelist.add_many([text])
             context.user_data['awaiting_whitelist'] = False
             keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
-            await context.send_message(chat_id, f"{wallet} whitelisted.", reply_markup)
+            if counts["invalid"]:
+                await context.send_message(chat_id, "Invalid wallet address.", reply_markup)
+            else:
+                await context.send_message(chat_id, f"{normalize_any_address(text)} whitelisted.", reply_markup)
 
         elif context.user_data.get('awaiting_amount'):
             try:
@@ -1029,8 +4374,7 @@ class AirdropBot:
                 result = cursor.fetchone()
                 if result:
                     wallet, chain = result
-                    cursor.execute("REPLACE INTO distributions (user_id, wallet, chain, amount, status) VALUES (?, ?, ?, ?, ?)",
-                                   (user_id_to_set, wallet, chain, amount, "pending"))
+                    plan_distribution(user_id_to_set, wallet, chain, amount)
                     conn.commit()
                     keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
                     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -1043,39 +4387,19 @@ class AirdropBot:
                 await context.send_message(chat_id, "Format: user_id amount", reply_markup)
             context.user_data['awaiting_amount'] = False
 
-        elif context.user_data.get('awaiting_bulk_amounts'):
-            try:
-                pairs = text.split()
-                for pair in pairs:
-                    user_id_to_set, amount = pair.split(":")
-                    amount = float(amount)
-                    cursor.execute("SELECT wallet, chain FROM submissions WHERE user_id = ?", (user_id_to_set,))
-                    result = cursor.fetchone()
-                    if result:
-                        wallet, chain = result
-                        cursor.execute("REPLACE INTO distributions (user_id, wallet, chain, amount, status) VALUES (?, ?, ?, ?, ?)",
-                                       (user_id_to_set, wallet, chain, amount, "pending"))
-                conn.commit()
-                keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                await context.send_message(chat_id, "Bulk amounts set!", reply_markup)
-            except ValueError:
-                await context.send_message(chat_id, "Format: user_id:amount user_id:amount", reply_markup)
-            context.user_data['awaiting_bulk_amounts'] = False
-
         elif context.user_data.get('awaiting_config'):
-            try:
-                key, value = text.split()
-                cursor.execute("REPLACE INTO config (key, value) VALUES (?, ?)", (key, value))
-                conn.commit()
-                context.user_data['awaiting_config'] = False
-                keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                await context.send_message(chat_id, f"Set {key} = {value}", reply_markup)
-            except ValueError:
-                keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
+            parts = text.split()
+            keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            if len(parts) != 2:
                 await context.send_message(chat_id, "Format: key value", reply_markup)
+            else:
+                try:
+                    value = runtime_config.set(parts[0], parts[1])
+                    context.user_data['awaiting_config'] = False
+                    await context.send_message(chat_id, f"Set {parts[0]} = {value:g}", reply_markup)
+                except ValueError as e:
+                    await context.send_message(chat_id, str(e), reply_markup)
 
         elif context.user_data.get('awaiting_task_add'):
             try:
@@ -1136,6 +4460,22 @@ class AirdropBot:
                 await context.send_message(chat_id, "Format: name start_date end_date total_tokens", reply_markup)
             context.user_data['awaiting_campaign'] = False
 
+        elif context.user_data.get('awaiting_snapshot_block'):
+            parts = text.split()
+            keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            if len(parts) == 2 and parts[0].isdigit() and parts[1].lower() == "end":
+                cursor.execute("UPDATE campaigns SET snapshot_chain = NULL, snapshot_block = NULL WHERE id = ?", (int(parts[0]),))
+                conn.commit()
+                await context.send_message(chat_id, f"Campaign {parts[0]} snapshots at its end date.", reply_markup)
+            elif len(parts) == 3 and parts[0].isdigit() and parts[1].upper() in ("ETH", "BSC", "XRP") and parts[2].isdigit():
+                cursor.execute("UPDATE campaigns SET snapshot_chain = ?, snapshot_block = ? WHERE id = ?", (parts[1].upper(), int(parts[2]), int(parts[0])))
+                conn.commit()
+                await context.send_message(chat_id, f"Campaign {parts[0]} snapshots at {parts[1].upper()} block {parts[2]}.", reply_markup)
+            else:
+                await context.send_message(chat_id, "Format: campaign_id CHAIN block_height (ETH, BSC or XRP), or campaign_id end", reply_markup)
+            context.user_data['awaiting_snapshot_block'] = False
+
         elif context.user_data.get('awaiting_user_reset'):
             try:
                 reset_user_id = text
@@ -1146,6 +4486,7 @@ class AirdropBot:
                 cursor.execute("DELETE FROM referrals WHERE referrer_id = ? OR referee_id = ?", (reset_user_id, reset_user_id))
                 cursor.execute("DELETE FROM task_completions WHERE user_id = ?", (reset_user_id,))
                 conn.commit()
+                referral_graph.removed(reset_user_id)
                 keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
                 reply_markup = InlineKeyboardMarkup(keyboard)
                 await context.send_message(chat_id, f"User {reset_user_id} reset!", reply_markup)
@@ -1292,6 +4633,17 @@ class AirdropBot:
             return
         
         wallet, chain = result
+        if SNAPSHOT_TIERS:
+            # No RPC here: the campaign-end snapshot assigns the tier
+            dropped = sybil_dropped(user_id)
+            cursor.execute("REPLACE INTO eligible (user_id, wallet, chain, tier, verified, token_balance, social_tasks_completed, sybil_hold) VALUES (?, ?, ?, 0, ?, 0, ?, ?)",
+                           (user_id, wallet, chain, 0 if dropped else 1, 1 if check_mandatory_tasks(user_id) else 0, int(dropped)))
+            conn.commit()
+            keyboard = [[InlineKeyboardButton("Back to Menu", callback_data="start")]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            await context.send_message(chat_id, LANGUAGES[lang]["wallet_registered"], reply_markup)
+            return
+
         tier, token_balance = await check_eligibility(wallet, chain)
         
         if tier == 0:
@@ -1300,8 +4652,10 @@ class AirdropBot:
             await context.send_message(chat_id, LANGUAGES[lang]["no_assets"], reply_markup)
             return
         
-        cursor.execute("REPLACE INTO eligible (user_id, wallet, chain, tier, verified, token_balance, social_tasks_completed) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                       (user_id, wallet, chain, tier, 1, token_balance, 1 if check_mandatory_tasks(user_id) else 0))
+        # Members a sybil sweep dropped stay unverified until the next sweep clears them
+        dropped = sybil_dropped(user_id)
+        cursor.execute("REPLACE INTO eligible (user_id, wallet, chain, tier, verified, token_balance, social_tasks_completed, sybil_hold) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                       (user_id, wallet, chain, tier, 0 if dropped else 1, token_balance, 1 if check_mandatory_tasks(user_id) else 0, int(dropped)))
         conn.commit()
         
         context.user_data["format_args"] = {"tier": tier}
@@ -1309,183 +4663,383 @@ class AirdropBot:
         reply_markup = InlineKeyboardMarkup(keyboard)
         await context.send_message(chat_id, LANGUAGES[lang]["verified"], reply_markup)
 
-    async def calculate_airdrop(self, campaign_id: int, token_id: int):
+    async def calculate_airdrop(self, campaign_id: int, token_id: int, policy: str = ALLOCATION_POLICY) -> int:
+        # Tiers with a token_distributions amount get that amount; the rest of the budget is split by policy
+        fixed = dict(cursor.execute("SELECT tier, amount FROM token_distributions WHERE token_id = ? AND amount IS NOT NULL", (token_id,)).fetchall())
+        return await self.plan_allocation(campaign_id, token_id, policy, fixed)
+
+    async def calculate_airdrop_by_tier(self, campaign_id: int, token_id: int, tier: int) -> int:
+        cursor.execute("SELECT amount FROM token_distributions WHERE token_id = ? AND tier = ? AND amount IS NOT NULL", (token_id, tier))
+        token_data = cursor.fetchone()
+        return await self.plan_allocation(campaign_id, token_id, "equal", {tier: token_data[0]} if token_data else {}, tier=tier)
+
+    async def calculate_airdrop_all(self, campaign_id: int, token_id: str) -> int:
+        return await self.plan_allocation(campaign_id, token_id, "equal", {})
+
+    async def plan_allocation(self, campaign_id: int, token_id, policy: str, fixed: dict, tier: Optional[int] = None) -> int:
         cursor.execute("SELECT total_tokens FROM campaigns WHERE id = ? AND active = 1", (campaign_id,))
         campaign = cursor.fetchone()
         if not campaign:
-            return
-        
-        total_tokens = campaign[0]
-        cursor.execute("SELECT user_id, tier FROM eligible WHERE verified = 1 AND social_tasks_completed = 1")
-        eligible_users = cursor.fetchall()
-        
-        if not eligible_users:
-            return
-        
-        total_weight = sum([user[1] for user in eligible_users])
-        if total_weight == 0:
-            return
-        
-        per_weight = total_tokens / total_weight
-        
-        for user_id, tier in eligible_users:
-            cursor.execute("SELECT wallet, chain FROM submissions WHERE user_id = ?", (user_id,))
-            result = cursor.fetchone()
-            if result:
-                wallet, chain = result
-                cursor.execute("SELECT amount, contract_address FROM token_distributions WHERE token_id = ? AND tier = ?", (token_id, tier))
-                token_data = cursor.fetchone()
-                amount = token_data[0] if token_data else per_weight * tier
-                cursor.execute("REPLACE INTO distributions (user_id, wallet, chain, amount, status) VALUES (?, ?, ?, ?, ?)",
-                               (user_id, wallet, chain, amount, "pending"))
+            return 0
+        holders = eligible_holders(campaign_id)
+        if tier is not None:
+            holders = [holder for holder in holders if holder[3] == tier]
+        if not holders:
+            return 0
+        started = time.perf_counter()
+        plan = await asyncio.to_thread(build_allocation, holders, campaign[0], policy, fixed, token_decimals(token_id))
+        plan_distributions(plan)
         conn.commit()
+        logger.info(f"Planned {len(plan[0])} allocations for campaign {campaign_id} ({policy}) in {time.perf_counter() - started:.2f}s")
+        return len(plan[0])
 
-    async def calculate_airdrop_by_tier(self, campaign_id: int, token_id: int, tier: int):
-        cursor.execute("SELECT total_tokens FROM campaigns WHERE id = ? AND active = 1", (campaign_id,))
-        campaign = cursor.fetchone()
-        if not campaign:
-            return
-        
-        total_tokens = campaign[0]
-        cursor.execute("SELECT user_id FROM eligible WHERE verified = 1 AND social_tasks_completed = 1 AND tier = ?", (tier,))
-        eligible_users = [row[0] for row in cursor.fetchall()]
-        
-        if not eligible_users:
-            return
-        
-        cursor.execute("SELECT amount, contract_address FROM token_distributions WHERE token_id = ? AND tier = ?", (token_id, tier))
-        token_data = cursor.fetchone()
-        amount_per_user = token_data[0] if token_data else total_tokens / len(eligible_users)
-        
-        for user_id in eligible_users:
-            cursor.execute("SELECT wallet, chain FROM submissions WHERE user_id = ?", (user_id,))
-            result = cursor.fetchone()
-            if result:
-                wallet, chain = result
-                cursor.execute("REPLACE INTO distributions (user_id, wallet, chain, amount, status) VALUES (?, ?, ?, ?, ?)",
-                               (user_id, wallet, chain, amount_per_user, "pending"))
+    async def distribute_tokens(self, chat_id: str, context: BotContext, token_id: int, lang: str, run_id: Optional[int] = None, job: Optional[Job] = None) -> str:
+        if run_id is None:
+            try:
+                now = datetime.utcnow().isoformat()
+                cursor.execute("INSERT INTO distribution_runs (token_id, chat_id, lang, status, started_at, updated_at) VALUES (?, ?, ?, 'running', ?, ?)",
+                               (str(token_id), chat_id, lang, now, now))
+                conn.commit()
+                run_id = cursor.lastrowid
+            except sqlite3.IntegrityError:
+                await context.send_message(chat_id, "A distribution is already running or paused. Resume or wait for it to finish.")
+                return "not started (another run is active)"
+        if job:
+            job.params["run_id"] = run_id
+        lease = RunLease(run_id)
+        if not await lease.acquire():
+            return "already running elsewhere"
+        try:
+            if SENDER_PREFLIGHT:
+                if job:
+                    job.progress(0, 0, "Checking sender balances", force=True)
+                shortfalls = await sender_shortfalls(token_id)
+                if shortfalls:
+                    set_distribution_run_status(run_id, "paused")
+                    await context.send_message(chat_id, "Distribution paused: these senders cannot cover their share.\n" + "\n".join(shortfalls)
+                                               + "\nFund them and resume the distribution.")
+                    return "paused (senders underfunded)"
+            return await self._drain_distributions(run_id, chat_id, context, token_id, lang, lease, job)
+        finally:
+            lease.release()
+
+    async def _drain_distributions(self, run_id: int, chat_id: str, context: BotContext, token_id: int, lang: str, lease: RunLease, job: Optional[Job] = None) -> str:
+        nonces = {}
+        broadcaster = None
+        last_rowid = 0
+        processed_in_pass = 0
+        processed = 0
+        total = cursor.execute("SELECT COUNT(*) FROM distributions WHERE status IN ('pending', 'signed') AND attempts < ?",
+                               (DIST_MAX_ATTEMPTS,)).fetchone()[0] if job else 0
+        if job:
+            job.progress(0, total, f"Run {run_id}", force=True)
+        while True:
+            if job and job.cancelled:
+                set_distribution_run_status(run_id, "cancelled")
+            cursor.execute("SELECT status FROM distribution_runs WHERE id = ?", (run_id,))
+            status = cursor.fetchone()[0]
+            if lease.lost:
+                if broadcaster:
+                    await broadcaster
+                return "stopped (lease lost)"
+            if status != "running":
+                if broadcaster:
+                    await broadcaster
+                await context.send_message(chat_id, "Distribution paused." if status == "paused" else f"Distribution {status}.")
+                return status
+            cursor.execute("""SELECT rowid, user_id, wallet, chain, amount, status, signed_tx, tx_hash, amount_base,
+                                     (SELECT tier FROM eligible e WHERE e.user_id = distributions.user_id), sender FROM distributions
+                              WHERE status IN ('pending', 'signed') AND attempts < ? AND rowid > ? ORDER BY rowid LIMIT ?""",
+                           (DIST_MAX_ATTEMPTS, last_rowid, DIST_BATCH_SIZE))
+            rows = cursor.fetchall()
+            if not rows and broadcaster:
+                # Rows still being sent may fail and need another pass
+                await broadcaster
+                broadcaster = None
+                continue
+            if not rows:
+                if processed_in_pass == 0:
+                    break
+                # Start another pass for rows that failed and still have attempts left
+                last_rowid = 0
+                processed_in_pass = 0
+                continue
+            last_rowid = rows[-1][0]
+            processed_in_pass += len(rows)
+            sol_rows = [row for row in rows if row[3] == "SOL"]
+            if sol_rows:
+                await self.process_sol_batch(sol_rows, token_id, context, lang)
+            xrp_rows = [row for row in rows if row[3] == "XRP"]
+            if xrp_rows:
+                await self.process_xrp_batch(xrp_rows, token_id, context, lang)
+            evm_rows = [row for row in rows if row[3] not in ("SOL", "XRP")]
+            if evm_rows:
+                ready = await self.process_evm_batch(evm_rows, token_id, nonces, context, lang)
+                if broadcaster:
+                    await broadcaster
+                broadcaster = asyncio.create_task(self.broadcast_evm_rows(ready, context, lang))
+            processed += len(rows)
+            if job:
+                job.progress(min(processed, total), max(total, processed), f"Run {run_id}")
+
+        set_distribution_run_status(run_id, "completed")
+        await context.send_message(chat_id, "Distribution process completed.")
+        return "completed"
+
+    async def process_evm_batch(self, rows: list, token_id, nonces: dict, context: BotContext, lang: str) -> dict:
+        # Encodes and signs the pending rows, journals them, and returns (chain, sender) -> rows to broadcast in nonce order
+        decimals = token_decimals(token_id)
+        contracts = dict(cursor.execute("SELECT tier, contract_address FROM token_distributions WHERE token_id = ?", (token_id,)).fetchall())
+        ready = {}
+        unsigned = []
+        fields = {}
+        for row in rows:
+            chain = row[3]
+            if row[5] == DIST_SIGNED:
+                lane = sender_lane(chain, row[10])
+                ready.setdefault((chain, lane.address if lane else row[10]), []).append(row)
+                continue
+            try:
+                if chain not in ("ETH", "BSC"):
+                    raise ValueError(f"Unsupported chain {chain}")
+                encoder = transfer_encoder(contracts.get(row[9] or 0) or TOKEN_CONTRACT_ADDRESS)
+                data = encoder.calldata(wallet_key(row[2]), base_amount(row[4], row[8], decimals))
+                lane = (chain, sender_for(chain, row[2]).address)
+                if chain not in fields:
+                    fields[chain] = {"chainId": await evm_chain_id(chain), **(await fee_engine(chain).fee_fields())}
+                if lane not in nonces:
+                    nonces[lane] = await self.next_evm_nonce(*lane)
+                gas = await fee_engine(chain).gas_limit(encoder.contract)
+            except Exception as e:
+                await self.mark_distribution_error(row, e, context, lang)
+                continue
+            unsigned.append((row, lane, {"to": encoder.contract, "data": data, "value": 0, "gas": gas, "nonce": nonces[lane], **fields[chain]}))
+            nonces[lane] += 1
+        if not unsigned:
+            return ready
+
+        try:
+            signed = await sign_evm_transactions([(lane[1], tx) for _, lane, tx in unsigned])
+        except Exception as e:
+            for row, lane, _ in unsigned:
+                nonces.pop(lane, None)
+                await self.mark_distribution_error(row, e, context, lang)
+            return ready
+        # A transaction that failed to sign leaves a nonce gap, so later nonces in that lane are dropped and reassigned
+        gaps = {}
+        journal = []
+        now = datetime.utcnow().isoformat()
+        for (row, lane, tx), (tx_hash, signed_tx, error) in zip(unsigned, signed):
+            if lane in gaps:
+                continue
+            if error:
+                gaps[lane] = tx["nonce"]
+                await self.mark_distribution_error(row, Exception(error), context, lang)
+                continue
+            journal.append((tx_hash, signed_tx, tx["nonce"], lane[1], now, row[0]))
+            ready.setdefault(lane, []).append(row[:5] + (DIST_SIGNED, signed_tx, tx_hash) + row[8:10] + (lane[1],))
+        nonces.update(gaps)
+        cursor.executemany("UPDATE distributions SET status = 'signed', tx_hash = ?, signed_tx = ?, nonce = ?, sender = ?, updated_at = ? WHERE rowid = ?", journal)
         conn.commit()
+        return ready
 
-    async def calculate_airdrop_all(self, campaign_id: int, token_id: str):
-        cursor.execute("SELECT total_tokens FROM campaigns WHERE id = ? AND active = 1", (campaign_id,))
-        campaign = cursor.fetchone()
-        if not campaign:
+    async def broadcast_evm_rows(self, ready: dict, context: BotContext, lang: str):
+        # Lanes are independent, so they are sent side by side; within a lane rows go out in nonce order
+        await asyncio.gather(*(self.broadcast_evm_lane(chain, rows, context, lang) for (chain, _), rows in ready.items()))
+
+    async def broadcast_evm_lane(self, chain: str, rows: list, context: BotContext, lang: str):
+        for start in range(0, len(rows), EVM_BROADCAST_BATCH):
+            chunk = rows[start:start + EVM_BROADCAST_BATCH]
+            try:
+                replies = await rpc_batch(chain, "eth_sendRawTransaction", [("eth_sendRawTransaction", [row[6]]) for row in chunk])
+            except Exception as e:
+                for row in chunk:
+                    await self.mark_distribution_error(row, e, context, lang)
+                continue
+            for row, reply in zip(chunk, replies):
+                try:
+                    outcome = await evm_send_outcome(chain, reply, row[7])
+                except Exception as e:
+                    await self.mark_distribution_error(row, e, context, lang)
+                    continue
+                if outcome == DIST_PENDING:
+                    # The signed transaction can never land (its nonce went to another transaction), so plan it again
+                    cursor.execute("UPDATE distributions SET status = 'pending', signed_tx = NULL, tx_hash = NULL, prior_hashes = NULL, nonce = NULL, updated_at = ? WHERE rowid = ?",
+                                   (datetime.utcnow().isoformat(), row[0]))
+                    conn.commit()
+                    continue
+                await self.mark_distribution_broadcast(row, row[7], context, lang)
+
+    async def mark_distribution_broadcast(self, row: tuple, tx_hash: str, context: BotContext, lang: str):
+        rowid, user_id, wallet, chain, amount = row[:5]
+        cursor.execute("UPDATE distributions SET status = 'broadcast', last_error = NULL, updated_at = ? WHERE rowid = ?",
+                       (datetime.utcnow().isoformat(), rowid))
+        conn.commit()
+        DISTRIBUTION_TRANSFERS.inc((("chain", chain), ("result", "sent")))
+        DISTRIBUTION_TOKENS.inc((("chain", chain),), amount)
+
+        context.user_data["format_args"] = {"amount": amount, "wallet": wallet, "tx_hash": tx_hash}
+        await context.send_message(user_id, LANGUAGES[lang]["sent_tokens"])
+        logger.info(f"Sent {amount} tokens to {wallet} on {chain}: {tx_hash}")
+
+    async def mark_distribution_error(self, row: tuple, error: Exception, context: BotContext, lang: str):
+        rowid, user_id, wallet, chain, amount = row[:5]
+        cursor.execute("UPDATE distributions SET attempts = attempts + 1, last_error = ?, updated_at = ? WHERE rowid = ?",
+                       (str(error), datetime.utcnow().isoformat(), rowid))
+        cursor.execute("UPDATE distributions SET status = 'failed' WHERE rowid = ? AND attempts >= ?", (rowid, DIST_MAX_ATTEMPTS))
+        exhausted = cursor.rowcount > 0
+        conn.commit()
+        logger.error(f"Failed to send {amount} to {wallet} on {chain}: {str(error)}")
+        if exhausted:
+            DISTRIBUTION_TRANSFERS.inc((("chain", chain), ("result", "failed")))
+            context.user_data["format_args"] = {"amount": amount, "wallet": wallet, "error": str(error)}
+            try:
+                await context.send_message(user_id, LANGUAGES[lang]["failed_tokens"])
+            except Exception:
+                pass
+
+    async def process_sol_batch(self, rows: list, token_id, context: BotContext, lang: str):
+        # Rows already signed share their stored transaction; pending rows are packed per sender, each lane on its own
+        groups = {}
+        lanes = {}
+        for row in rows:
+            if row[5] == DIST_SIGNED:
+                groups.setdefault(row[7], (row[6], []))[1].append(row)
+                continue
+            try:
+                lane = sender_for("SOL", row[2])
+            except Exception as e:
+                await self.mark_distribution_error(row, e, context, lang)
+                continue
+            lanes.setdefault(lane, []).append(row)
+        if groups:
+            # Submitting a signed transaction does not depend on which sender signed it
+            await self.broadcast_groups(groups, sender_lanes("SOL")[0].submit, SOL_SUBMIT_CONCURRENCY, context, lang)
+        await asyncio.gather(*(self.process_sol_lane(lane, lane_rows, context, lang) for lane, lane_rows in lanes.items()))
+
+    async def process_sol_lane(self, lane: SolanaSender, rows: list, context: BotContext, lang: str):
+        transfers = []
+        by_rowid = {row[0]: row for row in rows}
+        for row in rows:
+            try:
+                transfers.append((row[0], lane.instruction(row[2], base_amount(row[4], row[8], CHAIN_DECIMALS["SOL"]))))
+            except Exception as e:
+                await self.mark_distribution_error(row, e, context, lang)
+        if not transfers:
             return
-        
-        total_tokens = campaign[0]
-        cursor.execute("SELECT user_id FROM eligible WHERE verified = 1 AND social_tasks_completed = 1")
-        eligible_users = [row[0] for row in cursor.fetchall()]
-        
-        if not eligible_users:
+        try:
+            packed = await lane.pack(transfers)
+        except Exception as e:
+            for rowid, _ in transfers:
+                await self.mark_distribution_error(by_rowid[rowid], e, context, lang)
             return
-        
-        amount_per_user = total_tokens / len(eligible_users)
-        
-        for user_id in eligible_users:
-            cursor.execute("SELECT wallet, chain FROM submissions WHERE user_id = ?", (user_id,))
-            result = cursor.fetchone()
-            if result:
-                wallet, chain = result
-                cursor.execute("REPLACE INTO distributions (user_id, wallet, chain, amount, status) VALUES (?, ?, ?, ?, ?)",
-                               (user_id, wallet, chain, amount_per_user, "pending"))
+        now = datetime.utcnow().isoformat()
+        cursor.executemany("UPDATE distributions SET status = 'signed', tx_hash = ?, signed_tx = ?, nonce = ?, sender = ?, updated_at = ? WHERE rowid = ?",
+                           [(tx_hash, signed_tx, lane.last_valid_height, lane.address, now, rowid) for rowids, tx_hash, signed_tx in packed for rowid in rowids])
         conn.commit()
-
-    async def distribute_tokens(self, chat_id: str, context: BotContext, token_id: int, lang: str):
-        cursor.execute("SELECT user_id, wallet, chain, amount FROM distributions WHERE status = 'pending'")
-        distributions = cursor.fetchall()
-        
-        for user_id, wallet, chain, amount in distributions:
+        groups = {tx_hash: (signed_tx, [by_rowid[rowid] for rowid in rowids]) for rowids, tx_hash, signed_tx in packed}
+        await self.broadcast_groups(groups, lane.submit, SOL_SUBMIT_CONCURRENCY, context, lang)
+
+    async def process_xrp_batch(self, rows: list, token_id, context: BotContext, lang: str):
+        groups = {row[7]: (row[6], [row]) for row in rows if row[5] == DIST_SIGNED}
+        lanes = {}
+        for row in rows:
+            if row[5] != DIST_PENDING:
+                continue
             try:
-                cursor.execute("SELECT tier FROM eligible WHERE user_id = ?", (user_id,))
-                tier = cursor.fetchone()[0]
-                cursor.execute("SELECT contract_address FROM token_distributions WHERE token_id = ? AND tier = ?", (token_id, tier))
-                contract_address_result = cursor.fetchone()
-                contract_address = contract_address_result[0] if contract_address_result else TOKEN_CONTRACT_ADDRESS
-                
-                if chain == "ETH":
-                    tx_hash = await self.send_eth_tokens(wallet, amount, contract_address)
-                elif chain == "BSC":
-                    tx_hash = await self.send_bsc_tokens(wallet, amount, contract_address)
-                elif chain == "SOL":
-                    tx_hash = await self.send_sol_tokens(wallet, amount)
-                elif chain == "XRP":
-                    tx_hash = await self.send_xrp_tokens(wallet, amount)
-                else:
-                    continue
-                
-                cursor.execute("UPDATE distributions SET status = 'completed', tx_hash = ? WHERE user_id = ?", (tx_hash, user_id))
-                conn.commit()
-                
-                context.user_data["format_args"] = {"amount": amount, "wallet": wallet, "tx_hash": tx_hash}
-                await context.send_message(user_id, LANGUAGES[lang]["sent_tokens"])
-                logger.info(f"Sent {amount} tokens to {wallet} on {chain}: {tx_hash}")
-                
+                lane = sender_for("XRP", row[2])
+            except Exception as e:
+                await self.mark_distribution_error(row, e, context, lang)
+                continue
+            lanes.setdefault(lane, []).append(row)
+        if groups:
+            await self.broadcast_groups(groups, sender_lanes("XRP")[0].submit, XRP_SUBMIT_CONCURRENCY, context, lang)
+        await asyncio.gather(*(self.process_xrp_lane(lane, lane_rows, context, lang) for lane, lane_rows in lanes.items()))
+
+    async def process_xrp_lane(self, lane: XrpSender, rows: list, context: BotContext, lang: str):
+        # Tickets and Sequences belong to the sending account, so in-flight slots are looked up per sender
+        primary = sender_lanes("XRP")[0].address
+        cursor.execute("SELECT nonce FROM distributions WHERE chain = 'XRP' AND COALESCE(sender, ?) = ? AND status IN ('signed', 'broadcast') AND nonce IS NOT NULL",
+                       (primary, lane.address))
+        in_flight = {row[0] for row in cursor.fetchall()}
+        try:
+            slots, last_ledger, fee = await lane.reserve(len(rows), in_flight)
+        except Exception as e:
+            for row in rows:
+                await self.mark_distribution_error(row, e, context, lang)
+            return
+        groups = {}
+        signed = []
+        for row, slot in zip(rows, slots):
+            try:
+                tx_hash, signed_tx = lane.sign_payment(row[2], base_amount(row[4], row[8], CHAIN_DECIMALS["XRP"]), slot, last_ledger, fee)
             except Exception as e:
-                cursor.execute("UPDATE distributions SET status = 'failed' WHERE user_id = ?", (user_id,))
+                await self.mark_distribution_error(row, e, context, lang)
+                continue
+            signed.append((tx_hash, signed_tx, slot[1], lane.address, datetime.utcnow().isoformat(), row[0]))
+            groups[tx_hash] = (signed_tx, [row])
+        cursor.executemany("UPDATE distributions SET status = 'signed', tx_hash = ?, signed_tx = ?, nonce = ?, sender = ?, updated_at = ? WHERE rowid = ?", signed)
+        conn.commit()
+        await self.broadcast_groups(groups, lane.submit, XRP_SUBMIT_CONCURRENCY, context, lang)
+
+    async def broadcast_groups(self, groups: dict, submit, concurrency: int, context: BotContext, lang: str):
+        # groups maps tx_hash -> (signed_tx, rows paid by that transaction)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded_submit(signed_tx: str):
+            async with semaphore:
+                await submit(signed_tx)
+
+        outcomes = await asyncio.gather(*(bounded_submit(signed_tx) for signed_tx, _ in groups.values()), return_exceptions=True)
+        for (tx_hash, (_, group_rows)), outcome in zip(groups.items(), outcomes):
+            if isinstance(outcome, TransferExpired):
+                cursor.executemany("UPDATE distributions SET status = 'pending', signed_tx = NULL, tx_hash = NULL, nonce = NULL, attempts = attempts + 1, last_error = ?, updated_at = ? WHERE rowid = ?",
+                                   [(str(outcome), datetime.utcnow().isoformat(), row[0]) for row in group_rows])
                 conn.commit()
-                context.user_data["format_args"] = {"amount": amount, "wallet": wallet, "error": str(e)}
-                await context.send_message(user_id, LANGUAGES[lang]["failed_tokens"])
-                logger.error(f"Failed to send {amount} to {wallet} on {chain}: {str(e)}")
-                
-        await context.send_message(chat_id, "Distribution process completed.")
+                continue
+            for row in group_rows:
+                if isinstance(outcome, Exception):
+                    await self.mark_distribution_error(row, outcome, context, lang)
+                else:
+                    await self.mark_distribution_broadcast(row, tx_hash, context, lang)
+
+    async def next_evm_nonce(self, chain: str, sender: str) -> int:
+        pending_count = int(await evm_call(chain, "eth_getTransactionCount", [sender, "pending"]), 16)
+        # Broadcast transfers a node has not seen yet (or dropped from its pool) still own their nonces
+        cursor.execute("SELECT MAX(nonce) FROM distributions WHERE chain = ? AND COALESCE(sender, ?) = ? AND status IN ('signed', 'broadcast')",
+                       (chain, sender_lanes(chain)[0].address, sender))
+        highest_signed = cursor.fetchone()[0]
+        return max(pending_count, highest_signed + 1 if highest_signed is not None else 0)
+
+    async def bump_evm_transfer(self, chain: str, rowid: int, signed_tx: str, tx_hash: str, prior_hashes: Optional[str], sender: Optional[str] = None):
+        lane = sender_lane(chain, sender)
+        if lane is None:
+            raise Exception(f"Sender {sender} is no longer configured")
+        previous = decode_evm_transaction(signed_tx)
+        fields = await fee_engine(chain).bumped_fields(previous)
+        if fields is None:
+            logger.info(f"Stuck {chain} transfer {tx_hash} (nonce {previous['nonce']}) is already at the fee cap; waiting for it to be mined")
+            return
+        tx = {key: value for key, value in previous.items() if key not in ("gasPrice", "maxFeePerGas", "maxPriorityFeePerGas", "chainId")}
+        tx.update(fields)
+        tx["chainId"] = previous.get("chainId") or await evm_chain_id(chain)
+        if "gasPrice" in tx:
+            tx.pop("type", None)
+        replacement = evm_client(chain).eth.account.sign_transaction(tx, private_key=lane.key)
+        new_hash, new_raw = Web3.to_hex(replacement.hash), Web3.to_hex(replacement.rawTransaction)
+        # Persist the replacement first; every earlier hash stays tracked since any of them may still be mined
+        cursor.execute("UPDATE distributions SET tx_hash = ?, signed_tx = ?, prior_hashes = ?, updated_at = ? WHERE rowid = ?",
+                       (new_hash, new_raw, ",".join(filter(None, [prior_hashes, tx_hash])), datetime.utcnow().isoformat(), rowid))
+        conn.commit()
+        await self.broadcast_transfer(chain, new_raw, new_hash)
+        logger.info(f"Bumped stuck {chain} transfer {tx_hash} (nonce {previous['nonce']}) to {new_hash}")
 
-    async def send_eth_tokens(self, to_address: str, amount: float, contract_address: str) -> str:
-        token_contract = web3_eth.eth.contract(address=Web3.to_checksum_address(contract_address), abi=TOKEN_ABI)
-        amount_wei = int(amount * 10**18)
-        nonce = web3_eth.eth.get_transaction_count(ETH_SENDER_ADDRESS)
-        tx = token_contract.functions.transfer(to_address, amount_wei).build_transaction({
-            'from': ETH_SENDER_ADDRESS,
-            'nonce': nonce,
-            'gas': 200000,
-            'gasPrice': web3_eth.to_wei('50', 'gwei')
-        })
-        signed_tx = web3_eth.eth.account.sign_transaction(tx, private_key=ETH_PRIVATE_KEY)
-        tx_hash = web3_eth.eth.send_raw_transaction(signed_tx.rawTransaction)
-        return web3_eth.to_hex(tx_hash)
-
-    async def send_bsc_tokens(self, to_address: str, amount: float, contract_address: str) -> str:
-        token_contract = web3_bsc.eth.contract(address=Web3.to_checksum_address(contract_address), abi=TOKEN_ABI)
-        amount_wei = int(amount * 10**18)
-        nonce = web3_bsc.eth.get_transaction_count(ETH_SENDER_ADDRESS)
-        tx = token_contract.functions.transfer(to_address, amount_wei).build_transaction({
-            'from': ETH_SENDER_ADDRESS,
-            'nonce': nonce,
-            'gas': 200000,
-            'gasPrice': web3_bsc.to_wei('5', 'gwei')
-        })
-        signed_tx = web3_bsc.eth.account.sign_transaction(tx, private_key=ETH_PRIVATE_KEY)
-        tx_hash = web3_bsc.eth.send_raw_transaction(signed_tx.rawTransaction)
-        return web3_bsc.to_hex(tx_hash)
-
-    async def send_sol_tokens(self, to_address: str, amount: float) -> str:
-        sender_keypair = Keypair.from_base58_string(SOL_SENDER_PRIVATE_KEY)
-        receiver_pubkey = Pubkey.from_string(to_address)
-        lamports = int(amount * 10**9)
-        instruction = transfer(TransferParams(
-            from_pubkey=sender_keypair.pubkey(),
-            to_pubkey=receiver_pubkey,
-            lamports=lamports
-        ))
-        message = Message([instruction], sender_keypair.pubkey())
-        tx = Transaction.from_bytes(bytes(message))
-        tx.sign(sender_keypair)
-        response = rate_limited_request(SOL_RPC_URL, {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "sendTransaction",
-            "params": [tx.serialize().hex()]
-        })
-        return response["result"]
-
-    async def send_xrp_tokens(self, to_address: str, amount: float) -> str:
-        wallet = Wallet(seed=XRP_SENDER_SEED, sequence=0)
-        payment = Payment(
-            account=XRP_SENDER_ADDRESS,
-            destination=to_address,
-            amount=xrp_to_drops(amount)
-        )
-        response = xrp_client.submit(payment, wallet)
-        return response.result["tx_json"]["hash"]
+    async def broadcast_transfer(self, chain: str, signed_tx: str, tx_hash: str) -> str:
+        if chain in ("ETH", "BSC"):
+            reply = (await rpc_batch(chain, "eth_sendRawTransaction", [("eth_sendRawTransaction", [signed_tx])]))[0]
+            return await evm_send_outcome(chain, reply, tx_hash)
+        await sender_lanes(chain)[0].submit(signed_tx)
+        return DIST_BROADCAST
 
 async def get_leaderboard_text(lang: str) -> str:
     cursor.execute("SELECT user_id, Birdz_balance FROM users ORDER BY Birdz_balance DESC LIMIT 10")
@@ -1529,46 +5083,208 @@ async def telegram_message(update: Update, context):
     bot_context.bot = context.bot
     await bot.handle_message(update, bot_context)
 
+async def telegram_document(update: Update, context):
+    bot_context = BotContext("telegram")
+    bot_context.bot = context.bot
+    await bot.handle_document(update, bot_context)
+
+async def telegram_metrics(update: Update, context):
+    bot_context = BotContext("telegram")
+    bot_context.bot = context.bot
+    await bot.metrics_command(update, bot_context)
+
+async def telegram_sqltop(update: Update, context):
+    bot_context = BotContext("telegram")
+    bot_context.bot = context.bot
+    await bot.sqltop_command(update, bot_context)
+
+async def resume_distribution_runs(application):
+    asyncio.create_task(asyncio.to_thread(preload_lazy_imports))
+    bot_context = BotContext("telegram")
+    bot_context.bot = application.bot
+    bot.jobs.recover()
+    run = get_active_distribution_run()
+    if run and run[4] == "running":
+        logger.info(f"Resuming distribution run {run[0]} after restart")
+        bot.jobs.enqueue("distribution", {"token_id": run[1], "mode": "drain", "run_id": run[0]}, run[2], run[3], "system", bot_context)
+    if CONFIRM_INTERVAL > 0:
+        asyncio.create_task(ConfirmationTracker(bot, bot_context).run(CONFIRM_INTERVAL))
+    if RPC_HEALTH_INTERVAL > 0:
+        asyncio.create_task(run_endpoint_health_checks(RPC_HEALTH_INTERVAL))
+    if SNAPSHOT_TIERS and SNAPSHOT_CHECK_INTERVAL > 0:
+        asyncio.create_task(run_snapshot_scheduler(bot, bot_context, SNAPSHOT_CHECK_INTERVAL))
+
+# Sharded Update Handling
+# The front process polls Telegram and routes each update by user_id to a worker
+# process; every worker owns its own SQLite connection and Telegram Bot client.
+# A worker that exits is respawned on the same queue, so updates already routed to its
+# shard wait there; more than SHARD_RESTART_LIMIT exits a minute stops the bot instead.
+SHARD_HANDLERS = {"start": "start", "button": "button_handler", "message": "handle_message", "document": "handle_document", "metrics": "metrics_command", "sqltop": "sqltop_command"}
+
+SHARD_ID = None
+SHARD_RESTART_LIMIT = int(os.getenv('SHARD_RESTART_LIMIT', '5'))
+SHARD_SUPERVISE_SECONDS = 2
+
+def shard_scope_note() -> str:
+    # /metrics and /sqltop reach only the worker that owns the admin's chat
+    if SHARD_ID is None:
+        return ""
+    return (f" (shard {SHARD_ID} of {SHARD_WORKERS} only; every worker keeps its own counters and profiler, "
+            f"so scrape each worker's metrics port for the full picture)")
+
+def shard_for(user_id, shards: int) -> int:
+    return int(hashlib.md5(str(user_id).encode()).hexdigest(), 16) % shards
+
+def shard_worker(shard_id: int, queue):
+    asyncio.run(_shard_worker_loop(shard_id, queue))
+
+async def _shard_worker_loop(shard_id: int, queue):
+    global SHARD_ID
+    SHARD_ID = shard_id
+    startup(bootstrap=False)
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT + 1 + shard_id)
+    tg_bot = Bot(TELEGRAM_TOKEN)
+    await tg_bot.initialize()
+    loop = asyncio.get_running_loop()
+    logger.info(f"Shard worker {shard_id} started (pid {os.getpid()})")
+    try:
+        while True:
+            item = await loop.run_in_executor(None, queue.get)
+            if item is None:
+                break
+            kind, payload = item
+            update = Update.de_json(payload, tg_bot)
+            bot_context = BotContext("telegram")
+            bot_context.bot = tg_bot
+            try:
+                await getattr(bot, SHARD_HANDLERS[kind])(update, bot_context)
+            except Exception as e:
+                logger.error(f"Shard {shard_id} failed to handle {kind} update: {str(e)}")
+    finally:
+        await tg_bot.shutdown()
+        logger.info(f"Shard worker {shard_id} stopped")
+
+def run_sharded_telegram(workers: int):
+    mp_context = multiprocessing.get_context("spawn")
+    queues = [mp_context.Queue() for _ in range(workers)]
+    processes = []
+
+    def spawn(shard_id: int):
+        process = mp_context.Process(target=shard_worker, args=(shard_id, queues[shard_id]), daemon=True)
+        process.start()
+        return process
+
+    for i in range(workers):
+        processes.append(spawn(i))
+
+    async def supervise(application: Application):
+        restarts = []
+        while True:
+            await asyncio.sleep(SHARD_SUPERVISE_SECONDS)
+            for i, process in enumerate(processes):
+                if process.is_alive():
+                    continue
+                logger.error(f"Shard worker {i} (pid {process.pid}) exited with code {process.exitcode}")
+                now = time.monotonic()
+                restarts = [at for at in restarts if now - at < 60] + [now]
+                if len(restarts) > SHARD_RESTART_LIMIT:
+                    # Workers keep dying; stop rather than route updates to a shard nobody reads
+                    logger.critical(f"{len(restarts)} shard worker exits within a minute, stopping the bot")
+                    application.stop_running()
+                    return
+                processes[i] = spawn(i)
+                logger.info(f"Respawned shard worker {i} (pid {processes[i].pid})")
+
+    async def post_init(application: Application):
+        asyncio.create_task(supervise(application))
+        await resume_distribution_runs(application)
+
+    def router(kind: str):
+        async def route(update: Update, context):
+            # Updates without a user (channel posts, some service messages) have no shard and no handler that accepts them
+            if update.effective_user is None:
+                return
+            queues[shard_for(update.effective_user.id, workers)].put((kind, update.to_dict()))
+        return route
+
+    application = Application.builder().token(TELEGRAM_TOKEN).post_init(post_init).build()
+    application.add_handler(CommandHandler("start", router("start")))
+    application.add_handler(CommandHandler("metrics", router("metrics")))
+    application.add_handler(CommandHandler("sqltop", router("sqltop")))
+    application.add_handler(CallbackQueryHandler(router("button")))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, router("message")))
+    application.add_handler(MessageHandler(filters.Document.ALL, router("document")))
+    bot.telegram_app = application
+    try:
+        application.run_polling()
+    finally:
+        for queue in queues:
+            queue.put(None)
+        for process in processes:
+            process.join(timeout=30)
+
 # Discord Bot Setup
-class DiscordBot(discord_commands.Bot):
-    def __init__(self):
-        intents = discord.Intents.default()
-        intents.message_content = True
-        super().__init__(command_prefix="!Birdz ", intents=intents)
+# discord.py is only imported when a Discord token is configured
+def create_discord_bot():
+    from discord.ext import commands as discord_commands
 
-    async def on_ready(self):
-        logger.info(f"Discord Bot logged in as {self.user}")
+    class DiscordBot(discord_commands.Bot):
+        def __init__(self):
+            intents = discord.Intents.default()
+            intents.message_content = True
+            super().__init__(command_prefix="!Birdz ", intents=intents)
 
-    async def on_message(self, message):
-        if message.author == self.user:
-            return
-        bot_context = BotContext("discord")
-        bot_context.bot = self
-        if message.content.startswith("!Birdz"):
-            parts = message.content.split()
-            if len(parts) == 1:
-                await bot.start(message, bot_context)
+        async def on_ready(self):
+            logger.info(f"Discord Bot logged in as {self.user}")
+
+        async def on_message(self, message):
+            if message.author == self.user:
+                return
+            bot_context = BotContext("discord")
+            bot_context.bot = self
+            if message.content.startswith("!Birdz"):
+                parts = message.content.split()
+                if len(parts) == 1:
+                    await bot.start(message, bot_context)
+                elif parts[1] == "metrics":
+                    await bot.metrics_command(message, bot_context)
+                elif parts[1] == "sqltop":
+                    await bot.sqltop_command(message, bot_context)
+                else:
+                    update = message
+                    update.callback_query = type('obj', (object,), {'data': parts[1], 'from_user': message.author, 'message': message})
+                    await bot.button_handler(update, bot_context)
+            elif message.attachments:
+                await bot.handle_document(message, bot_context)
             else:
-                update = message
-                update.callback_query = type('obj', (object,), {'data': parts[1], 'from_user': message.author, 'message': message})
-                await bot.button_handler(update, bot_context)
-        else:
-            await bot.handle_message(message, bot_context)
+                await bot.handle_message(message, bot_context)
+
+    return DiscordBot()
 
 # Main Execution
 if __name__ == "__main__":
+    startup()
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+
     # Telegram Bot
-    if TELEGRAM_TOKEN:
-        application = Application.builder().token(TELEGRAM_TOKEN).build()
+    if TELEGRAM_TOKEN and SHARD_WORKERS > 0:
+        run_sharded_telegram(SHARD_WORKERS)
+    elif TELEGRAM_TOKEN:
+        application = Application.builder().token(TELEGRAM_TOKEN).post_init(resume_distribution_runs).build()
         application.add_handler(CommandHandler("start", telegram_start))
+        application.add_handler(CommandHandler("metrics", telegram_metrics))
+        application.add_handler(CommandHandler("sqltop", telegram_sqltop))
         application.add_handler(CallbackQueryHandler(telegram_button))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, telegram_message))
+        application.add_handler(MessageHandler(filters.Document.ALL, telegram_document))
         bot.telegram_app = application
         application.run_polling()
 
     # Discord Bot
     if DISCORD_TOKEN:
-        discord_bot = DiscordBot()
+        discord_bot = create_discord_bot()
         bot.discord_bot = discord_bot
         discord_bot.run(DISCORD_TOKEN)
 